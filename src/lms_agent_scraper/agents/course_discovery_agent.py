@@ -4,20 +4,22 @@ visita cada uno con Playwright y clasifica con el LLM si el contenido es una pá
 """
 
 import logging
-from typing import Any, Dict, List
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Tuple
 from urllib.parse import urljoin, urlparse
 
-from lms_agent_scraper.llm.ollama_client import LocalLLMClient
+from lms_agent_scraper.llm.ollama_client import LocalLLMClient, html_snippet
 
 log = logging.getLogger(__name__)
 
 try:
-    from bs4 import BeautifulSoup
+    from bs4 import BeautifulSoup, Tag
 
     BS4_AVAILABLE = True
 except ImportError:
     BS4_AVAILABLE = False
     BeautifulSoup = None
+    Tag = None
 
 # Page type from Playwright for type hints; avoid import at top so module loads without playwright
 try:
@@ -28,6 +30,16 @@ except ImportError:
 
 DEFAULT_CANDIDATE_PATTERNS = ["course/view.php", "/course/"]
 EXCLUDE_PATH_SUBSTRINGS = ["/login", "logout", "/admin", "login.php", "logout.php"]
+DEFAULT_CLASSIFY_BATCH_SIZE = 5
+CLASSIFY_CACHE_MAX = 256
+CLASSIFY_MAX_CHARS = 8000
+
+
+def _iter_anchors_with_href(soup: Any) -> Iterator[Any]:
+    """Recorre los <a href> del documento de forma perezosa (permite cortar antes de terminar)."""
+    for el in soup.descendants:
+        if isinstance(el, Tag) and el.name == "a" and el.has_attr("href"):
+            yield el
 
 
 def _extract_candidate_urls(
@@ -48,7 +60,7 @@ def _extract_candidate_urls(
     soup = BeautifulSoup(html, "html.parser")
     seen: set = set()
     candidates: List[str] = []
-    for a in soup.find_all("a", href=True):
+    for a in _iter_anchors_with_href(soup):
         href = (a.get("href") or "").strip()
         if not href or href.startswith("#") or href.startswith("javascript:"):
             continue
@@ -92,10 +104,14 @@ def discover_courses_by_visiting_links(
       - fallback_when_empty: no se usa aquí (lo usa quien invoca).
       - max_candidates: máximo de URLs a visitar (default 25).
       - candidate_patterns: lista de subcadenas para filtrar href (default course/view.php, /course/).
+      - classify_batch_size: páginas por llamada al LLM (default 5; 1 = una llamada por página).
+      - classify_batch_max_chars: caracteres de HTML por página dentro del lote (default 3000).
 
     Retorna lista de {"url": str, "name": str}.
     """
     max_candidates = int(discovery_config.get("max_candidates", 25))
+    batch_size = int(discovery_config.get("classify_batch_size", DEFAULT_CLASSIFY_BATCH_SIZE))
+    batch_max_chars = int(discovery_config.get("classify_batch_max_chars", 3000))
     candidate_patterns = discovery_config.get("candidate_patterns") or DEFAULT_CANDIDATE_PATTERNS
 
     candidates = _extract_candidate_urls(
@@ -116,6 +132,35 @@ def discover_courses_by_visiting_links(
 
     course_list: List[Dict[str, str]] = []
     visited = 0
+    pending: List[Tuple[str, str]] = []
+    # LRU por hash del fragmento HTML limpio: páginas idénticas (p. ej. redirecciones) no repiten LLM.
+    classify_cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+
+    def _cache_put(key: int, result: Dict[str, Any]) -> None:
+        classify_cache[key] = result
+        if len(classify_cache) > CLASSIFY_CACHE_MAX:
+            classify_cache.popitem(last=False)
+
+    def _record(url: str, result: Dict[str, Any]) -> None:
+        if result.get("is_course"):
+            name = (result.get("course_name") or "").strip() or "Sin nombre"
+            course_list.append({"url": url, "name": name})
+            log.info("  -> Discovery por contenido: curso detectado [%s] %s", name[:50], url)
+
+    def _classify_pending() -> None:
+        if not pending:
+            return
+        try:
+            results = client.classify_pages_as_courses(pending, max_chars=batch_max_chars)
+            for (url, snippet), result in zip(pending, results):
+                _cache_put(hash(snippet), result)
+                _record(url, result)
+        except Exception as e:
+            if debug:
+                log.debug("  [course_discovery_agent] Error clasificando lote: %s", e)
+        finally:
+            pending.clear()
+
     for url in candidates:
         try:
             page.goto(url, wait_until="domcontentloaded", timeout=timeout_ms)
@@ -123,17 +168,30 @@ def discover_courses_by_visiting_links(
                 page.wait_for_load_state("networkidle", timeout=10000)
             except Exception:
                 pass
-            html = page.content()
+            # Reducir a fragmento ya aquí: no retener el HTML completo de cada página del lote.
+            snippet = html_snippet(page.content(), CLASSIFY_MAX_CHARS)
             visited += 1
-            result = client.classify_page_as_course(html, url=url, max_chars=8000)
-            if result.get("is_course"):
-                name = (result.get("course_name") or "").strip() or "Sin nombre"
-                course_list.append({"url": url, "name": name})
-                log.info("  -> Discovery por contenido: curso detectado [%s] %s", name[:50], url)
+            key = hash(snippet)
+            if key in classify_cache:
+                classify_cache.move_to_end(key)
+                log.debug("  [course_discovery_agent] Cache hit (sin LLM) para %s", url)
+                _record(url, classify_cache[key])
+                continue
+            if batch_size <= 1:
+                result = client.classify_page_as_course(
+                    snippet, url=url, max_chars=CLASSIFY_MAX_CHARS
+                )
+                _cache_put(key, result)
+                _record(url, result)
+                continue
+            pending.append((url, snippet))
+            if len(pending) >= batch_size:
+                _classify_pending()
         except Exception as e:
             if debug:
                 log.debug("  [course_discovery_agent] Error visitando %s: %s", url, e)
             continue
+    _classify_pending()
     log.info(
         "  -> Discovery por contenido: visitadas %d pagina(s), %d curso(s) detectado(s)",
         visited,
@@ -30,14 +30,21 @@ def run(
     profile: str = typer.Option(
         None, "--profile", "-p", help="Perfil YAML a usar (default: PORTAL_PROFILE)"
     ),
+    force_login: bool = typer.Option(
+        False, "--force-login", help="Iniciar sesión aunque haya una sesión guardada vigente"
+    ),
 ):
     """Ejecutar scraper con perfil por defecto o especificado."""
-    from lms_agent_scraper.config.settings import PortalSettings, ScraperSettings, OutputSettings
+    from lms_agent_scraper.config.settings import (
+        get_output_settings,
+        get_portal_settings,
+        get_scraper_settings,
+    )
     from lms_agent_scraper.graph.workflow import run_workflow
 
-    portal = PortalSettings()
-    scraper = ScraperSettings()
-    output = OutputSettings()
+    portal = get_portal_settings()
+    scraper = get_scraper_settings()
+    output = get_output_settings()
 
     profile_name = profile or portal.profile
     base_url = portal.base_url or ""
@@ -62,6 +69,10 @@ def run(
         output_dir=str(output.dir),
         profiles_dir=_profiles_dir(),
         debug=scraper.debug_mode,
+        auth_state_path=scraper.auth_state_path,
+        auth_state_ttl=scraper.auth_state_ttl,
+        force_login=force_login,
+        browser_no_sandbox=scraper.browser_no_sandbox,
     )
     typer.echo("---")
     if result.get("errors"):
@@ -4,10 +4,16 @@ from lms_agent_scraper.config.settings import (
     PortalSettings,
     ScraperSettings,
     OutputSettings,
+    get_output_settings,
+    get_portal_settings,
+    get_scraper_settings,
 )
 
 __all__ = [
     "PortalSettings",
     "ScraperSettings",
     "OutputSettings",
+    "get_portal_settings",
+    "get_scraper_settings",
+    "get_output_settings",
 ]
@@ -1,5 +1,8 @@
 """Configuración de Ollama / GLM-4.7-Flash."""
 
+from functools import lru_cache
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,10 +12,43 @@ class OllamaSettings(BaseSettings):
     model_config = SettingsConfigDict(env_prefix="OLLAMA_", env_file=".env", extra="ignore")
 
     model_name: str = "glm-4.7-flash:q4_K_M"
+    # Tag de cuantización que se añade si model_name no trae tag (p. ej. "q4_K_M":
+    # "glm-4.7-flash" -> "glm-4.7-flash:q4_K_M"). Opcional: muchos modelos de la librería no
+    # publican un tag con ese nombre exacto (usan "7b-instruct-q4_K_M"), así que vacío no cambia
+    # model_name. Q4_K_M / Q5_K_M leen la mitad de bytes por token que Q8/fp16.
+    model_quant: str = ""
     base_url: str = "http://localhost:11434"
     temperature: float = 0.1
     num_ctx: int = 8192
     num_predict: int = 2048
+    # Contexto reducido por tipo de prompt (fechas 1024, clasificación/selectores 4096; extractores
+    # usan num_ctx). Desactivado por defecto: cada cambio de num_ctx hace que Ollama recargue el
+    # modelo, así que conviene solo si se sirve una instancia por tamaño o el ahorro de VRAM importa.
+    adaptive_num_ctx: bool = False
     request_timeout: int = 120
+    # Peticiones simultáneas en los lotes asíncronos; conviene igualarlo al OLLAMA_NUM_PARALLEL
+    # con el que se arranca el servidor (misma variable de entorno).
+    num_parallel: int = 4
+    # Tiempo que el servidor mantiene el modelo cargado tras cada petición ("-1" = siempre).
+    # None deja el valor por defecto del servidor.
+    keep_alive: Optional[str] = None
+    # Caché persistente de respuestas (SQLite) por hash de modelo + prompt; ttl 0 la desactiva.
+    response_cache_path: str = ".cache/llm_responses.sqlite3"
+    response_cache_ttl: int = 3600
+    # Si el HTML ya trae al menos estos enlaces course/view.php?id=, no se llama al LLM.
+    min_courses_fastpath: int = 1
     fallback_to_cloud: bool = False
     cloud_provider: str = "anthropic"
+
+    @property
+    def resolved_model_name(self) -> str:
+        """model_name con el tag de cuantización añadido si no tenía tag."""
+        if not self.model_quant or ":" in self.model_name.rsplit("/", 1)[-1]:
+            return self.model_name
+        return f"{self.model_name}:{self.model_quant}"
+
+
+@lru_cache(maxsize=1)
+def get_ollama_settings() -> OllamaSettings:
+    """OllamaSettings leído una sola vez por proceso (.env + entorno)."""
+    return OllamaSettings()
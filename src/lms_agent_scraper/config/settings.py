@@ -1,5 +1,6 @@
 """Configuración desde variables de ambiente (.env)."""
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Literal
 
@@ -33,6 +34,15 @@ class ScraperSettings(BaseSettings):
     max_courses: int = Field(default=0, alias="SCRAPER_MAX_COURSES")
     debug_mode: bool = Field(default=False, alias="SCRAPER_DEBUG_MODE")
     save_html_debug: bool = Field(default=False, alias="SCRAPER_SAVE_HTML_DEBUG")
+    # Sesión del login guardada (storage_state de Playwright) y segundos que se reutiliza (0 = nunca)
+    auth_state_path: str = Field(default=".cache/auth_state.json", alias="SCRAPER_AUTH_STATE_PATH")
+    auth_state_ttl: int = Field(default=3600, alias="SCRAPER_AUTH_STATE_TTL")
+    # Chromium sin sandbox: solo para contenedores que corren como root y no pueden usarlo
+    browser_no_sandbox: bool = Field(default=False, alias="SCRAPER_BROWSER_NO_SANDBOX")
+    # Segundos que el servidor MCP reutiliza el resultado del workflow entre herramientas (0 = nunca)
+    workflow_cache_ttl: int = Field(default=300, alias="SCRAPER_WORKFLOW_CACHE_TTL")
+    # Segundos entre actualizaciones en segundo plano del servidor MCP (0 = solo bajo demanda)
+    workflow_refresh_interval: int = Field(default=0, alias="SCRAPER_WORKFLOW_REFRESH_INTERVAL")
 
 
 class OutputSettings(BaseSettings):
@@ -45,3 +55,21 @@ class OutputSettings(BaseSettings):
         default="markdown",
         alias="OUTPUT_FORMAT",
     )
+
+
+@lru_cache(maxsize=1)
+def get_portal_settings() -> PortalSettings:
+    """PortalSettings leído una sola vez por proceso (.env + entorno)."""
+    return PortalSettings()
+
+
+@lru_cache(maxsize=1)
+def get_scraper_settings() -> ScraperSettings:
+    """ScraperSettings leído una sola vez por proceso (.env + entorno)."""
+    return ScraperSettings()
+
+
+@lru_cache(maxsize=1)
+def get_output_settings() -> OutputSettings:
+    """OutputSettings leído una sola vez por proceso (.env + entorno)."""
+    return OutputSettings()
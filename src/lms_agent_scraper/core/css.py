@@ -0,0 +1,15 @@
+"""Selectores CSS compilados, compartidos por las herramientas de navegación y extracción."""
+
+from functools import lru_cache
+from typing import Any
+
+
+@lru_cache(maxsize=256)
+def compile_css(selector: str) -> Any:
+    """
+    Selector CSS compilado por soupsieve una vez por proceso: los selectores del perfil
+    (tarjetas, tareas, fechas) son los mismos en todas las páginas.
+    """
+    import soupsieve
+
+    return soupsieve.compile(selector)
@@ -1,8 +1,58 @@
 """Parser de fechas multi-formato para portales LMS."""
 
 import re
+import time
 from datetime import datetime
-from typing import List, Optional
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+
+@lru_cache(maxsize=256)
+def _compile(pattern: str, flags: int = 0) -> "re.Pattern[str]":
+    """Compila un patrón regex una sola vez (los perfiles repiten los mismos patrones)."""
+    return re.compile(pattern, flags)
+
+
+_YEAR_TTL_SECONDS = 300
+_year_cached_at: float = float("-inf")
+_cached_year: int = 0
+
+
+def _current_year() -> int:
+    """Año actual, recalculado como mucho cada _YEAR_TTL_SECONDS."""
+    global _year_cached_at, _cached_year
+    now = time.monotonic()
+    if now - _year_cached_at > _YEAR_TTL_SECONDS:
+        _cached_year = datetime.now().year
+        _year_cached_at = now
+    return _cached_year
+
+
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%d-%m-%Y",
+    "%d/%m/%y",
+    "%d-%m-%y",
+    "%B %d, %Y",
+    "%d %B %Y",
+    "%d de %B de %Y",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%Y %H:%M",
+)
+
+_HAS_DIGIT_RE = re.compile(r"\d")
+# La fecha válida más corta es del estilo "1/1/24".
+_MIN_DATE_LEN = 6
+
+# (regex compilado, True si el año va primero)
+_DATE_REGEXES = (
+    (re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})"), True),
+    (re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})"), False),
+    (re.compile(r"(\d{1,2})-(\d{1,2})-(\d{4})"), False),
+    (re.compile(r"(\d{1,2})/(\d{1,2})/(\d{2})"), False),
+    (re.compile(r"(\d{1,2})-(\d{1,2})-(\d{2})"), False),
+)
 
 
 def parse_date(
@@ -17,39 +67,23 @@ def parse_date(
     date_string = date_string.strip()
     if "31-12-1969" in date_string or "1969" in date_string:
         return None
+    if len(date_string) < _MIN_DATE_LEN or not _HAS_DIGIT_RE.search(date_string):
+        return None
+    max_year = _current_year() + 2
 
-    date_formats = [
-        "%Y-%m-%d",
-        "%d/%m/%Y",
-        "%d-%m-%Y",
-        "%d/%m/%y",
-        "%d-%m-%y",
-        "%B %d, %Y",
-        "%d %B %Y",
-        "%d de %B de %Y",
-        "%Y-%m-%d %H:%M:%S",
-        "%d/%m/%Y %H:%M",
-    ]
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             parsed = datetime.strptime(date_string, fmt).date()
-            if 2020 <= parsed.year <= datetime.now().year + 2:
+            if 2020 <= parsed.year <= max_year:
                 return datetime(parsed.year, parsed.month, parsed.day)
         except ValueError:
             continue
 
-    regex_patterns = [
-        r"(\d{4})-(\d{1,2})-(\d{1,2})",
-        r"(\d{1,2})/(\d{1,2})/(\d{4})",
-        r"(\d{1,2})-(\d{1,2})-(\d{4})",
-        r"(\d{1,2})/(\d{1,2})/(\d{2})",
-        r"(\d{1,2})-(\d{1,2})-(\d{2})",
-    ]
-    for pattern in regex_patterns:
-        match = re.search(pattern, date_string)
+    for regex, year_first in _DATE_REGEXES:
+        match = regex.search(date_string)
         if match:
             try:
-                if pattern.startswith(r"(\d{4})"):
+                if year_first:
                     year, month, day = match.groups()
                     year = int(year)
                 else:
@@ -58,19 +92,33 @@ def parse_date(
                     if year < 100:
                         year += 2000 if year < 50 else 1900
                 parsed = datetime(int(year), int(month), int(day)).date()
-                if 2020 <= parsed.year <= datetime.now().year + 2:
+                if 2020 <= parsed.year <= max_year:
                     return datetime(parsed.year, parsed.month, parsed.day)
             except ValueError:
                 continue
     return None
 
 
+def parse_dates(
+    date_strings: Iterable[Optional[str]], patterns: Optional[List[str]] = None
+) -> List[Optional[datetime]]:
+    """
+    Parsea un lote de cadenas de fecha (mismo orden que la entrada).
+    Las cadenas repetidas (habitual: varias tareas con la misma fecha) se parsean una sola vez.
+    """
+    memo: Dict[Optional[str], Optional[datetime]] = {}
+    result: List[Optional[datetime]] = []
+    for date_string in date_strings:
+        if date_string not in memo:
+            memo[date_string] = parse_date(date_string, patterns)
+        result.append(memo[date_string])
+    return result
+
+
 def extract_date_from_text(text: str, profile_patterns: List[str]) -> Optional[str]:
     """Extrae la primera fecha encontrada en text usando los patrones del perfil."""
-    import re
-
     for pattern in profile_patterns or []:
-        match = re.search(pattern, text, re.IGNORECASE)
+        match = _compile(pattern, re.IGNORECASE).search(text)
         if match:
             return match.group(1) if match.lastindex and match.lastindex >= 1 else match.group(0)
     return None
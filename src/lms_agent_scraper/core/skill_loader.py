@@ -1,15 +1,150 @@
 """Skill loader para cargar y parsear archivos SKILL.md (prompts en tiempo de ejecución)."""
 
 import logging
+import os
 import re
+import stat
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
 
-import yaml
 from langchain_core.prompts import ChatPromptTemplate
 
 logger = logging.getLogger(__name__)
 
+_FRONTMATTER_RE = re.compile(r"^---\s*\n(.*?)\n---\s*\n(.*)$", re.DOTALL)
+_SECTION_RE = re.compile(r"##\s+([^\n]+)\n(.*?)(?=\n##\s+|\Z)", re.DOTALL)
+# Escalares que YAML no interpretaría como str (números, booleanos, null): se delegan a yaml.
+_YAML_TYPED_SCALAR_RE = re.compile(
+    r"^(?:[-+]?(?:\d[\d_]*)?\.?\d+(?:[eE][-+]?\d+)?|[-+]?\.(?:inf|nan)|0x[0-9a-fA-F]+|0o[0-7]+"
+    r"|[-+]?\d[\d_]*(?::[0-5]?\d)+(?:\.\d*)?|\d{4}-\d{1,2}-\d{1,2}(?:[Tt ].*)?"
+    r"|true|false|yes|no|on|off|y|n|null|~)$",
+    re.IGNORECASE,
+)
+_YAML_SPECIAL_STARTS = ("{", "[", "|", ">", "&", "*", "!", "%", "@", "`")
+
+
+def _read_utf8(path: str) -> str:
+    """Lee un archivo de texto UTF-8 en una sola lectura binaria (saltos de línea normalizados a \\n)."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        if len(data) < size:
+            # Lecturas cortas (archivos grandes o en crecimiento): leer hasta EOF.
+            chunks = [data]
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            data = b"".join(chunks)
+    finally:
+        os.close(fd)
+    content = data.decode("utf-8")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+# Bytes leídos de SKILL.md para localizar "name:" sin parsear el archivo completo.
+_SKILL_HEAD_BYTES = 256
+
+
+def _read_head(path: str, size: int = _SKILL_HEAD_BYTES) -> str:
+    """Lee solo los primeros `size` bytes de un archivo (el corte puede partir un carácter)."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, size).decode("utf-8", errors="ignore")
+    finally:
+        os.close(fd)
+
+
+def _split_frontmatter(content: str) -> Optional[Tuple[str, str]]:
+    """
+    Separa (frontmatter, markdown) con str.find para el caso habitual "---\\n...\\n---\\n".
+    Retorna None si el archivo tiene otra forma (espacios tras ---, etc.): se usa _FRONTMATTER_RE.
+    """
+    if not content.startswith("---\n"):
+        return None
+    end = content.find("\n---\n", 4)
+    # Cualquier "\n---" anterior podría ser un cierre con espacios que la regex sí aceptaría.
+    if end < 0 or content.find("\n---", 4) != end:
+        return None
+    rest = content[end + 5 :]
+    # Igual que el "\s*\n" codicioso de la regex: se descartan las líneas en blanco iniciales.
+    leading = len(rest) - len(rest.lstrip())
+    if leading:
+        rest = rest[rest.rfind("\n", 0, leading) + 1 :]
+    return content[4:end], rest
+
+
+class _NotSimpleYaml(Exception):
+    """El frontmatter usa sintaxis YAML que el escáner simple no cubre."""
+
+
+def _simple_scalar(value: str) -> str:
+    """Interpreta un escalar de una línea (sin comillas, o con comillas simples/dobles)."""
+    if value[:1] in ('"', "'"):
+        quote = value[0]
+        end = value.find(quote, 1)
+        if end == -1 or value[end + 1 :].strip()[:1] not in ("", "#") or "\\" in value:
+            raise _NotSimpleYaml(value)
+        return value[1:end]
+    if value.startswith(_YAML_SPECIAL_STARTS) or value.startswith("- ") or value == "-":
+        raise _NotSimpleYaml(value)
+    if " #" in value:
+        value = value.split(" #", 1)[0].rstrip()
+    if _YAML_TYPED_SCALAR_RE.match(value) or ": " in value:
+        raise _NotSimpleYaml(value)
+    return value
+
+
+def _simple_frontmatter(text: str) -> Dict[str, Any]:
+    """
+    Parsea frontmatter con solo 'clave: valor' y listas '- item' de escalares de texto.
+    Lanza _NotSimpleYaml si encuentra cualquier otra sintaxis (se usa yaml como respaldo).
+    """
+    data: Dict[str, Any] = {}
+    current_list: Optional[List[str]] = None
+    for raw_line in text.split("\n"):
+        line = raw_line.rstrip()
+        stripped = line.lstrip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") or stripped == "-":
+            if current_list is None:
+                raise _NotSimpleYaml(line)
+            current_list.append(_simple_scalar(stripped[1:].strip()))
+            continue
+        if line[0] in (" ", "\t"):
+            raise _NotSimpleYaml(line)
+        key, sep, value = line.partition(":")
+        key = key.strip()
+        if not sep or not key or key in data or key[:1] in ('"', "'", "?"):
+            raise _NotSimpleYaml(line)
+        value = value.strip()
+        if value and not value.startswith("#"):
+            data[key] = _simple_scalar(value)
+            current_list = None
+        else:
+            current_list = []
+            data[key] = current_list
+    for key, value in data.items():
+        if value == []:
+            # "clave:" sin lista debajo es null en YAML.
+            data[key] = None
+    return data
+
+
+def _parse_frontmatter(text: str) -> Any:
+    """Parsea el frontmatter con el escáner simple; si no aplica, con yaml.safe_load."""
+    try:
+        return _simple_frontmatter(text)
+    except _NotSimpleYaml:
+        import yaml
+
+        return yaml.safe_load(text)
+
 
 class SkillLoader:
     """
@@ -34,31 +169,39 @@ class SkillLoader:
             skills_dir = package_root / "skills"
 
         self.skills_dir = Path(skills_dir)
-        self._cache: Dict[str, Dict] = {}
+        # Ruta como str para los caminos calientes (os.path.join / os.stat sin objetos Path).
+        self._skills_dir_str = os.fspath(self.skills_dir)
+        # skill_name -> (st_mtime_ns de SKILL.md, datos parseados)
+        self._cache: Dict[str, Tuple[int, Dict]] = {}
+        # skill_name -> (datos del skill usados, ChatPromptTemplate construido)
+        self._template_cache: Dict[str, Tuple[Dict, ChatPromptTemplate]] = {}
         self._resource_cache: Dict[Tuple[str, str], str] = {}
+        # Recursos que no existían al buscarlos (evita repetir el stat en cada llamada).
+        self._negative_resource_cache: Set[Tuple[str, str]] = set()
 
         if not self.skills_dir.exists():
             logger.warning("Directorio de skills no encontrado: %s", self.skills_dir)
 
-    def _parse_skill_file(self, skill_path: Path) -> Dict:
+    def _parse_skill_file(self, skill_path: Union[str, Path]) -> Dict:
         """Parsea un archivo SKILL.md (frontmatter YAML + secciones markdown)."""
-        if not skill_path.exists():
-            raise FileNotFoundError(f"Archivo skill no encontrado: {skill_path}")
-
-        content = skill_path.read_text(encoding="utf-8")
-
-        frontmatter_pattern = r"^---\s*\n(.*?)\n---\s*\n(.*)$"
-        match = re.match(frontmatter_pattern, content, re.DOTALL)
-
-        if not match:
-            raise ValueError(f"Formato inválido en {skill_path}: no se encontró frontmatter YAML")
-
-        yaml_content = match.group(1)
-        markdown_content = match.group(2)
+        try:
+            content = _read_utf8(os.fspath(skill_path))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Archivo skill no encontrado: {skill_path}") from None
+
+        parts = _split_frontmatter(content)
+        if parts is None:
+            match = _FRONTMATTER_RE.match(content)
+            if not match:
+                raise ValueError(
+                    f"Formato inválido en {skill_path}: no se encontró frontmatter YAML"
+                )
+            parts = match.group(1), match.group(2)
+        yaml_content, markdown_content = parts
 
         try:
-            metadata = yaml.safe_load(yaml_content)
-        except yaml.YAMLError as e:
+            metadata = _parse_frontmatter(yaml_content)
+        except Exception as e:
             raise ValueError(f"Error parseando YAML en {skill_path}: {e}") from e
 
         if "name" not in metadata:
@@ -72,19 +215,48 @@ class SkillLoader:
             "metadata": metadata,
             "content": markdown_content,
             "sections": sections,
-            "path": skill_path,
+            "path": Path(skill_path),
         }
 
     def _parse_markdown_sections(self, markdown: str) -> Dict[str, str]:
         """Parsea secciones ## System Message, ## Human Message Template, etc."""
+        fast = self._split_markdown_sections(markdown)
+        if fast is not None:
+            return fast
         sections = {}
-        section_pattern = r"##\s+([^\n]+)\n(.*?)(?=\n##\s+|\Z)"
-        for match in re.finditer(section_pattern, markdown, re.DOTALL):
+        for match in _SECTION_RE.finditer(markdown):
             section_name = match.group(1).strip().lower().replace(" ", "_")
             section_content = match.group(2).strip()
             sections[section_name] = section_content
         return sections
 
+    @staticmethod
+    def _split_markdown_sections(markdown: str) -> Optional[Dict[str, str]]:
+        """
+        Camino rápido sin regex para el caso habitual: todos los "##" son cabeceras "## Nombre"
+        a inicio de línea. Retorna None si el markdown tiene otra forma (se usa la regex), también
+        si una cabecera va seguida directamente de otra: la regex toma esa segunda cabecera como
+        contenido de la primera.
+        """
+        headers = markdown.count("\n## ") + (1 if markdown.startswith("## ") else 0)
+        if headers != markdown.count("##"):
+            return None
+        sections: Dict[str, str] = {}
+        if not headers:
+            return sections
+        body = markdown[3:] if markdown.startswith("## ") else markdown.partition("\n## ")[2]
+        chunks = body.split("\n## ")
+        for i, chunk in enumerate(chunks):
+            header, newline, section_content = chunk.partition("\n")
+            if not header.strip():
+                return None
+            if not newline:
+                if i < len(chunks) - 1:
+                    return None
+                continue
+            sections[header.strip().lower().replace(" ", "_")] = section_content.strip()
+        return sections
+
     def load_skill(self, skill_name: str, use_cache: bool = True) -> ChatPromptTemplate:
         """
         Carga un skill y retorna un ChatPromptTemplate.
@@ -96,23 +268,56 @@ class SkillLoader:
         Returns:
             ChatPromptTemplate listo para usar con LangChain.
         """
-        if use_cache and skill_name in self._cache:
-            skill_data = self._cache[skill_name]
-        else:
-            skill_path = self.skills_dir / skill_name / "SKILL.md"
-            if not skill_path.exists():
+        skill_data = self._load_skill_data(skill_name, use_cache=use_cache)
+        if not use_cache:
+            return self._build_prompt_template(skill_data)
+        cached = self._template_cache.get(skill_name)
+        # Válido solo si se construyó a partir de los mismos datos (SKILL.md sin cambios).
+        if cached is not None and cached[0] is skill_data:
+            return cached[1]
+        template = self._build_prompt_template(skill_data)
+        self._template_cache[skill_name] = (skill_data, template)
+        return template
+
+    def _load_skill_data(
+        self, skill_name: str, use_cache: bool = True, mtime_ns: Optional[int] = None
+    ) -> Dict:
+        """
+        Devuelve los datos parseados del skill. La caché se valida con el mtime de SKILL.md:
+        si el archivo cambió desde que se parseó, se vuelve a parsear.
+        mtime_ns: mtime ya obtenido por quien llama (evita un stat repetido).
+        """
+        skill_path = os.path.join(self._skills_dir_str, skill_name, "SKILL.md")
+        if mtime_ns is None:
+            try:
+                mtime_ns = os.stat(skill_path).st_mtime_ns
+            except FileNotFoundError:
                 raise FileNotFoundError(
                     f"Skill '{skill_name}' no encontrado en {skill_path}. "
                     "Asegúrate de que el archivo SKILL.md existe."
-                )
-            skill_data = self._parse_skill_file(skill_path)
-            if use_cache:
-                self._cache[skill_name] = skill_data
-
-        return self._build_prompt_template(skill_data)
+                ) from None
+        if use_cache:
+            cached = self._cache.get(skill_name)
+            if cached is not None and cached[0] == mtime_ns:
+                return cached[1]
+        skill_data = self._parse_skill_file(skill_path)
+        if use_cache:
+            self._cache[skill_name] = (mtime_ns, skill_data)
+        return skill_data
 
     def _build_prompt_template(self, skill_data: Dict) -> ChatPromptTemplate:
         """Construye ChatPromptTemplate desde los datos del skill."""
+        return ChatPromptTemplate.from_messages(self._message_templates(skill_data))
+
+    def get_message_templates(self, skill_name: str) -> List[Tuple[str, str]]:
+        """
+        Pares (rol, plantilla) del skill, con rol "system" o "human". Las plantillas usan la misma
+        sintaxis de llaves que ChatPromptTemplate, así que se rellenan con str.format.
+        """
+        return self._message_templates(self._load_skill_data(skill_name))
+
+    @staticmethod
+    def _message_templates(skill_data: Dict) -> List[Tuple[str, str]]:
         sections = skill_data["sections"]
         messages = []
 
@@ -129,16 +334,11 @@ class SkillLoader:
                 f"Skill '{skill_data['metadata']['name']}' no tiene mensajes válidos. "
                 "Debe contener al menos '## System Message' y '## Human Message Template'"
             )
-
-        return ChatPromptTemplate.from_messages(messages)
+        return messages
 
     def get_skill_metadata(self, skill_name: str) -> Dict:
         """Obtiene solo los metadatos de un skill sin cargarlo completamente."""
-        if skill_name in self._cache:
-            return self._cache[skill_name]["metadata"]
-        skill_path = self.skills_dir / skill_name / "SKILL.md"
-        skill_data = self._parse_skill_file(skill_path)
-        return skill_data["metadata"]
+        return self._load_skill_data(skill_name)["metadata"]
 
     def load_skill_resource(
         self, skill_name: str, resource_name: str, use_cache: bool = True
@@ -155,12 +355,21 @@ class SkillLoader:
             Contenido del archivo en UTF-8, o None si no existe.
         """
         cache_key = (skill_name, resource_name)
-        if use_cache and cache_key in self._resource_cache:
-            return self._resource_cache[cache_key]
-        resource_path = self.skills_dir / skill_name / resource_name
-        if not resource_path.exists() or not resource_path.is_file():
+        if use_cache:
+            if cache_key in self._resource_cache:
+                return self._resource_cache[cache_key]
+            if cache_key in self._negative_resource_cache:
+                return None
+        resource_path = os.path.join(self._skills_dir_str, skill_name, resource_name)
+        try:
+            is_file = stat.S_ISREG(os.stat(resource_path).st_mode)
+        except OSError:
+            is_file = False
+        if not is_file:
+            if use_cache:
+                self._negative_resource_cache.add(cache_key)
             return None
-        content = resource_path.read_text(encoding="utf-8")
+        content = _read_utf8(resource_path)
         if use_cache:
             self._resource_cache[cache_key] = content
         return content
@@ -168,27 +377,76 @@ class SkillLoader:
     def list_available_skills(self) -> List[Dict]:
         """Lista todos los skills disponibles en el directorio."""
         skills = []
-        if not self.skills_dir.exists():
+        try:
+            entries = list(os.scandir(self._skills_dir_str))
+        except (FileNotFoundError, NotADirectoryError):
             return skills
-        for skill_dir in self.skills_dir.iterdir():
-            if not skill_dir.is_dir():
+        for entry in entries:
+            if not entry.is_dir(follow_symlinks=False):
                 continue
-            skill_file = skill_dir / "SKILL.md"
-            if skill_file.exists():
-                try:
-                    metadata = self.get_skill_metadata(skill_dir.name)
-                    skills.append(
-                        {
-                            "name": skill_dir.name,
-                            "description": metadata.get("description", ""),
-                            "version": metadata.get("version", "1.0.0"),
-                            "path": skill_file,
-                        }
-                    )
-                except Exception as e:
-                    logger.warning("Error cargando skill %s: %s", skill_dir.name, e)
+            skill_file = os.path.join(entry.path, "SKILL.md")
+            try:
+                mtime_ns = os.stat(skill_file).st_mtime_ns
+            except OSError:
+                continue
+            try:
+                metadata = self._load_skill_data(entry.name, mtime_ns=mtime_ns)["metadata"]
+                skills.append(
+                    {
+                        "name": entry.name,
+                        "description": metadata.get("description", ""),
+                        "version": metadata.get("version", "1.0.0"),
+                        "path": Path(skill_file),
+                    }
+                )
+            except Exception as e:
+                logger.warning("Error cargando skill %s: %s", entry.name, e)
         return skills
 
+    def find_skill(self, predicate: Callable[[str], bool]) -> Optional[str]:
+        """
+        Busca un skill por su campo 'name' sin parsear todos los SKILL.md.
+
+        Recorre el directorio con os.scandir y, para cada skill, lee solo el inicio del
+        archivo para obtener 'name'; se detiene en el primero que cumpla predicate.
+
+        Returns:
+            Nombre de la carpeta del skill (el que acepta load_skill), o None.
+        """
+        try:
+            entries = os.scandir(self._skills_dir_str)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        with entries:
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                name = self._peek_skill_name(entry.name, os.path.join(entry.path, "SKILL.md"))
+                if name is not None and predicate(name):
+                    return entry.name
+        return None
+
+    def _peek_skill_name(self, skill_name: str, skill_file: str) -> Optional[str]:
+        """'name' del frontmatter leyendo solo la cabecera; si no está ahí, parsea el skill."""
+        try:
+            head = _read_head(skill_file)
+        except OSError:
+            return None
+        start = head.find("\nname:")
+        close = head.find("\n---", 3)
+        if head.startswith("---") and start != -1 and (close == -1 or start < close):
+            end = head.find("\n", start + 6)
+            if end != -1:
+                try:
+                    return _simple_scalar(head[start + 6 : end].strip())
+                except _NotSimpleYaml:
+                    pass
+        try:
+            return str(self._load_skill_data(skill_name)["metadata"]["name"])
+        except Exception as e:
+            logger.debug("No se pudo leer el nombre del skill %s: %s", skill_name, e)
+            return None
+
     def validate_skill(self, skill_name: str) -> Tuple[bool, Optional[str]]:
         """
         Valida que un skill esté correctamente formateado.
@@ -219,26 +477,27 @@ class SkillLoader:
 
     def _validate_report_generator_skill(self) -> Tuple[bool, Optional[str]]:
         """Valida el skill report-generator (recurso report_template.md)."""
-        skill_dir = self.skills_dir / "report-generator"
-        skill_path = skill_dir / "SKILL.md"
-        template_path = skill_dir / "report_template.md"
-        if not skill_path.exists():
-            return False, f"Archivo no encontrado: {skill_path}"
-        if not template_path.exists() or not template_path.is_file():
-            return False, f"Recurso no encontrado: {template_path}"
+        skill_dir = os.path.join(self._skills_dir_str, "report-generator")
         try:
-            self._parse_skill_file(skill_path)  # metadata name/description
+            # Metadatos name/description; deja el skill en caché para load_skill posteriores.
+            self.get_skill_metadata("report-generator")
+        except FileNotFoundError:
+            return False, f"Archivo no encontrado: {os.path.join(skill_dir, 'SKILL.md')}"
         except Exception as e:
             return False, str(e)
-        template_content = template_path.read_text(encoding="utf-8")
-        required_placeholders = ["{title}", "{generation_date}", "{total_tasks}"]
-        for placeholder in required_placeholders:
-            if placeholder not in template_content:
-                return False, f"Falta placeholder {placeholder} en report_template.md"
+        template_content = self.load_skill_resource("report-generator", "report_template.md")
+        if template_content is None:
+            return False, f"Recurso no encontrado: {os.path.join(skill_dir, 'report_template.md')}"
+        required_placeholders = ("{title}", "{generation_date}", "{total_tasks}")
+        missing = next((p for p in required_placeholders if p not in template_content), None)
+        if missing is not None:
+            return False, f"Falta placeholder {missing} en report_template.md"
         return True, None
 
     def clear_cache(self) -> None:
-        """Limpia el caché de skills y de recursos."""
+        """Limpia el caché de skills, plantillas y recursos."""
         self._cache.clear()
+        self._template_cache.clear()
         self._resource_cache.clear()
+        self._negative_resource_cache.clear()
         logger.debug("Caché de skills limpiado")
@@ -1,20 +1,31 @@
 """Nodos del grafo LangGraph para el scraper."""
 
 import logging
+from pathlib import Path
 from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
 
 from langchain_core.runnables.config import RunnableConfig
 
 from lms_agent_scraper.graph.state import ScraperState
-from lms_agent_scraper.tools.browser_tools import (
-    get_course_links_with_playwright,
-    login_with_playwright,
-)
-from lms_agent_scraper.tools.extraction_tools import get_assignments_for_courses
-from lms_agent_scraper.tools.report_tools import generate_markdown_report, save_report
+
+# Las herramientas (Playwright, requests/BeautifulSoup, plantillas) se importan dentro de cada
+# nodo: importar este módulo (p. ej. para construir el grafo o en --help) no las carga.
 
 log = logging.getLogger(__name__)
 
+# Cursos descargados en paralelo en la extracción de tareas (si el estado no define concurrency).
+DEFAULT_EXTRACTION_CONCURRENCY = 4
+
+__all__ = [
+    "authentication_node",
+    "course_discovery_node",
+    "assignment_extractor_node",
+    "data_processor_node",
+    "report_generator_node",
+    "portal_name",
+]
+
 
 def _get_configurable(config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
     """Extrae el diccionario configurable del config (inyección de dependencias)."""
@@ -23,6 +34,86 @@ def _get_configurable(config: Optional[RunnableConfig] = None) -> Dict[str, Any]
     return config.get("configurable") or {}
 
 
+def _browser_session_kwargs(configurable: Dict[str, Any]) -> Dict[str, Any]:
+    """{"session": ...} si el workflow comparte un navegador (configurable["browser_session"])."""
+    session = configurable.get("browser_session")
+    return {"session": session} if session is not None else {}
+
+
+def _auth_state_kwargs(state: ScraperState) -> Dict[str, Any]:
+    """Argumentos de reutilización de sesión para login_fn, solo si run_workflow la configuró."""
+    if not state.get("auth_state_path"):
+        return {}
+    return {
+        "storage_state_path": state["auth_state_path"],
+        "storage_state_ttl": state.get("auth_state_ttl", 3600),
+        "force_login": state.get("force_login", False),
+    }
+
+
+def _login(state: ScraperState, configurable: Dict[str, Any], **overrides: Any) -> Dict[str, Any]:
+    """Llama a login_fn (configurable o login_with_playwright) con el perfil y las credenciales."""
+    login_fn: Optional[Callable[..., Dict[str, Any]]] = configurable.get("login_fn")
+    if login_fn is None:
+        from lms_agent_scraper.tools.browser_tools import login_with_playwright
+
+        login_fn = login_with_playwright
+    auth = _profile_section(state, "auth_profile") or {}
+    return login_fn(
+        base_url=state.get("base_url", ""),
+        username=state.get("username", ""),
+        password=state.get("password", ""),
+        auth_profile=auth,
+        login_path=auth.get("login_path", "/login/"),
+        headless=True,
+        debug=state.get("_debug", False),
+        **_browser_session_kwargs(configurable),
+        **{**_auth_state_kwargs(state), **overrides},
+    )
+
+
+def _session_updates(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos del estado que dependen del resultado de un login."""
+    updates: Dict[str, Any] = {
+        "authenticated": result.get("success", False),
+        "session_cookies": result.get("cookies", []),
+        "session_reused": bool(result.get("reused")),
+    }
+    if result.get("storage_state"):
+        updates["storage_state_file"] = result["storage_state"]
+    return updates
+
+
+def portal_name(base_url: str) -> str:
+    """Nombre del portal para títulos: el host de base_url (con o sin esquema), o "LMS"."""
+    if not base_url:
+        return "LMS"
+    parsed = urlparse(base_url if "://" in base_url else f"//{base_url}")
+    return parsed.netloc or "LMS"
+
+
+# Clave plana del estado -> sección del perfil que contiene (ver profile_sections).
+PROFILE_SECTION_KEYS = {
+    "auth_profile": "auth",
+    "navigation_profile": "navigation",
+    "courses_profile": "courses",
+    "course_discovery_profile": "course_discovery",
+    "reports_profile": "reports",
+}
+
+
+def profile_sections(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Separa el perfil en sub-dicts planos para el estado inicial (se resuelven una sola vez)."""
+    return {key: profile.get(section) for key, section in PROFILE_SECTION_KEYS.items()}
+
+
+def _profile_section(state: ScraperState, key: str) -> Any:
+    """Sub-dict del perfil precalculado en el estado; si falta, se busca en state["profile"]."""
+    if key in state:
+        return state[key]
+    return (state.get("profile") or {}).get(PROFILE_SECTION_KEYS[key])
+
+
 def authentication_node(
     state: ScraperState, config: Optional[RunnableConfig] = None
 ) -> Dict[str, Any]:
@@ -31,35 +122,20 @@ def authentication_node(
     Opcional: config["configurable"]["login_fn"] para inyectar función de login (tests).
     """
     log.info("[1/5] Autenticación: iniciando login en el portal...")
-    updates: Dict[str, Any] = {"errors": state.get("errors", [])}
-    profile = state.get("profile") or {}
-    auth = profile.get("auth", {})
-    base_url = state.get("base_url", "")
-    username = state.get("username", "")
-    password = state.get("password", "")
+    errors = list(state.get("errors", []))
+    updates: Dict[str, Any] = {"errors": errors}
 
-    if not base_url or not username or not password:
+    if not state.get("base_url") or not state.get("username") or not state.get("password"):
         log.warning("[1/5] Autenticación: faltan base_url o credenciales, omitiendo.")
         updates["authenticated"] = False
         updates["session_cookies"] = []
         return updates
 
-    configurable = _get_configurable(config)
-    login_fn: Callable[..., Dict[str, Any]] = configurable.get("login_fn") or login_with_playwright
     try:
-        result = login_fn(
-            base_url=base_url,
-            username=username,
-            password=password,
-            auth_profile=auth,
-            login_path=auth.get("login_path", "/login/"),
-            headless=True,
-            debug=state.get("_debug", False),
-        )
-        updates["authenticated"] = result.get("success", False)
-        updates["session_cookies"] = result.get("cookies", [])
+        result = _login(state, _get_configurable(config))
+        updates.update(_session_updates(result))
         if result.get("error"):
-            updates["errors"] = updates["errors"] + [result["error"]]
+            errors.append(result["error"])
         if updates["authenticated"]:
             log.info("[1/5] Autenticación: OK (sesión iniciada).")
         else:
@@ -68,7 +144,7 @@ def authentication_node(
             )
     except Exception as e:
         log.exception("[1/5] Autenticacion: error - %s", e)
-        updates["errors"] = updates["errors"] + [f"Auth error: {e}"]
+        errors.append(f"Auth error: {e}")
         updates["authenticated"] = False
         updates["session_cookies"] = []
     return updates
@@ -82,38 +158,66 @@ def course_discovery_node(
     Opcional: config["configurable"]["get_courses_fn"] para inyectar (tests).
     """
     log.info("[2/5] Descubrimiento de cursos: iniciando (abriendo /my/courses.php)...")
-    updates: Dict[str, Any] = {"errors": state.get("errors", [])}
+    errors = list(state.get("errors", []))
+    updates: Dict[str, Any] = {"errors": errors}
     if not state.get("authenticated"):
         log.warning("[2/5] Descubrimiento de cursos: omitido (no hay sesión).")
         updates["courses"] = []
         return updates
 
-    profile = state.get("profile") or {}
-    navigation = profile.get("navigation", {})
-    courses_config = profile.get("courses", {})
-    course_discovery_config = profile.get("course_discovery")
+    navigation = _profile_section(state, "navigation_profile") or {}
+    courses_config = _profile_section(state, "courses_profile") or {}
+    course_discovery_config = _profile_section(state, "course_discovery_profile")
     base_url = state.get("base_url", "")
-    cookies = state.get("session_cookies", [])
 
     configurable = _get_configurable(config)
-    get_courses_fn: Callable[..., list] = (
-        configurable.get("get_courses_fn") or get_course_links_with_playwright
-    )
-    try:
-        courses = get_courses_fn(
+    get_courses_fn: Optional[Callable[..., list]] = configurable.get("get_courses_fn")
+    if get_courses_fn is None:
+        from lms_agent_scraper.tools.browser_tools import get_course_links_with_playwright
+
+        get_courses_fn = get_course_links_with_playwright
+
+    def fetch_courses(session_state: Dict[str, Any]) -> list:
+        return get_courses_fn(
             base_url=base_url,
             navigation_profile=navigation,
             courses_profile=courses_config,
-            cookies=cookies,
+            cookies=session_state.get("session_cookies", []),
             headless=True,
             debug=state.get("_debug", False),
             course_discovery_profile=course_discovery_config,
+            max_courses=state.get("max_courses", 0),
+            **_browser_session_kwargs(configurable),
+            **(
+                {"storage_state_path": session_state["storage_state_file"]}
+                if session_state.get("storage_state_file")
+                else {}
+            ),
         )
+
+    try:
+        courses = fetch_courses(state)
+        if not courses and state.get("session_reused"):
+            # La sesión guardada puede haber caducado o sido revocada en el portal (la página de
+            # cursos redirige al login): se descarta y se repite una vez con login completo.
+            log.warning(
+                "[2/5] Descubrimiento de cursos: 0 cursos con la sesion guardada; "
+                "repitiendo con login."
+            )
+            if state.get("storage_state_file"):
+                Path(state["storage_state_file"]).unlink(missing_ok=True)
+            result = _login(state, configurable, force_login=True)
+            updates.update(_session_updates(result))
+            if not updates["authenticated"]:
+                errors.append(result.get("error") or "Login failed after expired session")
+                updates["courses"] = []
+                return updates
+            courses = fetch_courses(updates)
         updates["courses"] = courses
         log.info("[2/5] Descubrimiento de cursos: listo - %d curso(s) encontrado(s).", len(courses))
     except Exception as e:
         log.exception("[2/5] Descubrimiento de cursos: error - %s", e)
-        updates["errors"] = updates["errors"] + [f"Course discovery error: {e}"]
+        errors.append(f"Course discovery error: {e}")
         updates["courses"] = []
     return updates
 
@@ -124,7 +228,8 @@ def assignment_extractor_node(state: ScraperState) -> Dict[str, Any]:
     """
     courses = state.get("courses", [])
     log.info("[3/5] Extracción de tareas: iniciando (recorriendo %d curso(s))...", len(courses))
-    updates: Dict[str, Any] = {"errors": state.get("errors", [])}
+    errors = list(state.get("errors", []))
+    updates: Dict[str, Any] = {"errors": errors}
     if not courses:
         log.info("[3/5] Extracción de tareas: no hay cursos, omitiendo.")
         updates["assignments"] = []
@@ -140,6 +245,8 @@ def assignment_extractor_node(state: ScraperState) -> Dict[str, Any]:
     )
 
     try:
+        from lms_agent_scraper.tools.extraction_tools import get_assignments_for_courses
+
         assignments = get_assignments_for_courses(
             courses=courses,
             cookies=cookies,
@@ -147,12 +254,13 @@ def assignment_extractor_node(state: ScraperState) -> Dict[str, Any]:
             base_url=base_url,
             max_courses=max_courses,
             use_llm_first=use_llm_first,
+            concurrency=state.get("concurrency", DEFAULT_EXTRACTION_CONCURRENCY),
         )
         updates["assignments"] = assignments
         log.info("[3/5] Extraccion de tareas: listo - %d tarea(s) extraida(s).", len(assignments))
     except Exception as e:
         log.exception("[3/5] Extraccion de tareas: error - %s", e)
-        updates["errors"] = updates["errors"] + [f"Extraction error: {e}"]
+        errors.append(f"Extraction error: {e}")
         updates["assignments"] = []
     return updates
 
@@ -170,19 +278,20 @@ def report_generator_node(state: ScraperState) -> Dict[str, Any]:
     Nodo de generación de reporte: Markdown y guardado en output_dir.
     """
     log.info("[5/5] Generación de reporte: generando Markdown y guardando...")
-    updates: Dict[str, Any] = {"errors": state.get("errors", [])}
+    errors = list(state.get("errors", []))
+    updates: Dict[str, Any] = {"errors": errors}
     assignments = state.get("assignments", [])
     days_ahead = state.get("days_ahead", 7)
     days_behind = state.get("days_behind", 7)
     output_dir = state.get("output_dir", "reports")
-    profile = state.get("profile") or {}
-    reports_config = profile.get("reports", {})
+    reports_config = _profile_section(state, "reports_profile") or {}
     title_tpl = reports_config.get("title_template", "Reporte de Tareas - {portal_name}")
-    title = title_tpl.format(
-        portal_name=state.get("base_url", "").replace("https://", "").split("/")[0] or "LMS"
-    )
+    portal = state.get("portal_name") or portal_name(state.get("base_url", ""))
+    title = title_tpl.format(portal_name=portal)
 
     try:
+        from lms_agent_scraper.tools.report_tools import generate_markdown_report, save_report
+
         courses = state.get("courses", [])
         content = generate_markdown_report(
             assignments,
@@ -198,6 +307,6 @@ def report_generator_node(state: ScraperState) -> Dict[str, Any]:
         log.info("[5/5] Generacion de reporte: listo - %s", report_path)
     except Exception as e:
         log.exception("[5/5] Generacion de reporte: error - %s", e)
-        updates["errors"] = updates["errors"] + [f"Report error: {e}"]
+        errors.append(f"Report error: {e}")
         updates["report_path"] = ""
     return updates
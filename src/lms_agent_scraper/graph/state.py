@@ -1,6 +1,6 @@
 """Definición del estado del grafo LangGraph para el scraper."""
 
-from typing import Any, Dict, List, TypedDict
+from typing import Any, Dict, List, Optional, TypedDict
 
 
 class ScraperState(TypedDict, total=False):
@@ -14,11 +14,25 @@ class ScraperState(TypedDict, total=False):
     report_path: str
     profile_name: str
     base_url: str
+    portal_name: str
     username: str
     password: str
     profile: Dict[str, Any]
+    # Secciones del perfil resueltas una vez en run_workflow (nodes.profile_sections)
+    auth_profile: Dict[str, Any]
+    navigation_profile: Dict[str, Any]
+    courses_profile: Dict[str, Any]
+    course_discovery_profile: Optional[Dict[str, Any]]
+    reports_profile: Dict[str, Any]
     # Parámetros de ejecución
     days_ahead: int
     days_behind: int
     max_courses: int
+    concurrency: int
     output_dir: str
+    # Reutilización de sesión (storage_state de Playwright)
+    auth_state_path: str
+    auth_state_ttl: int
+    force_login: bool
+    storage_state_file: str
+    session_reused: bool
@@ -4,6 +4,7 @@ Flujo: Start -> Auth -> CourseDiscovery -> AssignmentExtractor -> DataProcessor
 """
 
 import logging
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, Optional
 from urllib.parse import urlparse
@@ -12,6 +13,7 @@ from lms_agent_scraper.graph.state import ScraperState
 from lms_agent_scraper.graph import nodes
 
 
+@lru_cache(maxsize=256)
 def _normalize_base_url(url: str) -> str:
     """
     Normaliza la URL del portal al origen (scheme + netloc).
@@ -64,6 +66,21 @@ def build_workflow():
     return workflow.compile()
 
 
+_COMPILED_GRAPH = None
+
+
+def _get_graph(rebuild: bool = False):
+    """
+    Devuelve el grafo compilado, construyéndolo solo la primera vez.
+    Los nodos no guardan estado propio (leen el dict de estado), así que se puede compartir.
+    rebuild=True fuerza una nueva compilación (p. ej. tests que sustituyen nodos).
+    """
+    global _COMPILED_GRAPH
+    if _COMPILED_GRAPH is None or rebuild:
+        _COMPILED_GRAPH = build_workflow()
+    return _COMPILED_GRAPH
+
+
 def run_workflow(
     profile_name: str,
     base_url: str,
@@ -75,9 +92,18 @@ def run_workflow(
     output_dir: str = "reports",
     profiles_dir: Optional[Path] = None,
     debug: bool = False,
+    concurrency: int = nodes.DEFAULT_EXTRACTION_CONCURRENCY,
+    auth_state_path: str = "",
+    auth_state_ttl: int = 3600,
+    force_login: bool = False,
+    browser_no_sandbox: bool = False,
 ) -> Dict[str, Any]:
     """
     Ejecuta el workflow: carga el perfil, construye estado inicial e invoca el grafo.
+    concurrency: cursos que se descargan en paralelo al extraer tareas.
+    auth_state_path: si no está vacío, se guarda/reutiliza la sesión del login (storage_state)
+    durante auth_state_ttl segundos; force_login obliga a iniciar sesión de nuevo.
+    browser_no_sandbox: lanzar Chromium sin sandbox (solo contenedores como root).
     """
     from lms_agent_scraper.core.profile_loader import ProfileLoader
 
@@ -90,16 +116,23 @@ def run_workflow(
         "Workflow: perfil cargado. Iniciando grafo (Auth -> Cursos -> Tareas -> Proceso -> Reporte)."
     )
 
+    normalized_base_url = _normalize_base_url(base_url)
     initial: ScraperState = {
         "profile_name": profile_name,
-        "base_url": _normalize_base_url(base_url),
+        "base_url": normalized_base_url,
+        "portal_name": nodes.portal_name(normalized_base_url),
         "username": username,
         "password": password,
         "profile": profile_dict,
+        **nodes.profile_sections(profile_dict),
         "days_ahead": days_ahead,
         "days_behind": days_behind,
         "max_courses": max_courses,
+        "concurrency": concurrency,
         "output_dir": output_dir,
+        "auth_state_path": auth_state_path,
+        "auth_state_ttl": auth_state_ttl,
+        "force_login": force_login,
         "authenticated": False,
         "session_cookies": [],
         "courses": [],
@@ -109,8 +142,12 @@ def run_workflow(
         "_debug": debug,
     }
 
-    graph = build_workflow()
-    config = {"configurable": {}}
-    final_state = graph.invoke(initial, config=config)
+    from lms_agent_scraper.tools.browser_tools import BrowserSession
+
+    graph = _get_graph()
+    # Un solo navegador para login y descubrimiento de cursos (se lanza solo si se usa).
+    with BrowserSession(headless=True, no_sandbox=browser_no_sandbox) as browser_session:
+        config = {"configurable": {"browser_session": browser_session}}
+        final_state = graph.invoke(initial, config=config)
     log.info("Workflow: grafo finalizado.")
     return dict(final_state)
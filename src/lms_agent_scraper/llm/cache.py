@@ -0,0 +1,98 @@
+"""
+Caché persistente (SQLite) de respuestas del LLM.
+La clave es un hash del modelo, las opciones de generación y los mensajes: las mismas entradas
+(p. ej. el mismo HTML de "Mis cursos" en otra ejecución del workflow) no vuelven a invocar Ollama.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Respuestas del LLM en una tabla SQLite (clave TEXT, respuesta TEXT, expiración)."""
+
+    def __init__(self, path: Path, ttl_seconds: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disabled = False
+
+    @staticmethod
+    def make_key(model: str, messages: Any, options: Any) -> str:
+        """Hash estable de la petición (modelo + opciones + mensajes)."""
+        payload = json.dumps([model, options, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=20).hexdigest()
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        """Abre la base la primera vez; si no se puede, desactiva la caché (sin errores)."""
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+            self._conn = conn
+        except (OSError, sqlite3.Error) as e:
+            logger.debug("Caché de respuestas LLM desactivada (%s): %s", self.path, e)
+            self._disabled = True
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Respuesta guardada y vigente para key, o None."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT response FROM responses WHERE key = ? AND expires_at >= ?",
+                    (key, time.time()),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.debug("Error leyendo caché LLM: %s", e)
+                return None
+        return row[0] if row else None
+
+    def set(self, key: str, response: str) -> None:
+        """Guarda la respuesta con expiración ahora + ttl_seconds."""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires_at) VALUES (?, ?, ?)",
+                    (key, response, time.time() + self.ttl_seconds),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.debug("Error escribiendo caché LLM: %s", e)
+
+    def clear(self) -> None:
+        """Borra todas las respuestas guardadas."""
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+
+
+@lru_cache(maxsize=8)
+def get_response_cache(path: str, ttl_seconds: int) -> ResponseCache:
+    """ResponseCache compartida por proceso para (path, ttl_seconds)."""
+    return ResponseCache(Path(path), ttl_seconds)
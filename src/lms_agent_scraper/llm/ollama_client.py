@@ -4,26 +4,467 @@ extracción de cursos desde la página "Mis cursos" (fallback con LLM).
 Soporta prompts desde SKILL.md (skills_dir) con fallback a prompts hardcodeados.
 """
 
-import json
+import asyncio
 import logging
 import re
+import threading
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
-from lms_agent_scraper.config.ollama_config import OllamaSettings
+from lms_agent_scraper.config.ollama_config import OllamaSettings, get_ollama_settings
+from lms_agent_scraper.llm.cache import ResponseCache, get_response_cache
 
 logger = logging.getLogger(__name__)
 
 try:
     from langchain_ollama import ChatOllama
-    from langchain_core.messages import HumanMessage
+    from langchain_core.messages import HumanMessage, SystemMessage
 
     OLLAMA_AVAILABLE = True
 except ImportError:
     OLLAMA_AVAILABLE = False
     ChatOllama = None
     HumanMessage = None
+    SystemMessage = None
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    from bs4 import BeautifulSoup, Tag
+
+    BS4_AVAILABLE = True
+except ImportError:
+    BS4_AVAILABLE = False
+    BeautifulSoup = None
+    Tag = None
+
+try:
+    import httpx
+
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    httpx = None
+
+try:
+    from ollama import AsyncClient
+
+    ASYNC_OLLAMA_AVAILABLE = True
+except ImportError:
+    ASYNC_OLLAMA_AVAILABLE = False
+    AsyncClient = None
+
+
+_MD_FENCE_OPEN_RE = re.compile(r"^```\w*\n?")
+_MD_FENCE_CLOSE_RE = re.compile(r"\n?```\s*$")
+_ISO_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+# Bloques sin texto útil para el modelo: código, estilos, iconos SVG y alternativas sin JS.
+_NON_CONTENT_BLOCK_RE = re.compile(
+    r"<(script|style|noscript|svg)\b[^>]*>[\s\S]*?</\1\s*>", re.IGNORECASE
+)
+_NON_CONTENT_OPEN_RE = re.compile(r"<(?:script|style|noscript|svg)\b", re.IGNORECASE)
+
+
+def html_snippet(html: str, max_chars: int) -> str:
+    """
+    Quita bloques <script>/<style>/<noscript>/<svg> del HTML y lo recorta a max_chars
+    (fragmento para el LLM). Equivale a _NON_CONTENT_BLOCK_RE.sub("", html)[:max_chars], pero
+    cada apertura se busca solo en los caracteres que aún caben en el fragmento, así que el
+    trabajo depende de max_chars y de los bloques eliminados, no del tamaño total del HTML.
+    """
+    parts: List[str] = []
+    remaining = max_chars
+    pos = 0
+    end = len(html)
+    while remaining > 0 and pos < end:
+        # +10: una apertura que empieza dentro del límite ("<noscript" + 1 carácter) se ve entera.
+        opening = _NON_CONTENT_OPEN_RE.search(html, pos, min(end, pos + remaining + 10))
+        if opening is None or opening.start() >= pos + remaining:
+            parts.append(html[pos : pos + remaining])
+            break
+        start = opening.start()
+        parts.append(html[pos:start])
+        remaining -= start - pos
+        block = _NON_CONTENT_BLOCK_RE.match(html, start)
+        if block is None:
+            # Apertura sin cierre (o cortada por el límite): se conserva como texto.
+            parts.append(html[start : opening.end()])
+            remaining -= opening.end() - start
+            pos = opening.end()
+        else:
+            pos = block.end()
+    snippet = "".join(parts)
+    return snippet[:max_chars] if len(snippet) > max_chars else snippet
+
+
+COURSE_HREF_PATTERNS = ("course/view.php",)
+ASSIGNMENT_HREF_PATTERNS = ("mod/assign", "mod/quiz", "mod/forum", "mod/workshop")
+_HEADING_TAGS = frozenset(("h1", "h2", "h3", "h4"))
+
+
+def _text_of(el: Any) -> str:
+    return " ".join(el.get_text(" ", strip=True).split())
+
+
+_COURSE_ID_RE = re.compile(r"course/view\.php\?(?:[^#]*&)?id=(\d+)")
+_ACTIVITY_HREF_RE = re.compile(
+    r"href\s*=\s*[\"']?[^\"'>]*mod/(?:assign|quiz|forum|workshop)/", re.IGNORECASE
+)
+# URL de actividad aceptada en la respuesta del modelo (una sola pasada sobre la URL).
+_ASSIGN_URL_RE = re.compile(r"mod/|assign|quiz|forum|workshop")
+_VALID_ACTIVITY_TYPES = frozenset(("assignment", "quiz", "forum", "workshop"))
+
+
+@lru_cache(maxsize=2048)
+def _absolute_url(base_url: str, href: str) -> str:
+    """urljoin(base_url + "/", href) con caché: los mismos enlaces se repiten entre cursos y ejecuciones."""
+    if "/." not in href:
+        # Casos habituales sin urljoin (mismo resultado): URL absoluta, o ruta desde la raíz
+        # cuando base_url es solo esquema + host.
+        if href.startswith(("http://", "https://")):
+            return href
+        if href.startswith("/") and not href.startswith("//") and base_url.count("/") == 2:
+            return base_url + href
+    return urljoin(base_url + "/", href)
+
+
+def _parse_courses_fast(html: str, base_url: str) -> List[Dict[str, str]]:
+    """
+    Extracción determinista de cursos: enlaces course/view.php?id=N (nombre = texto del enlace,
+    o aria-label/title), sin repetir id. Retorna [] si no hay BeautifulSoup o enlaces.
+    """
+    if not BS4_AVAILABLE or "course/view.php" not in html:
+        return []
+    base_url = base_url.rstrip("/")
+    soup = BeautifulSoup(html, "html.parser")
+    courses: List[Dict[str, str]] = []
+    index_by_id: Dict[str, int] = {}
+    for a in soup.find_all("a", href=True):
+        match = _COURSE_ID_RE.search(a["href"])
+        if not match:
+            continue
+        name = _text_of(a) or (a.get("aria-label") or a.get("title") or "").strip()
+        course_id = match.group(1)
+        if course_id in index_by_id:
+            # Tarjetas con imagen + título: el primer enlace puede no tener texto.
+            i = index_by_id[course_id]
+            if courses[i]["name"] == "Sin nombre" and name:
+                courses[i]["name"] = name
+            continue
+        index_by_id[course_id] = len(courses)
+        url = _absolute_url(base_url, a["href"].strip())
+        courses.append({"url": url, "name": name or "Sin nombre"})
+    return courses
+
+
+def link_digest(
+    html: str, href_patterns: Tuple[str, ...], max_chars: int, with_context: bool = False
+) -> str:
+    """
+    Resume el HTML a una línea "texto | href | section:encabezado" por cada <a> cuyo href
+    contenga algún patrón (sin repetir href). Es lo único que el modelo necesita para extraer
+    cursos o tareas, y ocupa una fracción del HTML. Retorna "" si no hay enlaces así.
+    with_context: añade el texto del <li> (o padre) del enlace, donde Moodle muestra las fechas.
+    """
+    if not BS4_AVAILABLE or not html:
+        return ""
+    soup = BeautifulSoup(html, "html.parser")
+    lines: List[str] = []
+    seen: set = set()
+    section = ""
+    size = 0
+    for el in soup.descendants:
+        if not isinstance(el, Tag):
+            continue
+        if el.name in _HEADING_TAGS:
+            section = _text_of(el)[:80]
+            continue
+        if el.name != "a":
+            continue
+        href = (el.get("href") or "").strip()
+        if href in seen or not any(p in href for p in href_patterns):
+            continue
+        seen.add(href)
+        text = _text_of(el) or el.get("aria-label") or el.get("title") or ""
+        line = f"{text} | {href} | section:{section}" if section else f"{text} | {href}"
+        if with_context:
+            container = el.find_parent("li") or el.parent
+            context = _text_of(container).replace(text, "", 1).strip() if container else ""
+            if context:
+                line += f" | {context[:160]}"
+        size += len(line) + 1
+        if size > max_chars:
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def page_digest(html: str, max_links: int = 40, max_headings: int = 10) -> str:
+    """
+    Resumen de una página para clasificarla: <title>, encabezados h1-h3 y los primeros
+    max_links enlaces ("texto | href"). Retorna "" si no se puede parsear.
+    """
+    if not BS4_AVAILABLE or not html:
+        return ""
+    soup = BeautifulSoup(html, "html.parser")
+    lines: List[str] = []
+    if soup.title is not None:
+        lines.append(f"title: {_text_of(soup.title)}")
+    headings = soup.find_all(["h1", "h2", "h3"], limit=max_headings)
+    lines.extend(f"{h.name}: {_text_of(h)}" for h in headings if _text_of(h))
+    links = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"].strip()
+        if not href or href.startswith("#") or href.startswith("javascript:"):
+            continue
+        links.append(f"{_text_of(a)} | {href}")
+        if len(links) >= max_links:
+            break
+    if links:
+        lines.append("enlaces:")
+        lines.extend(links)
+    return "\n".join(lines)
+
+
+_HTTP_CLIENT: Optional[Any] = None
+_HTTP_CLIENT_LOCK = threading.Lock()
+
+
+def _get_http_client(timeout: float) -> Any:
+    """
+    Cliente httpx compartido por el proceso: mantiene conexiones keep-alive con el servidor
+    Ollama entre llamadas (y entre instancias de LocalLLMClient).
+    """
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        with _HTTP_CLIENT_LOCK:
+            if _HTTP_CLIENT is None:
+                _HTTP_CLIENT = httpx.Client(
+                    transport=httpx.HTTPTransport(retries=1),
+                    timeout=httpx.Timeout(timeout, connect=10.0),
+                    limits=httpx.Limits(
+                        max_keepalive_connections=40,
+                        max_connections=100,
+                        keepalive_expiry=30.0,
+                    ),
+                )
+    return _HTTP_CLIENT
+
+
+# Prompt para /api/chat: texto (un único mensaje de usuario) o lista de {"role", "content"}.
+Prompt = Union[str, List[Dict[str, str]]]
+
+
+def _chat_messages(prompt: Prompt) -> List[Dict[str, str]]:
+    """Normaliza un Prompt a la lista de mensajes de /api/chat."""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return prompt
+
+
+def _system_user(system: str, user: str) -> List[Dict[str, str]]:
+    """Mensajes system (fijo) + user (variable)."""
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+
+# Esquemas JSON para el "format" de /api/chat (salida restringida a esa forma).
+_SELECTORS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "assignment_selector": {"type": "string"},
+        "date_selector": {"type": "string"},
+    },
+    "required": ["assignment_selector", "date_selector"],
+}
+_COURSES_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"name": {"type": "string"}, "url": {"type": "string"}},
+        "required": ["name", "url"],
+    },
+}
+_PAGE_CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {"is_course": {"type": "boolean"}, "course_name": {"type": "string"}},
+    "required": ["is_course", "course_name"],
+}
+_PAGE_BATCH_CLASSIFICATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "url": {"type": "string"},
+            "is_course": {"type": "boolean"},
+            "course_name": {"type": "string"},
+        },
+        "required": ["url", "is_course", "course_name"],
+    },
+}
+_ASSIGNMENTS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": {"type": "string"},
+            "due_date": {"type": "string"},
+            "url": {"type": "string"},
+            "type": {"type": "string", "enum": ["assignment", "quiz", "forum", "workshop"]},
+        },
+        "required": ["title", "due_date", "url", "type"],
+    },
+}
+
+
+def _assignments_by_course_schema(n_courses: int) -> Dict[str, Any]:
+    """Esquema del extractor multi-curso: {"CURSO 1": [...], ..., "CURSO n": [...]}."""
+    keys = [f"CURSO {i}" for i in range(1, n_courses + 1)]
+    return {
+        "type": "object",
+        "properties": {key: _ASSIGNMENTS_SCHEMA for key in keys},
+        "required": keys,
+    }
+
+
+_LINKS_LABEL = (
+    "Enlaces extraídos del HTML (texto | url | section:encabezado de la sección"
+    " | texto alrededor, si lo hay):"
+)
+
+# Prompts de respaldo (sin SKILL.md). Las instrucciones fijas van en el mensaje system y los
+# datos variables (HTML, fechas, errores) al final en el mensaje user: con el mismo modelo,
+# Ollama reutiliza la caché KV del prefijo system entre llamadas y solo procesa lo nuevo.
+_HTML_STRUCTURE_SYSTEM = """Analiza el HTML que se te envía y propón selectores CSS para:
+1) Enlaces a tareas/assignments (assignment_selector)
+2) Elementos que muestran fecha de entrega (date_selector)
+
+Responde ÚNICAMENTE con un JSON válido, sin markdown, con exactamente estas claves:
+{"assignment_selector": "selector_css", "date_selector": "selector_css"}"""
+
+_DATE_INTERPRETER_SYSTEM = """Recibirás una fecha encontrada en un LMS y su contexto.
+Convierte a formato ISO (YYYY-MM-DD). Responde SOLO con la fecha en formato ISO, nada más."""
+
+_SELECTOR_SUGGESTER_SYSTEM = """Recibirás un error ocurrido durante el scraping (y a veces un fragmento HTML).
+Sugiere selectores CSS alternativos para encontrar enlaces a tareas/assignments en un LMS tipo Moodle.
+Responde ÚNICAMENTE con JSON: {"assignment_selector": "...", "date_selector": "..."}"""
+
+# Ejemplo de URL en el prompt: formato típico Moodle (ejemplo Unisimon: aulapregrado.unisimon.edu.co).
+_COURSE_EXTRACTOR_SYSTEM = """El HTML (o la lista de enlaces extraída de él) que se te envía corresponde a la página "Mis cursos" de un campus Moodle.
+Tu tarea: extraer TODOS los cursos listados. Para cada curso necesito:
+1) El nombre completo del curso (tal como aparece en pantalla).
+2) La URL del curso. Debe contener "course/view.php" y el parámetro "id" (ej: course/view.php?id=3418).
+   Si la URL es relativa (empieza con / o sin dominio), considérala relativa al sitio.
+
+Responde ÚNICAMENTE con un JSON válido: un array de objetos, cada uno con exactamente dos claves "name" y "url".
+Ejemplo: [{"name": "Nombre del curso", "url": "https://aulapregrado.unisimon.edu.co/course/view.php?id=3418"}]
+No incluyas explicaciones ni markdown. Solo el array JSON."""
+
+_PAGE_CLASSIFIER_SYSTEM = """El contenido que se te envía (HTML, o título, encabezados y enlaces extraídos de él) es de un sitio LMS tipo Moodle (ej. Aula Pregrado).
+Determina si esta página es una PÁGINA DE CURSO (vista principal de un curso), no una lista de cursos ni el dashboard.
+
+Señales de página de curso:
+- Título del curso (h1, .course-header, .page-header, o similar).
+- Secciones o módulos del curso (temas, semanas).
+- Enlaces a actividades: mod/assign, mod/quiz, mod/forum, tareas, foros, cuestionarios.
+- Navegación típica de curso (pestañas, bloques laterales de curso).
+
+Si es solo una lista de cursos, el dashboard, login o una página genérica, NO es página de curso.
+
+Responde ÚNICAMENTE con un JSON válido, sin markdown, con exactamente estas claves:
+{"is_course": true o false, "course_name": "nombre del curso tal como aparece en la página o vacío si no es curso"}"""
+
+_PAGE_BATCH_CLASSIFIER_SYSTEM = """Las páginas que se te envían son de un sitio LMS tipo Moodle (ej. Aula Pregrado).
+Cada página está delimitada por "=== PAGINA N ===" con su URL y su HTML (o título, encabezados y enlaces extraídos de él).
+Para cada una determina si es una PÁGINA DE CURSO (vista principal de un curso), no una lista de cursos ni el dashboard.
+
+Señales de página de curso:
+- Título del curso (h1, .course-header, .page-header, o similar).
+- Secciones o módulos del curso (temas, semanas).
+- Enlaces a actividades: mod/assign, mod/quiz, mod/forum, tareas, foros, cuestionarios.
+
+Responde ÚNICAMENTE con un array JSON válido, sin markdown, con un objeto por página y en el mismo orden:
+[{"url": "URL de la página", "is_course": true o false, "course_name": "nombre del curso o vacío"}]"""
+
+_ASSIGNMENT_EXTRACTOR_SYSTEM = """El HTML (o la lista de enlaces extraída de él) que se te envía es la página principal de un curso en un LMS tipo Moodle (Aula Pregrado).
+
+Tu tarea: identificar TODAS las tareas, entregas, actividades evaluables (tareas, entregas, cuestionarios, foros de entrega, talleres, etc.), aunque la redacción sea diversa. Para cada una extrae:
+1) title: título tal como aparece.
+2) due_date: fecha de entrega o vencimiento si está visible (texto o formato coherente); si no hay, cadena vacía "".
+3) url: URL del enlace a la actividad (absoluta o relativa al sitio). Debe contener mod/assign, mod/quiz, mod/forum o mod/workshop.
+4) type: uno de assignment, quiz, forum, workshop.
+
+Responde ÚNICAMENTE con un JSON válido: un array de objetos con exactamente las claves "title", "due_date", "url", "type".
+Ejemplo: [{"title": "Tarea 1", "due_date": "15/03/2026", "url": "/mod/assign/view.php?id=123", "type": "assignment"}]
+No incluyas explicaciones ni markdown. Solo el array JSON."""
+
+_ASSIGNMENT_BATCH_EXTRACTOR_SYSTEM = """Se te envían varias páginas principales de cursos de un LMS tipo Moodle (Aula Pregrado).
+Cada curso está delimitado por "=== CURSO N ===" con su nombre, la base URL del sitio y su HTML (o la lista de enlaces extraída de él).
+
+Para cada curso identifica TODAS las tareas, entregas y actividades evaluables (tareas, cuestionarios, foros de entrega, talleres, etc.) y extrae:
+1) title: título tal como aparece.
+2) due_date: fecha de entrega o vencimiento si está visible; si no hay, cadena vacía "".
+3) url: URL del enlace a la actividad (absoluta o relativa al sitio). Debe contener mod/assign, mod/quiz, mod/forum o mod/workshop.
+4) type: uno de assignment, quiz, forum, workshop.
+
+Responde ÚNICAMENTE con un objeto JSON válido, sin markdown, con una clave por curso ("CURSO 1", "CURSO 2", ...) cuyo valor es el array de sus actividades (vacío si no tiene):
+{"CURSO 1": [{"title": "Tarea 1", "due_date": "15/03/2026", "url": "/mod/assign/view.php?id=123", "type": "assignment"}], "CURSO 2": []}"""
+
+
+class _BalancedJsonScanner:
+    """
+    Sigue la profundidad de corchetes/llaves de un texto recibido por partes (ignorando los que
+    van dentro de cadenas JSON) y detecta dónde se cierra el primer valor de nivel superior.
+    max_items: con closer "]", corta también al cerrarse ese número de objetos del array
+    (truncated queda en True y quien llama debe añadir el "]" final).
+    """
+
+    def __init__(self, closer: str, max_items: Optional[int] = None):
+        self.closer = closer
+        self.opener = "[" if closer == "]" else "{"
+        self.max_items = max_items if closer == "]" else None
+        self.items = 0
+        self.truncated = False
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text: str) -> Optional[int]:
+        """Índice (exclusivo) en text donde se cierra el valor (o el último objeto pedido), o None."""
+        for i, ch in enumerate(text):
+            if not self.started:
+                if ch == self.opener:
+                    self.started = True
+                    self.depth = 1
+                continue
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "[" or ch == "{":
+                self.depth += 1
+            elif ch == "]" or ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+                if self.depth == 1 and ch == "}" and self.max_items:
+                    self.items += 1
+                    if self.items >= self.max_items:
+                        self.truncated = True
+                        return i + 1
+        return None
 
 
 def _default_skills_dir() -> Path:
@@ -31,6 +472,18 @@ def _default_skills_dir() -> Path:
     return Path(__file__).resolve().parent.parent / "skills"
 
 
+@lru_cache(maxsize=8)
+def _shared_skill_loader(skills_dir: Path) -> Any:
+    """SkillLoader compartido por proceso para skills_dir (su caché se invalida por mtime)."""
+    from lms_agent_scraper.core.skill_loader import SkillLoader
+
+    return SkillLoader(skills_dir)
+
+
+# Marca de ChatOllama aún no construido (se crea en el primer uso, ver LocalLLMClient._chat_model).
+_LLM_UNSET: Any = object()
+
+
 class LocalLLMClient:
     """Cliente para inferencia local con GLM-4.7-Flash vía Ollama."""
 
@@ -39,14 +492,27 @@ class LocalLLMClient:
         settings: Optional[OllamaSettings] = None,
         skills_dir: Optional[Path] = None,
     ):
-        self.settings = settings or OllamaSettings()
+        self.settings = settings or get_ollama_settings()
         self._skills_dir = Path(skills_dir) if skills_dir is not None else _default_skills_dir()
         self._skill_loader = None
-        self._llm = None
-        if OLLAMA_AVAILABLE:
+        # ChatOllama solo se usa como fallback sin httpx: se construye en el primer uso.
+        self._llm: Any = _LLM_UNSET if OLLAMA_AVAILABLE else None
+        self._response_cache: Optional[ResponseCache] = None
+        if self.settings.response_cache_ttl > 0 and self.settings.response_cache_path:
+            self._response_cache = get_response_cache(
+                self.settings.response_cache_path, self.settings.response_cache_ttl
+            )
+
+    @property
+    def available(self) -> bool:
+        return OLLAMA_AVAILABLE and self._llm is not None
+
+    def _chat_model(self) -> Any:
+        """ChatOllama construido perezosamente (None si no se puede crear)."""
+        if self._llm is _LLM_UNSET:
             try:
                 self._llm = ChatOllama(
-                    model=self.settings.model_name,
+                    model=self.settings.resolved_model_name,
                     base_url=self.settings.base_url,
                     temperature=self.settings.temperature,
                     num_ctx=self.settings.num_ctx,
@@ -54,32 +520,269 @@ class LocalLLMClient:
                 )
             except Exception:
                 self._llm = None
+        return self._llm
 
-    @property
-    def available(self) -> bool:
-        return OLLAMA_AVAILABLE and self._llm is not None
+    def _chat_options(
+        self,
+        stop: Optional[List[str]] = None,
+        max_tokens: Optional[int] = None,
+        num_ctx: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Opciones de generación enviadas a /api/chat. max_tokens acota num_predict para respuestas
+        cortas conocidas (el servidor deja de generar ahí); stop corta en esas secuencias.
+        num_ctx: contexto menor para prompts cortos (caché KV más pequeña); solo se aplica con
+        adaptive_num_ctx, porque Ollama recarga el modelo cuando num_ctx cambia entre peticiones.
+        """
+        options: Dict[str, Any] = {
+            "temperature": self.settings.temperature,
+            "num_ctx": self.settings.num_ctx,
+            "num_predict": self.settings.num_predict,
+        }
+        if max_tokens is not None:
+            options["num_predict"] = min(max_tokens, self.settings.num_predict)
+        if num_ctx is not None and self.settings.adaptive_num_ctx:
+            options["num_ctx"] = min(num_ctx, self.settings.num_ctx)
+        if stop:
+            options["stop"] = list(stop)
+        return options
+
+    def _chat_payload(
+        self, prompt: Prompt, options: Dict[str, Any], stream: bool, json_schema: Any = None
+    ) -> Dict:
+        payload: Dict[str, Any] = {
+            "model": self.settings.resolved_model_name,
+            "messages": _chat_messages(prompt),
+            "stream": stream,
+            "options": options,
+        }
+        if json_schema is not None:
+            # Decodificación restringida: la salida siempre es JSON válido con ese esquema.
+            payload["format"] = json_schema
+        if self.settings.keep_alive is not None:
+            payload["keep_alive"] = self.settings.keep_alive
+        return payload
+
+    def _chat_http(
+        self, prompt: Prompt, options: Optional[Dict[str, Any]] = None, json_schema: Any = None
+    ) -> str:
+        """POST a /api/chat con el cliente httpx compartido (conexión reutilizada)."""
+        payload = self._chat_payload(
+            prompt, options or self._chat_options(), stream=False, json_schema=json_schema
+        )
+        client = _get_http_client(self.settings.request_timeout)
+        response = client.post(f"{self.settings.base_url.rstrip('/')}/api/chat", json=payload)
+        response.raise_for_status()
+        return response.json()["message"]["content"] or ""
+
+    def _chat_http_stream(
+        self,
+        prompt: Prompt,
+        options: Dict[str, Any],
+        closer: str,
+        json_schema: Any = None,
+        max_items: Optional[int] = None,
+    ) -> str:
+        """
+        /api/chat en streaming: devuelve el texto en cuanto se cierra el primer valor JSON de
+        nivel superior (closer "]" o "}"), o en cuanto el array tiene max_items objetos (se cierra
+        con "]"). Al cerrar la respuesta, Ollama deja de generar.
+        """
+        scanner = _BalancedJsonScanner(closer, max_items)
+        parts: List[str] = []
+        payload = self._chat_payload(prompt, options, stream=True, json_schema=json_schema)
+        client = _get_http_client(self.settings.request_timeout)
+        url = f"{self.settings.base_url.rstrip('/')}/api/chat"
+        with client.stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = _json_loads(line)
+                content = (chunk.get("message") or {}).get("content") or ""
+                end = scanner.feed(content) if content else None
+                if end is not None:
+                    parts.append(content[:end])
+                    if scanner.truncated:
+                        parts.append(closer)
+                    break
+                parts.append(content)
+                if chunk.get("done"):
+                    break
+        return "".join(parts)
+
+    def _cache_key(
+        self,
+        prompt: Prompt,
+        options: Dict[str, Any],
+        stop_on_balanced: Optional[str] = None,
+        json_schema: Any = None,
+        max_items: Optional[int] = None,
+    ) -> str:
+        key_options: List[Any] = [options, stop_on_balanced, json_schema]
+        if max_items:
+            key_options.append(max_items)
+        return ResponseCache.make_key(
+            self.settings.resolved_model_name, _chat_messages(prompt), key_options
+        )
 
-    def _invoke(self, prompt: str) -> str:
+    def _invoke(
+        self,
+        prompt: Prompt,
+        stop: Optional[List[str]] = None,
+        max_tokens: Optional[int] = None,
+        stop_on_balanced: Optional[str] = None,
+        num_ctx: Optional[int] = None,
+        json_schema: Any = None,
+        max_items: Optional[int] = None,
+    ) -> str:
+        """
+        Invoca el modelo y devuelve el texto de la respuesta ("" si falla).
+        stop / max_tokens / num_ctx: ver _chat_options. stop_on_balanced: "]" o "}" para leer en streaming
+        y cortar al cerrarse el JSON de nivel superior. json_schema: "format" de /api/chat
+        (esquema JSON o "json") para que la salida sea siempre JSON válido. max_items: con
+        stop_on_balanced="]", deja de generar tras ese número de objetos del array.
+        """
         if not self._llm:
             return ""
+        options = self._chat_options(stop, max_tokens, num_ctx)
+        key = None
+        if self._response_cache is not None:
+            key = self._cache_key(prompt, options, stop_on_balanced, json_schema, max_items)
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                logger.debug("Respuesta del modelo desde caché (%s)", key[:12])
+                return cached
         try:
-            response = self._llm.invoke([HumanMessage(content=prompt)])
-            out = (response.content or "").strip()
+            if HTTPX_AVAILABLE and stop_on_balanced:
+                out = self._chat_http_stream(
+                    prompt, options, stop_on_balanced, json_schema, max_items
+                ).strip()
+            elif HTTPX_AVAILABLE:
+                out = self._chat_http(prompt, options, json_schema=json_schema).strip()
+            else:
+                llm = self._chat_model()
+                if llm is None:
+                    return ""
+                response = llm.invoke(
+                    [
+                        SystemMessage(content=m["content"])
+                        if m["role"] == "system"
+                        else HumanMessage(content=m["content"])
+                        for m in _chat_messages(prompt)
+                    ],
+                    stop=stop,
+                )
+                out = (response.content or "").strip()
             logger.info("Respuesta del modelo: %s", out[:2000] + ("..." if len(out) > 2000 else ""))
+            if key is not None and out:
+                self._response_cache.set(key, out)
             return out
         except Exception:
             return ""
 
+    async def _ainvoke(
+        self,
+        client: Any,
+        semaphore: asyncio.Semaphore,
+        prompt: Prompt,
+        options: Dict[str, Any],
+        json_schema: Any = None,
+    ) -> str:
+        """Versión asíncrona de _invoke con ollama.AsyncClient (limitada por semaphore)."""
+        try:
+            async with semaphore:
+                response = await client.chat(
+                    model=self.settings.resolved_model_name,
+                    messages=_chat_messages(prompt),
+                    options=options,
+                    format=json_schema,
+                    keep_alive=self.settings.keep_alive,
+                )
+            out = (response["message"]["content"] or "").strip()
+            logger.info("Respuesta del modelo: %s", out[:2000] + ("..." if len(out) > 2000 else ""))
+            return out
+        except Exception:
+            return ""
+
+    async def _ainvoke_all(
+        self, prompts: List[Prompt], options: Dict[str, Any], json_schema: Any = None
+    ) -> List[str]:
+        # Un AsyncClient por lote: su pool httpx queda ligado al event loop de asyncio.run, así que
+        # se cierra antes de salir del loop (si no, sus conexiones quedan abiertas).
+        semaphore = asyncio.Semaphore(max(1, self.settings.num_parallel))
+        async with AsyncClient(
+            host=self.settings.base_url, timeout=self.settings.request_timeout
+        ) as client:
+            return await asyncio.gather(
+                *(self._ainvoke(client, semaphore, p, options, json_schema) for p in prompts)
+            )
+
+    def _invoke_many(
+        self,
+        prompts: List[Prompt],
+        stop: Optional[List[str]] = None,
+        max_tokens: Optional[int] = None,
+        stop_on_balanced: Optional[str] = None,
+        num_ctx: Optional[int] = None,
+        json_schema: Any = None,
+    ) -> List[str]:
+        """
+        Invoca el modelo con varios prompts a la vez (asyncio.gather) y devuelve las respuestas
+        en el mismo orden. Sin AsyncClient, o si ya hay un event loop corriendo, se hace en serie.
+        En paralelo no hay corte por JSON balanceado (solo stop/max_tokens en el servidor).
+        """
+        if not prompts:
+            return []
+        limits = {
+            "stop": stop,
+            "max_tokens": max_tokens,
+            "stop_on_balanced": stop_on_balanced,
+            "num_ctx": num_ctx,
+            "json_schema": json_schema,
+        }
+        if len(prompts) == 1 or not ASYNC_OLLAMA_AVAILABLE:
+            return [self._invoke(p, **limits) for p in prompts]
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            return [self._invoke(p, **limits) for p in prompts]
+        options = self._chat_options(stop, max_tokens, num_ctx)
+        cache = self._response_cache
+        results: List[str] = [""] * len(prompts)
+        keys: List[Optional[str]] = [None] * len(prompts)
+        misses: List[int] = []
+        for i, prompt in enumerate(prompts):
+            if cache is not None:
+                keys[i] = self._cache_key(prompt, options, stop_on_balanced, json_schema)
+                cached = cache.get(keys[i])
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            misses.append(i)
+        if misses:
+            outs = asyncio.run(
+                self._ainvoke_all([prompts[i] for i in misses], options, json_schema)
+            )
+            for i, out in zip(misses, outs):
+                results[i] = out
+                if cache is not None and out:
+                    cache.set(keys[i], out)
+        return results
+
     def _strip_markdown_and_parse_json(self, out: str) -> Optional[Any]:
         """Quita bloques markdown del texto y parsea JSON. Retorna None si falla."""
         if not out:
             return None
-        out = re.sub(r"^```\w*\n?", "", out)
-        out = re.sub(r"\n?```\s*$", "", out)
         out = out.strip()
+        if out.startswith("```"):
+            out = _MD_FENCE_OPEN_RE.sub("", out, count=1)
+            out = _MD_FENCE_CLOSE_RE.sub("", out, count=1).strip()
         try:
-            return json.loads(out)
-        except json.JSONDecodeError:
+            return _json_loads(out)
+        except ValueError:
             return None
 
     def _get_skill_loader(self):
@@ -89,24 +792,29 @@ class LocalLLMClient:
         if not self._skills_dir.exists():
             return None
         try:
-            from lms_agent_scraper.core.skill_loader import SkillLoader
-
-            self._skill_loader = SkillLoader(self._skills_dir)
+            self._skill_loader = _shared_skill_loader(self._skills_dir)
             return self._skill_loader
         except Exception as e:
             logger.debug("SkillLoader no disponible: %s", e)
             return None
 
-    def _prompt_from_skill(self, skill_name: str, **kwargs: Any) -> Optional[str]:
-        """Construye el prompt desde un skill (SKILL.md). Retorna None si falla."""
+    def _prompt_from_skill(self, skill_name: str, **kwargs: Any) -> Optional[Prompt]:
+        """
+        Construye los mensajes desde un skill (SKILL.md): System Message como mensaje system
+        y Human Message Template como user. Retorna None si falla.
+        """
         loader = self._get_skill_loader()
         if loader is None:
             return None
         try:
-            template = loader.load_skill(skill_name)
-            messages = template.format_messages(**kwargs)
-            parts = [getattr(m, "content", str(m)) for m in messages]
-            return "\n\n".join(p for p in parts if p)
+            # str.format directo sobre las plantillas del skill (misma sintaxis que
+            # ChatPromptTemplate.format_messages, sin construir mensajes de LangChain).
+            prompt = []
+            for role, template in loader.get_message_templates(skill_name):
+                content = template.format(**kwargs)
+                if content:
+                    prompt.append({"role": "user" if role == "human" else role, "content": content})
+            return prompt
         except Exception as e:
             logger.debug("Prompt desde skill %s no disponible: %s", skill_name, e)
             return None
@@ -121,17 +829,14 @@ class LocalLLMClient:
         snippet = html[:max_chars] if html else ""
         prompt = self._prompt_from_skill("html-structure-analyzer", snippet=snippet)
         if prompt is None:
-            prompt = f"""Analiza el siguiente HTML y propón selectores CSS para:
-1) Enlaces a tareas/assignments (assignment_selector)
-2) Elementos que muestran fecha de entrega (date_selector)
-
-Responde ÚNICAMENTE con un JSON válido, sin markdown, con exactamente estas claves:
-{{"assignment_selector": "selector_css", "date_selector": "selector_css"}}
-
-HTML:
-{snippet}
-"""
-        out = self._invoke(prompt)
+            prompt = _system_user(_HTML_STRUCTURE_SYSTEM, f"HTML:\n{snippet}\n")
+        out = self._invoke(
+            prompt,
+            max_tokens=128,
+            stop_on_balanced="}",
+            num_ctx=4096,
+            json_schema=_SELECTORS_SCHEMA,
+        )
         parsed = self._strip_markdown_and_parse_json(out)
         return parsed if isinstance(parsed, dict) else {}
 
@@ -147,15 +852,15 @@ HTML:
             context=context[:500] if context else "N/A",
         )
         if prompt is None:
-            prompt = f"""Fecha encontrada: "{date_text}"
-Contexto: {context[:500] if context else "N/A"}
-
-Convierte a formato ISO (YYYY-MM-DD). Responde SOLO con la fecha en formato ISO, nada más."""
-        out = self._invoke(prompt)
+            prompt = _system_user(
+                _DATE_INTERPRETER_SYSTEM,
+                f'Fecha encontrada: "{date_text}"\nContexto: {context[:500] if context else "N/A"}',
+            )
+        out = self._invoke(prompt, stop=["\n"], max_tokens=16, num_ctx=1024)
         if not out:
             return ""
         # Extraer primer patrón YYYY-MM-DD
-        m = re.search(r"\d{4}-\d{2}-\d{2}", out)
+        m = _ISO_DATE_RE.search(out)
         return m.group(0) if m else ""
 
     def suggest_selectors_on_error(
@@ -173,60 +878,60 @@ Convierte a formato ISO (YYYY-MM-DD). Responde SOLO con la fecha en formato ISO,
             html_snippet=html_snippet[:3000] if html_snippet else "",
         )
         if prompt is None:
-            prompt = f"""Error durante el scraping: {error_message}
-{f"Fragmento HTML: {html_snippet[:3000]}" if html_snippet else ""}
-
-Sugiere selectores CSS alternativos para encontrar enlaces a tareas/assignments en un LMS tipo Moodle.
-Responde ÚNICAMENTE con JSON: {{"assignment_selector": "...", "date_selector": "..."}}
-"""
-        out = self._invoke(prompt)
+            user = f"Error durante el scraping: {error_message}"
+            if html_snippet:
+                user += f"\nFragmento HTML: {html_snippet[:3000]}"
+            prompt = _system_user(_SELECTOR_SUGGESTER_SYSTEM, user)
+        out = self._invoke(
+            prompt,
+            max_tokens=128,
+            stop_on_balanced="}",
+            num_ctx=4096,
+            json_schema=_SELECTORS_SCHEMA,
+        )
         parsed = self._strip_markdown_and_parse_json(out)
         return parsed if isinstance(parsed, dict) else {}
 
     def _run_course_extractor(
-        self, html: str, base_url: str, max_chars: int = 18000
+        self, html: str, base_url: str, max_chars: int = 18000, max_courses: int = 0
     ) -> List[Dict[str, str]]:
         """
         Dominio: extracción de cursos desde HTML "Mis cursos". Construye prompt, invoca LLM y parsea.
+        max_courses > 0: se deja de generar tras ese número de cursos.
         """
         base_url = base_url.rstrip("/")
-        snippet = re.sub(r"<script[^>]*>[\s\S]*?</script>", "", html, flags=re.IGNORECASE)
-        snippet = re.sub(r"<style[^>]*>[\s\S]*?</style>", "", snippet, flags=re.IGNORECASE)
-        snippet = snippet[:max_chars] if len(snippet) > max_chars else snippet
+        links = link_digest(html, COURSE_HREF_PATTERNS, max_chars)
+        snippet = links or html_snippet(html, max_chars)
         prompt = self._prompt_from_skill(
             "course-extractor",
             snippet=snippet,
             base_url=base_url,
         )
         if prompt is None:
-            # Ejemplo de URL en el prompt: formato típico Moodle (ejemplo Unisimon: aulapregrado.unisimon.edu.co).
-            prompt = f"""El siguiente HTML corresponde a la página "Mis cursos" de un campus Moodle.
-Tu tarea: extraer TODOS los cursos listados. Para cada curso necesito:
-1) El nombre completo del curso (tal como aparece en pantalla).
-2) La URL del curso. Debe contener "course/view.php" y el parámetro "id" (ej: course/view.php?id=3418).
-   Si la URL es relativa (empieza con / o sin dominio), considérala relativa al sitio.
-
-Responde ÚNICAMENTE con un JSON válido: un array de objetos, cada uno con exactamente dos claves "name" y "url".
-Ejemplo: [{{"name": "Nombre del curso", "url": "https://aulapregrado.unisimon.edu.co/course/view.php?id=3418"}}]
-No incluyas explicaciones ni markdown. Solo el array JSON.
-
-HTML:
-{snippet}
-"""
-        out = self._invoke(prompt)
+            label = _LINKS_LABEL if links else "HTML:"
+            prompt = _system_user(_COURSE_EXTRACTOR_SYSTEM, f"{label}\n{snippet}\n")
+        out = self._invoke(
+            prompt,
+            stop_on_balanced="]",
+            json_schema=_COURSES_SCHEMA,
+            max_items=max_courses or None,
+        )
         raw = self._strip_markdown_and_parse_json(out)
         if not isinstance(raw, list):
             return []
+        if max_courses > 0:
+            raw = raw[:max_courses]
         result: List[Dict[str, str]] = []
         seen: set = set()
         for item in raw:
             if not isinstance(item, dict):
                 continue
-            name = (item.get("name") or "").strip()
-            url = (item.get("url") or "").strip()
+            get = item.get
+            name = (get("name") or "").strip()
+            url = (get("url") or "").strip()
             if not url or "course/view" not in url:
                 continue
-            url = urljoin(base_url + "/", url)
+            url = _absolute_url(base_url, url)
             if url in seen:
                 continue
             seen.add(url)
@@ -234,17 +939,28 @@ HTML:
         return result
 
     def extract_courses_from_html(
-        self, html: str, base_url: str, max_chars: int = 18000
+        self, html: str, base_url: str, max_chars: int = 18000, max_courses: int = 0
     ) -> List[Dict[str, str]]:
         """
         Usa el LLM para extraer la lista de cursos desde el HTML de la página "Mis cursos" (Moodle).
         Útil cuando los selectores y BeautifulSoup no encuentran tarjetas.
         base_url: para normalizar URLs relativas (ej. https://moodle.ejemplo.edu; ejemplo Unisimon: aulapregrado.unisimon.edu.co).
+        Si el HTML trae enlaces course/view.php?id= se usan directamente, sin modelo (también con
+        Ollama caído).
+        max_courses > 0: el resultado se corta en ese número (0 = sin límite).
         Retorna lista de dicts con "name" y "url".
         """
-        if not self.available or not html:
+        if not html:
+            return []
+        fast = _parse_courses_fast(html, base_url)
+        if fast and len(fast) >= self.settings.min_courses_fastpath:
+            logger.debug("Cursos extraídos sin LLM (enlaces course/view.php): %d", len(fast))
+            return fast[:max_courses] if max_courses > 0 else fast
+        if not self.available:
             return []
-        return self._run_course_extractor(html, base_url, max_chars=max_chars)
+        return self._run_course_extractor(
+            html, base_url, max_chars=max_chars, max_courses=max_courses
+        )
 
     def _run_page_classifier(
         self, html: str, url: str = "", max_chars: int = 8000
@@ -252,35 +968,31 @@ HTML:
         """
         Dominio: clasificación de página como curso. Construye prompt, invoca LLM y parsea.
         """
-        snippet = re.sub(r"<script[^>]*>[\s\S]*?</script>", "", html, flags=re.IGNORECASE)
-        snippet = re.sub(r"<style[^>]*>[\s\S]*?</style>", "", snippet, flags=re.IGNORECASE)
-        snippet = snippet[:max_chars] if len(snippet) > max_chars else snippet
+        prompt = self._page_classifier_prompt(html, url=url, max_chars=max_chars)
+        out = self._invoke(
+            prompt,
+            max_tokens=128,
+            stop_on_balanced="}",
+            num_ctx=4096,
+            json_schema=_PAGE_CLASSIFICATION_SCHEMA,
+        )
+        return self._parse_page_classification(out)
+
+    def _page_classifier_prompt(self, html: str, url: str = "", max_chars: int = 8000) -> Prompt:
+        """Prompt de clasificación de una página (skill course-page-classifier o fallback)."""
+        snippet = page_digest(html)[:max_chars] or html_snippet(html, max_chars)
         prompt = self._prompt_from_skill(
             "course-page-classifier",
             snippet=snippet,
             url=url or "",
         )
         if prompt is None:
-            url_hint = f"\nURL de la página: {url}" if url else ""
-            prompt = f"""El siguiente HTML es de un sitio LMS tipo Moodle (ej. Aula Pregrado).
-Determina si esta página es una PÁGINA DE CURSO (vista principal de un curso), no una lista de cursos ni el dashboard.
-
-Señales de página de curso:
-- Título del curso (h1, .course-header, .page-header, o similar).
-- Secciones o módulos del curso (temas, semanas).
-- Enlaces a actividades: mod/assign, mod/quiz, mod/forum, tareas, foros, cuestionarios.
-- Navegación típica de curso (pestañas, bloques laterales de curso).
-
-Si es solo una lista de cursos, el dashboard, login o una página genérica, NO es página de curso.
-{url_hint}
-
-Responde ÚNICAMENTE con un JSON válido, sin markdown, con exactamente estas claves:
-{{"is_course": true o false, "course_name": "nombre del curso tal como aparece en la página o vacío si no es curso"}}
+            url_hint = f"URL de la página: {url}\n\n" if url else ""
+            prompt = _system_user(_PAGE_CLASSIFIER_SYSTEM, f"{url_hint}HTML:\n{snippet}\n")
+        return prompt
 
-HTML:
-{snippet}
-"""
-        out = self._invoke(prompt)
+    def _parse_page_classification(self, out: str) -> Dict[str, Any]:
+        """Parsea la respuesta del clasificador a {"is_course", "course_name"}."""
         data = self._strip_markdown_and_parse_json(out)
         if not isinstance(data, dict):
             return {"is_course": False, "course_name": ""}
@@ -301,6 +1013,58 @@ HTML:
             return default
         return self._run_page_classifier(html, url=url, max_chars=max_chars)
 
+    def _run_page_batch_classifier(
+        self, pages: List[Tuple[str, str]], max_chars: int = 3000
+    ) -> List[Dict[str, Any]]:
+        """
+        Dominio: clasificación de varias páginas en un solo prompt. Construye prompt, invoca LLM
+        y parsea. Retorna un resultado por página, en el mismo orden que pages.
+        """
+        blocks = []
+        for i, (url, html) in enumerate(pages, start=1):
+            snippet = page_digest(html)[:max_chars] or html_snippet(html, max_chars)
+            blocks.append(f"=== PAGINA {i} ===\nURL: {url}\nHTML:\n{snippet}")
+        pages_text = "\n\n".join(blocks)
+        prompt = self._prompt_from_skill("course-page-batch-classifier", pages=pages_text)
+        if prompt is None:
+            prompt = _system_user(_PAGE_BATCH_CLASSIFIER_SYSTEM, pages_text)
+        out = self._invoke(
+            prompt, stop_on_balanced="]", json_schema=_PAGE_BATCH_CLASSIFICATION_SCHEMA
+        )
+        raw = self._strip_markdown_and_parse_json(out)
+        items = raw if isinstance(raw, list) else []
+        by_url = {
+            (item.get("url") or "").strip(): item
+            for item in items
+            if isinstance(item, dict) and item.get("url")
+        }
+        results: List[Dict[str, Any]] = []
+        for i, (url, _html) in enumerate(pages):
+            data = by_url.get(url)
+            if data is None and i < len(items) and isinstance(items[i], dict):
+                data = items[i]
+            if not isinstance(data, dict):
+                results.append({"is_course": False, "course_name": ""})
+                continue
+            results.append(
+                {
+                    "is_course": bool(data.get("is_course", False)),
+                    "course_name": (data.get("course_name") or "").strip(),
+                }
+            )
+        return results
+
+    def classify_pages_as_courses(
+        self, pages: List[Tuple[str, str]], max_chars: int = 3000
+    ) -> List[Dict[str, Any]]:
+        """
+        Clasifica varias páginas (url, html) en una sola llamada al LLM.
+        Retorna una lista alineada con pages de {"is_course": bool, "course_name": str}.
+        """
+        if not self.available or not pages:
+            return [{"is_course": False, "course_name": ""} for _ in pages]
+        return self._run_page_batch_classifier(pages, max_chars=max_chars)
+
     def extract_assignments_from_course_html(
         self,
         html: str,
@@ -315,10 +1079,101 @@ HTML:
         """
         if not self.available or not html:
             return []
+        if not _ACTIVITY_HREF_RE.search(html):
+            # Sin enlaces a actividades no hay URLs válidas que el modelo pueda devolver.
+            return []
+        prompt = self._assignment_extractor_prompt(html, course_name, base_url, max_chars)
+        out = self._invoke(prompt, stop_on_balanced="]", json_schema=_ASSIGNMENTS_SCHEMA)
+        return self._parse_assignments(out, course_name, base_url)
+
+    def _extract_assignments_each(
+        self, courses: List[Tuple[str, str, str]], max_chars: int
+    ) -> List[List[Dict[str, Any]]]:
+        """Un prompt por curso (html, course_name, base_url), enviados en paralelo."""
+        if not self.available or not courses:
+            return [[] for _ in courses]
+        prompts = [
+            self._assignment_extractor_prompt(html, course_name, base_url, max_chars)
+            if html
+            else None
+            for html, course_name, base_url in courses
+        ]
+        outs = iter(
+            self._invoke_many(
+                [p for p in prompts if p is not None],
+                stop_on_balanced="]",
+                json_schema=_ASSIGNMENTS_SCHEMA,
+            )
+        )
+        return [
+            self._parse_assignments(next(outs), course_name, base_url) if p is not None else []
+            for p, (_html, course_name, base_url) in zip(prompts, courses)
+        ]
+
+    def extract_assignments_multi(
+        self,
+        courses: List[Tuple[str, str, str]],
+        max_chars: int = 18000,
+        min_chars_per_course: int = 3000,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Extrae tareas de varios cursos (html, course_name, base_url) en una sola llamada al LLM:
+        un bloque por curso y respuesta {"CURSO 1": [...], ...}, con el prefijo system procesado
+        una sola vez. Cada curso recibe max_chars // n caracteres; si eso queda por debajo de
+        min_chars_per_course se usa un prompt por curso (en paralelo).
+        Retorna una lista de tareas por curso, alineada con courses.
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in courses]
+        if not self.available:
+            return results
+        # Sin enlaces a actividades no hay nada que extraer (ver extract_assignments_from_course_html).
+        pending = [
+            i
+            for i, (html, _name, _base) in enumerate(courses)
+            if html and _ACTIVITY_HREF_RE.search(html)
+        ]
+        if not pending:
+            return results
+        per_course = max_chars // len(pending)
+        if len(pending) == 1 or per_course < min_chars_per_course:
+            each = self._extract_assignments_each([courses[i] for i in pending], max_chars)
+            for i, items in zip(pending, each):
+                results[i] = items
+            return results
+        blocks = []
+        for n, i in enumerate(pending, start=1):
+            html, course_name, base_url = courses[i]
+            links = link_digest(html, ASSIGNMENT_HREF_PATTERNS, per_course, with_context=True)
+            snippet = links or html_snippet(html, per_course)
+            blocks.append(
+                f"=== CURSO {n} ===\nCurso: {course_name or 'Curso'}\n"
+                f"Base URL del sitio: {base_url.rstrip('/')}\n"
+                f"{_LINKS_LABEL if links else 'HTML:'}\n{snippet}"
+            )
+        courses_text = "\n\n".join(blocks)
+        prompt = self._prompt_from_skill("assignment-batch-extractor", courses=courses_text)
+        if prompt is None:
+            prompt = _system_user(_ASSIGNMENT_BATCH_EXTRACTOR_SYSTEM, courses_text)
+        out = self._invoke(
+            prompt,
+            stop_on_balanced="}",
+            json_schema=_assignments_by_course_schema(len(pending)),
+        )
+        raw = self._strip_markdown_and_parse_json(out)
+        if not isinstance(raw, dict):
+            return results
+        for n, i in enumerate(pending, start=1):
+            _html, course_name, base_url = courses[i]
+            results[i] = self._normalize_assignments(raw.get(f"CURSO {n}"), course_name, base_url)
+        return results
+
+    def _assignment_extractor_prompt(
+        self, html: str, course_name: str, base_url: str, max_chars: int = 18000
+    ) -> Prompt:
+        """Prompt de extracción de tareas (skill assignment-extractor o fallback)."""
         base_url = base_url.rstrip("/")
-        snippet = re.sub(r"<script[^>]*>[\s\S]*?</script>", "", html, flags=re.IGNORECASE)
-        snippet = re.sub(r"<style[^>]*>[\s\S]*?</style>", "", snippet, flags=re.IGNORECASE)
-        snippet = snippet[:max_chars] if len(snippet) > max_chars else snippet
+        links = link_digest(html, ASSIGNMENT_HREF_PATTERNS, max_chars, with_context=True)
+        snippet = links or html_snippet(html, max_chars)
         prompt = self._prompt_from_skill(
             "assignment-extractor",
             snippet=snippet,
@@ -326,52 +1181,45 @@ HTML:
             base_url=base_url,
         )
         if prompt is None:
-            prompt = f"""El siguiente HTML es la página principal de un curso en un LMS tipo Moodle (Aula Pregrado).
-Curso: {course_name or "Curso"}
-Base URL del sitio: {base_url}
-
-Tu tarea: identificar TODAS las tareas, entregas, actividades evaluables (tareas, entregas, cuestionarios, foros de entrega, talleres, etc.), aunque la redacción sea diversa. Para cada una extrae:
-1) title: título tal como aparece.
-2) due_date: fecha de entrega o vencimiento si está visible (texto o formato coherente); si no hay, cadena vacía "".
-3) url: URL del enlace a la actividad (absoluta o relativa al sitio). Debe contener mod/assign, mod/quiz, mod/forum o mod/workshop.
-4) type: uno de assignment, quiz, forum, workshop.
+            prompt = _system_user(
+                _ASSIGNMENT_EXTRACTOR_SYSTEM,
+                f"Curso: {course_name or 'Curso'}\nBase URL del sitio: {base_url}\n\n"
+                f"{_LINKS_LABEL if links else 'HTML:'}\n{snippet}\n",
+            )
+        return prompt
 
-Responde ÚNICAMENTE con un JSON válido: un array de objetos con exactamente las claves "title", "due_date", "url", "type".
-Ejemplo: [{{"title": "Tarea 1", "due_date": "15/03/2026", "url": "/mod/assign/view.php?id=123", "type": "assignment"}}]
-No incluyas explicaciones ni markdown. Solo el array JSON.
+    def _parse_assignments(self, out: str, course_name: str, base_url: str) -> List[Dict[str, Any]]:
+        """Parsea la respuesta del extractor de tareas al formato estándar del pipeline."""
+        return self._normalize_assignments(
+            self._strip_markdown_and_parse_json(out), course_name, base_url
+        )
 
-HTML:
-{snippet}
-"""
-        out = self._invoke(prompt)
-        raw = self._strip_markdown_and_parse_json(out)
+    def _normalize_assignments(
+        self, raw: Any, course_name: str, base_url: str
+    ) -> List[Dict[str, Any]]:
+        """Convierte la lista de actividades del modelo al formato estándar (descarta inválidas)."""
+        base_url = base_url.rstrip("/")
         if not isinstance(raw, list):
             return []
         result: List[Dict[str, Any]] = []
         seen_urls: set = set()
-        valid_types = {"assignment", "quiz", "forum", "workshop"}
         for item in raw:
             if not isinstance(item, dict):
                 continue
-            title = (item.get("title") or "").strip()
+            get = item.get
+            title = (get("title") or "").strip()
             if not title:
                 continue
-            url = (item.get("url") or "").strip()
-            if not url or (
-                "mod/" not in url
-                and "assign" not in url
-                and "quiz" not in url
-                and "forum" not in url
-                and "workshop" not in url
-            ):
+            url = (get("url") or "").strip()
+            if not url or not _ASSIGN_URL_RE.search(url):
                 continue
-            url = urljoin(base_url + "/", url)
+            url = _absolute_url(base_url, url)
             if url in seen_urls:
                 continue
             seen_urls.add(url)
-            raw_type = (item.get("type") or "assignment").strip().lower()
-            activity_type = raw_type if raw_type in valid_types else "assignment"
-            due_date_str = (item.get("due_date") or "").strip()
+            raw_type = (get("type") or "assignment").strip().lower()
+            activity_type = raw_type if raw_type in _VALID_ACTIVITY_TYPES else "assignment"
+            due_date_str = (get("due_date") or "").strip()
             result.append(
                 {
                     "title": title,
@@ -385,3 +1233,12 @@ HTML:
                 }
             )
         return result
+
+
+@lru_cache(maxsize=1)
+def get_llm_client() -> LocalLLMClient:
+    """
+    LocalLLMClient compartido por el proceso (settings de get_ollama_settings()): las herramientas
+    que se llaman por curso o por página no construyen un cliente en cada llamada.
+    """
+    return LocalLLMClient()
@@ -1,18 +1,31 @@
 """
 Servidor MCP para LMS Agent Scraper.
-Expone herramientas: get_pending_assignments, get_submitted_assignments, get_courses, generate_report, check_deadlines, list_profiles.
+Expone herramientas: get_pending_assignments, get_submitted_assignments, get_courses, generate_report, check_deadlines, list_profiles, refresh_data.
 """
 
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from mcp.server.fastmcp import FastMCP
 
-from lms_agent_scraper.config.settings import PortalSettings, ScraperSettings, OutputSettings
+from lms_agent_scraper.config.settings import (
+    get_output_settings,
+    get_portal_settings,
+    get_scraper_settings,
+)
 from lms_agent_scraper.core.profile_loader import ProfileLoader
 from lms_agent_scraper.graph.workflow import run_workflow
 from lms_agent_scraper.tools.report_tools import filter_by_date
 
+log = logging.getLogger(__name__)
+
+_EMPTY: Dict[str, Any] = {}
+
 MCP_INSTRUCTIONS = """
 Este servidor MCP da acceso a portales LMS Moodle: cursos, tareas pendientes, entregas y plazos del estudiante.
 La configuración de ejemplo puede usar el perfil moodle_unisimon (Universidad Simón Bolívar, Colombia, Aula Extendida);
@@ -33,13 +46,128 @@ def _profiles_dir() -> Path:
     return Path("profiles")
 
 
-def _run_full_workflow() -> Dict[str, Any]:
-    """Ejecuta el workflow completo usando configuración de entorno."""
-    portal = PortalSettings()
-    scraper = ScraperSettings()
-    output = OutputSettings()
+_NOT_CONFIGURED = {"error": "Configure PORTAL_BASE_URL, PORTAL_USERNAME, PORTAL_PASSWORD"}
+
+
+def _workflow_key() -> Optional[Tuple[Any, ...]]:
+    """Configuración que identifica un resultado del workflow (None si falta portal/usuario)."""
+    portal = get_portal_settings()
+    scraper = get_scraper_settings()
     if not portal.base_url or not portal.username:
-        return {"error": "Configure PORTAL_BASE_URL, PORTAL_USERNAME, PORTAL_PASSWORD"}
+        return None
+    return (
+        portal.profile,
+        portal.base_url,
+        portal.username,
+        scraper.days_ahead,
+        scraper.days_behind,
+        scraper.max_courses,
+    )
+
+
+class _WorkflowRunner:
+    """
+    Último resultado del workflow por configuración. get() lo devuelve al instante y, si tiene
+    más de SCRAPER_WORKFLOW_CACHE_TTL segundos, lo renueva en un hilo en segundo plano: solo la
+    primera consulta (o un cambio de configuración) espera al login + scraping + LLM.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()  # protege _snapshot y _refreshing
+        self._run_lock = threading.Lock()  # una ejecución del workflow a la vez
+        # (clave de configuración, instante monotonic, resultado)
+        self._snapshot: Optional[Tuple[Tuple[Any, ...], float, Dict[str, Any]]] = None
+        self._refreshing = False
+        self._periodic: Optional[threading.Thread] = None
+
+    def get(self, key: Tuple[Any, ...], ttl: int) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = self._snapshot
+            if ttl > 0 and snapshot is not None and snapshot[0] == key:
+                if time.monotonic() - snapshot[1] >= ttl and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh_in_background, args=(key, ttl), daemon=True
+                    ).start()
+                return snapshot[2]
+        return self.refresh(key, ttl)
+
+    def refresh(self, key: Tuple[Any, ...], ttl: int) -> Dict[str, Any]:
+        """
+        Ejecuta el workflow ahora. Si otra ejecución termina mientras se espera el turno, se usa
+        su resultado en lugar de lanzar otra. Solo se guardan ejecuciones con sesión iniciada.
+        """
+        requested = time.monotonic()
+        with self._run_lock:
+            with self._lock:
+                snapshot = self._snapshot
+            if snapshot is not None and snapshot[0] == key and snapshot[1] >= requested:
+                return snapshot[2]
+            result = _execute_workflow()
+            result.setdefault("last_updated", datetime.now().isoformat(timespec="seconds"))
+            if ttl > 0 and result.get("authenticated"):
+                with self._lock:
+                    self._snapshot = (key, time.monotonic(), result)
+            return result
+
+    def _refresh_in_background(self, key: Tuple[Any, ...], ttl: int) -> None:
+        try:
+            self.refresh(key, ttl)
+        except Exception as e:
+            log.warning("Actualización en segundo plano del workflow fallida: %s", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def start_periodic(self, interval: int) -> None:
+        """Renueva el resultado cada interval segundos en un hilo daemon (idempotente)."""
+        if interval <= 0 or self._periodic is not None:
+            return
+
+        def loop() -> None:
+            while True:
+                time.sleep(interval)
+                key = _workflow_key()
+                if key is None:
+                    continue
+                try:
+                    self.refresh(key, get_scraper_settings().workflow_cache_ttl)
+                except Exception as e:
+                    log.warning("Actualización periódica del workflow fallida: %s", e)
+
+        self._periodic = threading.Thread(target=loop, name="workflow-refresh", daemon=True)
+        self._periodic.start()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshot = None
+
+
+_RUNNER = _WorkflowRunner()
+
+
+def _run_full_workflow() -> Dict[str, Any]:
+    """
+    Resultado del workflow para la configuración de entorno (ver _WorkflowRunner): varias
+    herramientas llamadas en el mismo turno reutilizan un único login + scraping + pasada del LLM.
+    """
+    key = _workflow_key()
+    if key is None:
+        return dict(_NOT_CONFIGURED)
+    return _RUNNER.get(key, get_scraper_settings().workflow_cache_ttl)
+
+
+def _with_last_updated(text: str, result: Dict[str, Any]) -> str:
+    """Añade a la respuesta de una herramienta cuándo se leyeron los datos del portal."""
+    last_updated = result.get("last_updated")
+    return f"{text}\n\nDatos del portal: {last_updated}" if last_updated else text
+
+
+def _execute_workflow() -> Dict[str, Any]:
+    """Ejecuta run_workflow con la configuración de entorno (sin caché)."""
+    portal = get_portal_settings()
+    scraper = get_scraper_settings()
+    output = get_output_settings()
     return run_workflow(
         profile_name=portal.profile,
         base_url=portal.base_url,
@@ -51,6 +179,9 @@ def _run_full_workflow() -> Dict[str, Any]:
         output_dir=str(output.dir),
         profiles_dir=_profiles_dir(),
         debug=False,
+        auth_state_path=scraper.auth_state_path,
+        auth_state_ttl=scraper.auth_state_ttl,
+        browser_no_sandbox=scraper.browser_no_sandbox,
     )
 
 
@@ -65,7 +196,7 @@ def get_pending_assignments(days_ahead: int = 7, days_behind: int = 0) -> str:
         return str(result)
     assignments = result.get("assignments", [])
     filtered = filter_by_date(assignments, days_ahead=days_ahead, days_behind=days_behind)
-    return _format_assignments(filtered)
+    return _with_last_updated(_format_assignments(filtered), result)
 
 
 @mcp.tool()
@@ -76,14 +207,12 @@ def get_submitted_assignments(days: int = 7) -> str:
     result = _run_full_workflow()
     if result.get("error"):
         return str(result)
-    assignments = result.get("assignments", [])
-    submitted = [
-        a
-        for a in assignments
-        if (a.get("submission_status") or {}).get("submitted")
-        and ((a.get("submission_status") or {}).get("days_ago") or 999) <= days
-    ]
-    return _format_assignments(submitted)
+    submitted = []
+    for a in result.get("assignments", []):
+        status = a.get("submission_status") or _EMPTY
+        if status.get("submitted") and (status.get("days_ago") or 999) <= days:
+            submitted.append(a)
+    return _with_last_updated(_format_assignments(submitted), result)
 
 
 @mcp.tool()
@@ -96,9 +225,9 @@ def get_courses() -> str:
         return str(result)
     courses = result.get("courses", [])
     if not courses:
-        return "No se encontraron cursos o el login falló."
+        return _with_last_updated("No se encontraron cursos o el login falló.", result)
     lines = [f"- {c.get('name', 'N/A')}: {c.get('url', 'N/A')}" for c in courses]
-    return "\n".join(lines)
+    return _with_last_updated("\n".join(lines), result)
 
 
 @mcp.tool()
@@ -112,8 +241,8 @@ def generate_report(format: str = "markdown", days_ahead: int = 7, days_behind:
         return str(result)
     report_path = result.get("report_path", "")
     if report_path:
-        return f"Reporte guardado en: {report_path}"
-    return "No se generó reporte (sin tareas o error)."
+        return _with_last_updated(f"Reporte guardado en: {report_path}", result)
+    return _with_last_updated("No se generó reporte (sin tareas o error).", result)
 
 
 @mcp.tool()
@@ -126,10 +255,31 @@ def check_deadlines(days: int = 7) -> str:
         return str(result)
     assignments = result.get("assignments", [])
     filtered = filter_by_date(assignments, days_ahead=days, days_behind=0)
-    overdue = len([a for a in filtered if a.get("status") == "OVERDUE"])
-    due_today = len([a for a in filtered if a.get("status") == "DUE_TODAY"])
-    upcoming = len([a for a in filtered if a.get("status") == "UPCOMING"])
-    return f"Atrasadas: {overdue} | Vencen hoy: {due_today} | Próximas ({days} días): {upcoming}"
+    counts = Counter(a.get("status") for a in filtered)
+    return _with_last_updated(
+        f"Atrasadas: {counts['OVERDUE']} | Vencen hoy: {counts['DUE_TODAY']} | "
+        f"Próximas ({days} días): {counts['UPCOMING']}",
+        result,
+    )
+
+
+@mcp.tool()
+def refresh_data() -> str:
+    """
+    Vuelve a leer el portal ahora (login + cursos + tareas) y reemplaza los datos en memoria
+    que usan las demás herramientas.
+    """
+    key = _workflow_key()
+    if key is None:
+        return str(_NOT_CONFIGURED)
+    result = _RUNNER.refresh(key, get_scraper_settings().workflow_cache_ttl)
+    if result.get("error"):
+        return str(result)
+    return _with_last_updated(
+        f"Datos actualizados: {len(result.get('courses', []))} curso(s), "
+        f"{len(result.get('assignments', []))} tarea(s).",
+        result,
+    )
 
 
 @mcp.tool()
@@ -144,18 +294,19 @@ def list_profiles() -> str:
     return "\n".join(names)
 
 
+def _format_assignment(a: Dict[str, Any]) -> str:
+    get = a.get
+    return f"- {get('title', 'N/A')} | {get('course', 'N/A')} | {get('due_date', '')} | {get('url', '')}"
+
+
 def _format_assignments(assignments: List[Dict[str, Any]]) -> str:
     if not assignments:
         return "No hay tareas en el criterio indicado."
-    lines = []
-    for a in assignments:
-        lines.append(
-            f"- {a.get('title', 'N/A')} | {a.get('course', 'N/A')} | {a.get('due_date', '')} | {a.get('url', '')}"
-        )
-    return "\n".join(lines)
+    return "\n".join(map(_format_assignment, assignments))
 
 
 def main():
+    _RUNNER.start_periodic(get_scraper_settings().workflow_refresh_interval)
     mcp.run(transport="stdio")
 
 
@@ -3,11 +3,19 @@ Herramientas de navegación con Playwright para login y obtención de cursos.
 Incluye extracción por selectores (Playwright) y por parseo HTML (BeautifulSoup) como respaldo.
 """
 
+import hashlib
+import json
 import logging
+import os
 import re
 import time
-from typing import Any, Dict, List, Optional, Tuple
-from urllib.parse import urljoin, urlparse
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+from lms_agent_scraper.core.css import compile_css
 
 log = logging.getLogger(__name__)
 
@@ -36,6 +44,16 @@ DEFAULT_FALLBACK_CONTAINERS = [
 DEFAULT_COURSE_LINK_SEGMENTS = ["course", "courses", "cursos"]
 
 
+def _join_url(base_url: str, href: str) -> str:
+    """
+    urljoin(base_url + "/", href) (base_url sin "/" final). Un href http(s) absoluto sin
+    segmentos "." / ".." se devuelve tal cual: urljoin lo dejaría igual tras parsear ambos.
+    """
+    if href.startswith(("https://", "http://")) and "/." not in href:
+        return href
+    return urljoin(base_url + "/", href)
+
+
 def _is_course_url_by_segment(
     href: str,
     base_url: str,
@@ -48,20 +66,50 @@ def _is_course_url_by_segment(
     """
     if not href or not segment_keywords:
         return False
+    return _is_course_href(href, base_url, tuple(segment_keywords))
+
+
+@lru_cache(maxsize=4096)
+def _is_course_href(href: str, base_url: str, segment_keywords: Tuple[str, ...]) -> bool:
+    """
+    Núcleo memorizado de _is_course_url_by_segment: los href repetidos (menú, bloques, varias
+    tarjetas del mismo curso) y los de otras páginas del mismo portal se evalúan una sola vez.
+    """
+    keywords_re = _segment_keywords_re(segment_keywords)
+    if keywords_re is None:
+        return False
     base_url = base_url.rstrip("/")
     try:
-        full_url = urljoin(base_url + "/", href)
-        parsed = urlparse(full_url)
-        path = (parsed.path or "").strip("/")
+        full_url = _join_url(base_url, href)
+        path = urlsplit(full_url).path or ""
     except Exception:
         return False
-    segments = [s.lower() for s in path.split("/") if s]
-    keywords_lower = [k.lower() for k in segment_keywords if k]
-    for seg in segments:
-        for kw in keywords_lower:
-            if kw in seg:
-                return True
-    return False
+    return keywords_re.search(path.lower()) is not None
+
+
+@lru_cache(maxsize=32)
+def _segment_keywords_re(segment_keywords: Tuple[str, ...]) -> Optional["re.Pattern[str]"]:
+    """
+    Una sola regex (alternativas en minúsculas) para las palabras clave de segmento. Buscarla en
+    el path en minúsculas equivale a comprobar cada segmento con cada palabra: las palabras con
+    "/" nunca caben en un segmento y se descartan. None si no queda ninguna.
+    """
+    keywords = [k.lower() for k in segment_keywords if k and "/" not in k]
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(k) for k in keywords))
+
+
+def _course_url_key(url: str) -> Any:
+    """
+    Clave para no repetir cursos: (path, id) si la URL trae el parámetro id (course/view.php?id=5
+    con o sin otros parámetros que cambian entre renders); si no, la URL completa.
+    """
+    if "id=" not in url:
+        return url
+    parsed = urlsplit(url)
+    course_id = parse_qs(parsed.query).get("id")
+    return (parsed.path, course_id[0]) if course_id else url
 
 
 def _get_course_link_segments_from_profile(courses_profile: Optional[Dict[str, Any]]) -> List[str]:
@@ -78,6 +126,32 @@ def _get_course_link_segments_from_profile(courses_profile: Optional[Dict[str, A
     return list(DEFAULT_COURSE_LINK_SEGMENTS)
 
 
+# Selectores con motor explícito (text=, xpath=, ...), XPath, texto entre comillas o encadenados
+# con ">>": no se pueden unir con comas en un solo selector CSS.
+_NON_CSS_SELECTOR_RE = re.compile(r"^\s*(?:[\w-]+=|//|\.\.|[\"'])|>>")
+
+
+def _union_selector(selectors: List[str]) -> Optional[str]:
+    """Selectores unidos con comas (una sola consulta a la página), o None si alguno no es CSS."""
+    if not selectors or any(_NON_CSS_SELECTOR_RE.search(sel) for sel in selectors):
+        return None
+    return ", ".join(selectors)
+
+
+def _any_present(page: Any, selectors: List[str]) -> bool:
+    """
+    False solo si ninguno de los selectores (CSS) tiene coincidencias, con un único count() de la
+    unión; ante selectores no unibles o errores devuelve True y decide el recorrido por selector.
+    """
+    union = _union_selector(selectors)
+    if union is None:
+        return True
+    try:
+        return page.locator(union).count() > 0
+    except Exception:
+        return True
+
+
 def detect_more_navigation(
     page: Any,
     config: Optional[Dict[str, Any]] = None,
@@ -90,6 +164,9 @@ def detect_more_navigation(
     if not PLAYWRIGHT_AVAILABLE or not config:
         return {"has_more": False, "control_type": None, "element_count": 0}
     selectors = config.get("selectors") or []
+    # Caso habitual (sin controles): una sola consulta para todos los selectores
+    if not _any_present(page, selectors):
+        return {"has_more": False, "control_type": None, "element_count": 0}
     for sel in selectors:
         try:
             count = page.locator(sel).count()
@@ -112,6 +189,8 @@ def _expand_more_navigation(
     if max_clicks <= 0 or not selectors:
         return
     for _ in range(max_clicks):
+        if not _any_present(page, selectors):
+            break
         clicked = False
         for sel in selectors:
             try:
@@ -128,21 +207,24 @@ def _expand_more_navigation(
 
 
 def detect_courses_presence(
-    html: str, courses_profile: Optional[Dict[str, Any]] = None
+    html: str, courses_profile: Optional[Dict[str, Any]] = None, soup: Optional[Any] = None
 ) -> Dict[str, Any]:
     """
     Detecta si en el HTML hay tarjetas de curso (sin extraer nombres/URLs).
     Usa card_selectors del perfil o defaults Moodle.
+    soup: árbol ya parseado de html (_courses_page_soup); si None, se parsea aquí.
     Retorna dict con has_courses, card_count, selector_matched.
     """
     if not BS4_AVAILABLE or not html:
         return {"has_courses": False, "card_count": 0, "selector_matched": None}
     profile = courses_profile or {}
     card_selectors = profile.get("card_selectors") or DEFAULT_CARD_SELECTORS
-    soup = BeautifulSoup(html, "html.parser")
+    # Solo las tarjetas (si los selectores son simples): el conteo es el mismo que con todo el árbol.
+    if soup is None:
+        soup = BeautifulSoup(html, _HTML_PARSER, parse_only=_card_parse_only(list(card_selectors)))
     for sel in card_selectors:
         try:
-            nodes = soup.select(sel)
+            nodes = compile_css(sel).select(soup)
             if nodes:
                 return {
                     "has_courses": True,
@@ -155,12 +237,177 @@ def detect_courses_presence(
 
 
 try:
-    from bs4 import BeautifulSoup
+    from bs4 import BeautifulSoup, SoupStrainer
 
     BS4_AVAILABLE = True
+    # Solo <a href> (con su contenido): la extracción por segmento de URL no usa nada más.
+    _ANCHOR_STRAINER = SoupStrainer("a", href=True)
 except ImportError:
     BS4_AVAILABLE = False
     BeautifulSoup = None
+    _ANCHOR_STRAINER = None
+
+# Tree builder de BeautifulSoup para todo el módulo: lxml (libxml2, en C) si está instalado;
+# si no, html.parser.
+try:
+    import lxml  # noqa: F401
+
+    _HTML_PARSER = "lxml"
+except ImportError:
+    _HTML_PARSER = "html.parser"
+
+# parse_only por nombre + atributos de la etiqueta (bs4 >= 4.13); sin él se parsea todo el HTML.
+try:
+    from bs4.filter import ElementFilter
+except ImportError:
+    ElementFilter = None
+
+# Selector CSS "simple": etiqueta opcional + .clase / #id / [attr] / [attr='valor'], sin combinadores.
+_SIMPLE_SELECTOR_RE = re.compile(
+    r"""^([a-zA-Z][\w-]*)?((?:\.[\w-]+|#[\w-]+|\[[\w-]+(?:=(?:'[^']*'|"[^"]*"|[\w-]+))?\])*)$"""
+)
+_SELECTOR_PART_RE = re.compile(
+    r"""\.([\w-]+)|#([\w-]+)|\[([\w-]+)(=(?:'([^']*)'|"([^"]*)"|([\w-]+)))?\]"""
+)
+
+
+def _parse_simple_selector(selector: str) -> Optional[Tuple[str, frozenset, Tuple]]:
+    """(etiqueta, clases, ((atributo, valor o None), ...)) del selector, o None si no es simple."""
+    match = _SIMPLE_SELECTOR_RE.match(selector)
+    if not match or not selector:
+        return None
+    classes = set()
+    attr_rules = []
+    for cls, id_, attr, has_value, v1, v2, v3 in _SELECTOR_PART_RE.findall(match.group(2)):
+        if cls:
+            classes.add(cls)
+        elif id_:
+            attr_rules.append(("id", id_))
+        else:
+            attr_rules.append((attr, (v1 or v2 or v3) if has_value else None))
+    return (match.group(1) or "").lower(), frozenset(classes), tuple(attr_rules)
+
+
+def _tag_matches(rule: Tuple[str, frozenset, Tuple], name: str, attrs: Dict[str, Any]) -> bool:
+    tag, classes, attr_rules = rule
+    if tag and tag != name:
+        return False
+    if classes:
+        value = attrs.get("class") or ""
+        if not classes.issubset(value.split() if isinstance(value, str) else value):
+            return False
+    for attr, expected in attr_rules:
+        value = attrs.get(attr)
+        if value is None:
+            return False
+        if (
+            expected is not None
+            and (value if isinstance(value, str) else " ".join(value)) != expected
+        ):
+            return False
+    return True
+
+
+if ElementFilter is not None:
+
+    class _TagRulesFilter(ElementFilter):
+        """Crea solo las etiquetas que cumplen alguna regla (con todo su subárbol)."""
+
+        def __init__(self, rules: List[Tuple[str, frozenset, Tuple]]):
+            self.rules = rules
+
+        def allow_tag_creation(self, nsprefix: Optional[str], name: str, attrs: Any) -> bool:
+            attrs = attrs or {}
+            if name == "span" and "multiline" in str(attrs.get("class") or ""):
+                return True  # nombres que el respaldo por contenedores busca con find_previous
+            return any(_tag_matches(rule, name, attrs) for rule in self.rules)
+
+        def allow_string_creation(self, string: str) -> bool:
+            return False
+
+
+_MULTILINE_RE = re.compile("multiline")
+
+
+@lru_cache(maxsize=128)
+def _simple_selector_rules(selector: str) -> Optional[Tuple[Tuple[str, frozenset, Tuple], ...]]:
+    """Reglas de un selector (con alternativas separadas por comas), o None si alguna no es simple."""
+    rules = []
+    for part in selector.split(","):
+        rule = _parse_simple_selector(part.strip())
+        if rule is None:
+            return None
+        rules.append(rule)
+    return tuple(rules)
+
+
+def _card_parse_only(selectors: List[str]) -> Optional[Any]:
+    """
+    Filtro parse_only para _extract_courses_bs4: conserva los elementos que pueden coincidir con
+    los selectores de tarjetas/contenedores y sus descendientes. None (parsear todo) si algún
+    selector no es simple o bs4 no admite ElementFilter.
+    """
+    if ElementFilter is None:
+        return None
+    rules = []
+    for selector in selectors:
+        selector_rules = _simple_selector_rules(selector)
+        if selector_rules is None:
+            return None
+        rules.extend(selector_rules)
+    return _TagRulesFilter(rules)
+
+
+def _select_one(node: Any, selector: str) -> Any:
+    """
+    Equivale a node.select_one(selector). Los selectores simples se resuelven con find() sobre
+    el árbol de bs4, sin compilar ni evaluar el selector con soupsieve en cada tarjeta.
+    """
+    rules = _simple_selector_rules(selector)
+    if rules is None:
+        return compile_css(selector).select_one(node)
+    return node.find(lambda el: any(_tag_matches(rule, el.name, el.attrs) for rule in rules))
+
+
+def _element_name(el: Any) -> str:
+    return el.get_text(strip=True) or el.get("title", "") or ""
+
+
+def _card_name(card: Any, name_selectors: List[str]) -> str:
+    """
+    Nombre de la tarjeta: texto (o title) del primer elemento de cada name_selector, en orden de
+    prioridad, hasta dar con uno no vacío. Con selectores simples todos se evalúan en un solo
+    recorrido de la tarjeta (que se corta en cuanto ningún selector anterior puede ganar); si no,
+    un _select_one por selector.
+    """
+    rules = [_simple_selector_rules(ns) for ns in name_selectors]
+    if any(r is None for r in rules):
+        for ns in name_selectors:
+            try:
+                name_el = _select_one(card, ns)
+            except Exception:
+                continue
+            if name_el:
+                name = _element_name(name_el)
+                if name:
+                    return name
+        return ""
+    # names[i]: nombre del primer elemento que cumple name_selectors[i] (None si aún no hay)
+    names: List[Optional[str]] = [None] * len(rules)
+    best = len(rules)
+    for el in card.descendants:
+        if el.name is None:
+            continue
+        for i in range(best):
+            if names[i] is None and any(_tag_matches(r, el.name, el.attrs) for r in rules[i]):
+                names[i] = _element_name(el)
+                if names[i]:
+                    best = i
+                    break
+        if all(n is not None for n in names[:best]):
+            break
+    return names[best] if best < len(rules) else ""
+
 
 try:
     from playwright.sync_api import (
@@ -176,6 +423,141 @@ except ImportError:
     PLAYWRIGHT_AVAILABLE = False
     sync_playwright = None
 
+_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+# Chromium sin los subsistemas que el scraper no usa (GPU, extensiones, sync, red en segundo plano):
+# arranque más rápido y menos memoria. El sandbox se mantiene: las páginas del LMS traen contenido
+# de usuarios (ver BrowserSession.no_sandbox para contenedores que corren como root).
+_CHROME_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-sync",
+    "--disable-default-apps",
+    "--no-first-run",
+]
+# Viewport pequeño: menos trabajo de layout/pintado; el HTML de Moodle es el mismo.
+_VIEWPORT = {"width": 1024, "height": 768}
+# Recursos que no aportan al HTML que se lee (imágenes de tarjetas, fuentes, CSS, vídeo).
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font", "stylesheet"})
+
+
+def _abort_heavy_resources(route: Any) -> None:
+    """Handler de context.route: aborta imágenes/fuentes/CSS/media y deja pasar el resto."""
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        route.abort()
+    else:
+        route.continue_()
+
+
+class BrowserSession:
+    """
+    Un único Chromium (Playwright) compartido por login y descubrimiento de cursos.
+    Lanzar el navegador es lo más costoso de cada paso; cada operación abre solo un
+    BrowserContext (barato) y lo cierra al terminar. El navegador se lanza en el primer
+    new_context() y se cierra al salir del bloque with. Usar desde un único hilo.
+    no_sandbox: desactiva el sandbox de Chromium; solo para contenedores que corren como root
+    y no pueden usarlo (SCRAPER_BROWSER_NO_SANDBOX).
+    """
+
+    def __init__(self, headless: bool = True, no_sandbox: bool = False):
+        self.headless = headless
+        self.no_sandbox = no_sandbox
+        self._playwright = None
+        self._browser = None
+
+    @property
+    def browser(self) -> "Browser":
+        if self._browser is None:
+            self._playwright = sync_playwright().start()
+            args = _CHROME_ARGS + ["--no-sandbox"] if self.no_sandbox else _CHROME_ARGS
+            self._browser = self._playwright.chromium.launch(
+                headless=self.headless, args=args, chromium_sandbox=not self.no_sandbox
+            )
+        return self._browser
+
+    def new_context(self, **kwargs: Any) -> "BrowserContext":
+        return self.browser.new_context(user_agent=_USER_AGENT, viewport=_VIEWPORT, **kwargs)
+
+    def close(self) -> None:
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            finally:
+                self._browser = None
+                self._playwright.stop()
+                self._playwright = None
+
+    def __enter__(self) -> "BrowserSession":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+@contextmanager
+def _browser_context(
+    session: Optional[BrowserSession],
+    headless: bool,
+    block_resources: bool = True,
+    **context_kwargs: Any,
+) -> Iterator[Any]:
+    """
+    BrowserContext de la sesión compartida; sin sesión se lanza un navegador solo para este paso.
+    block_resources: no descargar imágenes, fuentes, CSS ni media (solo se usa el HTML).
+    """
+    if session is None:
+        with (
+            BrowserSession(headless=headless) as own_session,
+            _browser_context(own_session, headless, block_resources, **context_kwargs) as context,
+        ):
+            yield context
+        return
+    context = session.new_context(**context_kwargs)
+    if block_resources:
+        context.route("**/*", _abort_heavy_resources)
+    try:
+        yield context
+    finally:
+        context.close()
+
+
+def _storage_state_file(path: str, base_url: str, username: str) -> Path:
+    """Archivo de storage_state propio de (portal, usuario): <path sin extensión>-<hash>.json."""
+    digest = hashlib.blake2b(
+        f"{base_url.rstrip('/')}\n{username}".encode(), digest_size=6
+    ).hexdigest()
+    base = Path(path)
+    return base.with_name(f"{base.stem}-{digest}{base.suffix or '.json'}")
+
+
+def _load_fresh_storage_state(state_file: Path, ttl_seconds: int) -> Optional[Dict[str, Any]]:
+    """storage_state guardado hace menos de ttl_seconds, o None (no existe, caducado o ilegible)."""
+    try:
+        if ttl_seconds <= 0 or time.time() - state_file.stat().st_mtime > ttl_seconds:
+            return None
+        state = json.loads(state_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return state if isinstance(state, dict) and state.get("cookies") else None
+
+
+def _save_storage_state(state_file: Path, state: Dict[str, Any]) -> None:
+    """Escribe el storage_state (cookies de sesión) legible solo por el usuario (0600)."""
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(state_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    # os.open no cambia los permisos de un archivo que ya existía
+    os.chmod(state_file, 0o600)
+
+
+def _is_login_url(url: str) -> bool:
+    """True si la URL es una página de login (el portal redirigió por sesión caducada)."""
+    return "/login" in (urlsplit(url).path or "").lower()
+
 
 def login_with_playwright(
     base_url: str,
@@ -186,10 +568,21 @@ def login_with_playwright(
     headless: bool = True,
     timeout_ms: int = 15000,
     debug: bool = False,
+    session: Optional[BrowserSession] = None,
+    storage_state_path: Optional[str] = None,
+    storage_state_ttl: int = 3600,
+    force_login: bool = False,
 ) -> Dict[str, Any]:
     """
     Autentica en el portal usando Playwright y el perfil de auth (selectores).
     Retorna dict con success, cookies (lista de dicts name/value/domain), error (opcional).
+    session: BrowserSession compartida; si None, se lanza un navegador propio.
+    storage_state_path: tras un login correcto se guarda ahí el storage_state de Playwright
+    (cookies + localStorage, un archivo por portal y usuario; auth_profile["storage_state"] lo
+    sustituye). Si hay uno de hace menos de storage_state_ttl segundos y no se pide force_login,
+    se reutiliza sin abrir la página de login. El dict incluye entonces storage_state (ruta) y
+    reused=True: quien lo use debe comprobar que la sesión sigue viva y, si no, repetir con
+    force_login (ver course_discovery_node). El archivo se escribe con permisos 0600.
     """
     if not PLAYWRIGHT_AVAILABLE:
         return {
@@ -208,13 +601,27 @@ def login_with_playwright(
 
     result: Dict[str, Any] = {"success": False, "cookies": [], "error": None}
 
+    state_file: Optional[Path] = None
+    state_path = auth_profile.get("storage_state") or storage_state_path
+    if state_path:
+        state_file = _storage_state_file(state_path, base_url, username)
+        state = None if force_login else _load_fresh_storage_state(state_file, storage_state_ttl)
+        if state is not None:
+            log.info("  -> Sesion reutilizada desde %s (sin login).", state_file)
+            result["success"] = True
+            result["cookies"] = [
+                {"name": c["name"], "value": c["value"], "domain": c.get("domain", "")}
+                for c in state["cookies"]
+            ]
+            result["storage_state"] = str(state_file)
+            result["reused"] = True
+            return result
+
     try:
         log.info("  -> Navegando a pagina de login...")
-        with sync_playwright() as p:
-            browser: Browser = p.chromium.launch(headless=headless)
-            context: BrowserContext = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
+        with _browser_context(
+            session, headless, block_resources=auth_profile.get("block_resources", True)
+        ) as context:
             page: Page = context.new_page()
 
             page.goto(login_url, wait_until="domcontentloaded", timeout=timeout_ms)
@@ -227,8 +634,37 @@ def login_with_playwright(
             page.fill(password_sel, password)
             page.click(submit_sel)
 
-            page.wait_for_load_state("networkidle", timeout=timeout_ms)
-            time.sleep(2)
+            # Sin networkidle (lento con analítica en la página): se espera a que la URL
+            # indique éxito; si no hay indicadores de URL o no llega, basta domcontentloaded.
+            url_fragments = [
+                ind["url_contains"]
+                for ind in success_indicators
+                if isinstance(ind, dict) and ind.get("url_contains")
+            ]
+            url_ok = False
+            if url_fragments:
+                try:
+                    page.wait_for_url(
+                        lambda url: any(fragment in url for fragment in url_fragments),
+                        wait_until="domcontentloaded",
+                        timeout=timeout_ms,
+                    )
+                    url_ok = True
+                except PlaywrightTimeout:
+                    pass
+            if not url_ok:
+                page.wait_for_load_state("domcontentloaded", timeout=timeout_ms)
+                # Se espera solo hasta que aparezca un elemento de éxito o de error del perfil.
+                outcome_sel = ", ".join(
+                    ind["element_present"]
+                    for ind in list(success_indicators) + list(error_indicators)
+                    if isinstance(ind, dict) and ind.get("element_present")
+                )
+                if outcome_sel:
+                    try:
+                        page.wait_for_selector(outcome_sel, state="attached", timeout=timeout_ms)
+                    except PlaywrightTimeout:
+                        pass
             current_url = page.url
             if debug:
                 print(f"[DEBUG] After submit: {current_url}")
@@ -250,11 +686,14 @@ def login_with_playwright(
 
             # Check error indicators
             if not success:
+                # page.content() y su .lower() una sola vez para todos los text_contains
+                content_lower: Optional[str] = None
                 for ind in error_indicators:
                     if isinstance(ind, dict):
                         if "text_contains" in ind:
-                            content = page.content()
-                            if ind["text_contains"].lower() in content.lower():
+                            if content_lower is None:
+                                content_lower = page.content().lower()
+                            if ind["text_contains"].lower() in content_lower:
                                 result["error"] = (
                                     f"Login failed: page contains '{ind['text_contains']}'"
                                 )
@@ -274,10 +713,14 @@ def login_with_playwright(
                     {"name": c["name"], "value": c["value"], "domain": c.get("domain", "")}
                     for c in cookies
                 ]
+                if state_file is not None:
+                    try:
+                        _save_storage_state(state_file, context.storage_state())
+                        result["storage_state"] = str(state_file)
+                    except Exception as e:
+                        log.debug("No se pudo guardar storage_state en %s: %s", state_file, e)
             elif result.get("error") is None:
                 result["error"] = f"Login failed: redirected to {current_url}"
-
-            browser.close()
     except PlaywrightTimeout as e:
         result["error"] = f"Timeout: {e}"
     except Exception as e:
@@ -291,11 +734,15 @@ def _extract_courses_bs4(
     base_url: str,
     courses_profile: Optional[Dict[str, Any]] = None,
     debug: bool = False,
+    max_courses: int = 0,
+    soup: Optional[Any] = None,
 ) -> List[Dict[str, str]]:
     """
     Extrae la lista de cursos parseando el HTML con BeautifulSoup (tarjetas y selectores).
     Si se pasa courses_profile, usa card_selectors, name_selectors, link_selector,
     link_href_pattern y fallback_containers del perfil; si no, usa defaults Moodle.
+    max_courses > 0: deja de recorrer tarjetas/enlaces al llegar a ese número de cursos.
+    soup: árbol ya parseado de html (_courses_page_soup); si None, se parsea aquí.
     """
     if not BS4_AVAILABLE:
         return []
@@ -307,15 +754,30 @@ def _extract_courses_bs4(
     link_href_pattern = profile.get("link_href_pattern") or DEFAULT_LINK_HREF_PATTERN
     fallback_containers = profile.get("fallback_containers") or DEFAULT_FALLBACK_CONTAINERS
 
-    href_re = re.compile(re.escape(link_href_pattern) if link_href_pattern else "course/view")
-    soup = BeautifulSoup(html, "html.parser")
+    # link_href_pattern es un texto literal: basta con "in" (str.__contains__) en lugar de una regex.
+    href_pattern = link_href_pattern or DEFAULT_LINK_HREF_PATTERN
+
+    def is_course_href(href: Optional[str]) -> bool:
+        return bool(href) and href_pattern in href
+
+    # Con lxml el árbol se construye en C: en páginas de cursos con miles de nodos es varias
+    # veces más rápido que html.parser, y soupsieve sigue resolviendo los selectores CSS.
+    # parse_only: solo se crean las tarjetas/contenedores, no la navegación del resto de la página.
+    if soup is None:
+        soup = BeautifulSoup(
+            html,
+            _HTML_PARSER,
+            parse_only=_card_parse_only(list(card_selectors) + list(fallback_containers)),
+        )
     seen_urls: set = set()
+    # Como en _extract_courses_by_link_segment: href ya aceptados, antes de normalizar la URL
+    seen_hrefs: set = set()
     course_list: List[Dict[str, str]] = []
 
     cards = []
     for sel in card_selectors:
         try:
-            cards = soup.select(sel)
+            cards = compile_css(sel).select(soup)
             if cards:
                 if debug:
                     log.debug("  [HTML] Found %d cards with %s", len(cards), sel)
@@ -326,90 +788,134 @@ def _extract_courses_bs4(
     if not cards:
         # Fallback: enlaces dentro de contenedores del perfil
         for container_sel in fallback_containers:
-            for container in soup.select(container_sel):
+            for container in compile_css(container_sel).select(soup):
                 for a in container.find_all("a", href=True):
                     href = a.get("href") or ""
-                    if not href_re.search(href):
+                    if href in seen_hrefs or href_pattern not in href:
                         continue
-                    url = urljoin(base_url + "/", href)
-                    if url in seen_urls:
+                    url = _join_url(base_url, href)
+                    key = _course_url_key(url)
+                    if key in seen_urls:
                         continue
                     name = (a.get_text(strip=True) or "").strip()
                     if not name:
-                        prev = a.find_previous("span", class_=re.compile("multiline"))
+                        prev = a.find_previous("span", class_=_MULTILINE_RE)
                         if prev:
                             name = prev.get_text(strip=True) or prev.get("title", "")
                     if len(name) >= 2 or (len(name) >= 1 and len(url) >= 10):
-                        seen_urls.add(url)
+                        seen_urls.add(key)
+                        seen_hrefs.add(href)
                         course_list.append({"url": url, "name": name or "Sin nombre"})
+                        if max_courses and len(course_list) >= max_courses:
+                            return course_list
         return course_list
 
+    # Un único find_all de enlaces de curso en todo el documento; cada enlace se asigna a las
+    # tarjetas que lo contienen (el primero en orden de documento, como card.find).
+    card_links: Dict[int, Any] = {}
+    if not link_selector:
+        card_ids = {id(card) for card in cards}
+        for a in soup.find_all("a", href=is_course_href):
+            for parent in a.parents:
+                if id(parent) in card_ids:
+                    card_links.setdefault(id(parent), a)
+
     for card in cards:
         if link_selector:
-            link = card.select_one(link_selector)
+            link = _select_one(card, link_selector)
         else:
-            link = card.find("a", href=href_re)
+            link = card_links.get(id(card))
         if not link or not link.get("href"):
             continue
         href = link.get("href", "")
-        if not href_re.search(href):
+        if href in seen_hrefs or href_pattern not in href:
             continue
-        url = urljoin(base_url + "/", href)
-        if url in seen_urls:
+        url = _join_url(base_url, href)
+        key = _course_url_key(url)
+        if key in seen_urls:
             continue
-        name = ""
-        for ns in name_selectors:
-            try:
-                name_el = card.select_one(ns)
-                if name_el:
-                    name = name_el.get_text(strip=True) or name_el.get("title", "") or ""
-                    if name:
-                        break
-            except Exception:
-                continue
+        name = _card_name(card, name_selectors)
         if not name and link:
             name = link.get_text(strip=True) or ""
         if not name:
-            title_el = card.select_one("[title]")
+            title_el = card.find(attrs={"title": True})
             if title_el:
                 name = title_el.get("title", "") or ""
         name = (name or "Sin nombre").strip()
         if len(name) >= 1:
-            seen_urls.add(url)
+            seen_urls.add(key)
+            seen_hrefs.add(href)
             course_list.append({"url": url, "name": name})
+            if max_courses and len(course_list) >= max_courses:
+                break
     return course_list
 
 
+def _courses_page_soup(html: str, courses_profile: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Árbol único de la página de cursos para detect_courses_presence y los extractores de HTML
+    (_extract_courses_by_link_segment, _extract_courses_bs4): se parsea una vez con los <a href>,
+    las tarjetas y los contenedores del perfil (o el HTML completo si algún selector no es simple).
+    None sin bs4 o sin HTML.
+    """
+    if not BS4_AVAILABLE or not html:
+        return None
+    profile = courses_profile or {}
+    selectors = (
+        list(profile.get("card_selectors") or DEFAULT_CARD_SELECTORS)
+        + list(profile.get("fallback_containers") or DEFAULT_FALLBACK_CONTAINERS)
+        + ["a[href]"]
+    )
+    return BeautifulSoup(html, _HTML_PARSER, parse_only=_card_parse_only(selectors))
+
+
 def _extract_courses_by_link_segment(
     html: str,
     base_url: str,
     courses_profile: Optional[Dict[str, Any]] = None,
     debug: bool = False,
+    max_courses: int = 0,
+    soup: Optional[Any] = None,
 ) -> List[Dict[str, str]]:
     """
     Extrae cursos buscando todos los enlaces cuya URL tenga en algún segmento del path
     una de las palabras clave configuradas (p. ej. course, courses, cursos). No depende de CSS.
+    max_courses > 0: deja de recorrer enlaces al llegar a ese número de cursos.
+    soup: árbol ya parseado de html (_courses_page_soup); si None, se parsea aquí.
     """
     if not BS4_AVAILABLE or not html:
         return []
     base_url = base_url.rstrip("/")
     segment_keywords = _get_course_link_segments_from_profile(courses_profile)
-    soup = BeautifulSoup(html, "html.parser")
+    # Tupla una sola vez: el bucle llama directamente al núcleo memorizado, sin copiar la lista
+    # de palabras clave por enlace.
+    keywords = tuple(segment_keywords)
+    if not keywords:
+        return []
+    if soup is None:
+        soup = BeautifulSoup(html, _HTML_PARSER, parse_only=_ANCHOR_STRAINER)
     seen_urls: set = set()
+    # href ya aceptados: el mismo curso enlazado varias veces (menú, tarjeta, migas) se descarta
+    # antes de normalizar la URL; seen_urls cubre hrefs distintos que apuntan al mismo curso.
+    seen_hrefs: set = set()
     course_list: List[Dict[str, str]] = []
     for a in soup.find_all("a", href=True):
         href = (a.get("href") or "").strip()
-        if not href or href.startswith("#") or href.startswith("javascript:"):
+        if not href or href in seen_hrefs or href.startswith(("#", "javascript:")):
             continue
-        if not _is_course_url_by_segment(href, base_url, segment_keywords):
+        if not _is_course_href(href, base_url, keywords):
             continue
-        url = urljoin(base_url + "/", href)
-        if url in seen_urls:
+        url = _join_url(base_url, href)
+        key = _course_url_key(url)
+        if key in seen_urls:
             continue
         name = (a.get_text(strip=True) or "").strip()
         if len(name) >= 2 or (len(name) >= 1 and len(url) >= 10):
-            seen_urls.add(url)
+            seen_urls.add(key)
+            seen_hrefs.add(href)
             course_list.append({"url": url, "name": name or "Sin nombre"})
+            if max_courses and len(course_list) >= max_courses:
+                break
     if debug and course_list:
         log.debug(
             "  [link_segment] Encontrados %d cursos por segmento URL (keywords: %s)",
@@ -424,28 +930,54 @@ def _extract_courses_llm(
     base_url: str,
     debug: bool = False,
     llm_client: Optional[Any] = None,
+    max_courses: int = 0,
 ) -> List[Dict[str, str]]:
     """
     Usa el LLM local (Ollama) para extraer cursos desde el HTML de "Mis cursos".
-    Opcional: llm_client para inyectar cliente (tests); si None, se usa LocalLLMClient().
+    Opcional: llm_client para inyectar cliente (tests); si None, se usa get_llm_client().
+    max_courses > 0: el modelo deja de generar al llegar a ese número de cursos.
     """
     try:
         if llm_client is None:
-            from lms_agent_scraper.llm.ollama_client import LocalLLMClient
+            from lms_agent_scraper.llm.ollama_client import get_llm_client
 
-            llm_client = LocalLLMClient()
+            llm_client = get_llm_client()
         client = llm_client
-        if not client.available:
-            if debug:
-                log.debug("  [DEBUG] Ollama no disponible; omitiendo extraccion con LLM")
-            return []
-        return client.extract_courses_from_html(html, base_url, max_chars=18000)
+        if debug and not client.available:
+            log.debug("  [DEBUG] Ollama no disponible; solo enlaces course/view.php, sin LLM")
+        # Sin Ollama, extract_courses_from_html aún prueba los enlaces course/view.php (sin modelo).
+        return client.extract_courses_from_html(
+            html, base_url, max_chars=18000, max_courses=max_courses
+        )
     except Exception as e:
         if debug:
             log.debug("  [DEBUG] LLM extraction error: %s", e)
         return []
 
 
+# outerHTML del contenedor de cursos si existe y contiene algún enlace con el patrón; si no, null.
+_CONTAINER_HTML_JS = """([containerSel, pattern]) => {
+  let el = null;
+  try { el = document.querySelector(containerSel); } catch (e) {}
+  if (!el) return null;
+  for (const a of el.querySelectorAll('a[href]')) {
+    if (a.getAttribute('href').includes(pattern)) return el.outerHTML;
+  }
+  return null;
+}"""
+
+# [href, texto] de los enlaces de un locator cuyo href contiene el patrón y tienen texto.
+_LOCATED_LINKS_JS = """(nodes, pattern) => {
+  const out = [];
+  for (const a of nodes) {
+    const href = a.getAttribute('href');
+    const text = (a.innerText || '').trim();
+    if (href && href.includes(pattern) && text.length >= 1) out.push([href, text]);
+  }
+  return out;
+}"""
+
+
 def _try_extract_courses_step_by_step(
     html_snapshot: str,
     page: Any,
@@ -456,16 +988,26 @@ def _try_extract_courses_step_by_step(
     link_href_pattern: str,
     debug: bool,
     llm_client: Optional[Any] = None,
+    max_courses: int = 0,
+    soup: Optional[Any] = None,
 ) -> Tuple[List[Dict[str, str]], bool]:
     """
-    Ejecuta en orden: extracción por segmento URL, BS4, LLM, Playwright.
+    Ejecuta en orden: extracción por segmento URL, BS4, selectores Playwright, LLM.
+    soup: árbol de html_snapshot ya parseado (_courses_page_soup), compartido por los pasos HTML.
     Retorna (lista de cursos, found_early). Si found_early es True, un paso devolvió cursos y se puede retornar ya.
+    Los pasos baratos (HTML ya capturado y una evaluación por selector en la página) van antes del LLM.
     """
     segment_keywords = _get_course_link_segments_from_profile(courses_profile)
 
-    # Paso 0: enlaces por segmento de URL
+    # Paso 0: enlaces por segmento de URL (sobre el HTML capturado; recorrer de nuevo los enlaces
+    # del DOM en vivo daría el mismo resultado, así que no se repite con Playwright)
     course_list = _extract_courses_by_link_segment(
-        html_snapshot, base_url, courses_profile=courses_profile, debug=debug
+        html_snapshot,
+        base_url,
+        courses_profile=courses_profile,
+        debug=debug,
+        max_courses=max_courses,
+        soup=soup,
     )
     if course_list:
         log.info(
@@ -478,74 +1020,59 @@ def _try_extract_courses_step_by_step(
     # Paso 1: BeautifulSoup
     if BS4_AVAILABLE:
         course_list = _extract_courses_bs4(
-            html_snapshot, base_url, courses_profile=courses_profile, debug=debug
+            html_snapshot,
+            base_url,
+            courses_profile=courses_profile,
+            debug=debug,
+            max_courses=max_courses,
+            soup=soup,
         )
         if course_list:
             log.info("  -> Cursos obtenidos con HTML (BeautifulSoup): %d", len(course_list))
             return (course_list, True)
-    log.info("  -> BeautifulSoup: 0 cursos; probando LLM...")
+    log.info("  -> BeautifulSoup: 0 cursos; probando selectores Playwright...")
 
-    # Paso 2: LLM
-    course_list = _extract_courses_llm(
-        html_snapshot, base_url, debug=debug, llm_client=llm_client
-    )
-    if course_list:
-        log.info("  -> Cursos obtenidos con LLM (Ollama): %d", len(course_list))
-        return (course_list, True)
-    log.info("  -> LLM no disponible o devolvio 0; probando selectores Playwright...")
-
-    # Paso 3: Playwright (enlaces por segmento y luego selectores CSS)
+    # Paso 2: selectores del perfil con el motor de Playwright (admiten text=, :has-text(), >>,
+    # :visible...). Un evaluate_all por selector: href + texto de todos sus enlaces en una ida y
+    # vuelta, no dos por enlace; se para en el primer selector que da enlaces.
     course_list = []
     seen_urls: set = set()
-    try:
-        for link_el in page.locator("a[href]").all():
-            try:
-                href = link_el.get_attribute("href")
-                if not href:
-                    continue
-                if not _is_course_url_by_segment(href, base_url, segment_keywords):
-                    continue
-                url = urljoin(base_url + "/", href)
-                if url in seen_urls:
-                    continue
-                text = (link_el.inner_text() or "").strip()
-                if len(text) >= 2 or (len(text) >= 1 and len(url) >= 10):
-                    seen_urls.add(url)
-                    course_list.append({"url": url, "name": text or "Sin nombre"})
-            except Exception:
-                continue
-    except Exception:
-        pass
-    if course_list:
-        log.info(
-            "  -> Cursos obtenidos con Playwright (enlaces por segmento URL): %d",
-            len(course_list),
-        )
-        return (course_list, False)
     scope = page
     try:
         if page.locator(container_sel).count() > 0:
             scope = page.locator(container_sel).first
     except Exception:
         pass
+    links = []
     for sel in selectors:
-        for link in scope.locator(sel).all():
-            try:
-                href = link.get_attribute("href")
-                text = (link.inner_text() or "").strip()
-                if href and link_href_pattern in href and len(text) >= 1:
-                    url = urljoin(base_url + "/", href)
-                    if url not in seen_urls:
-                        seen_urls.add(url)
-                        course_list.append({"url": url, "name": text.strip()})
-            except Exception:
-                continue
-        if course_list:
+        try:
+            links = scope.locator(sel).evaluate_all(_LOCATED_LINKS_JS, link_href_pattern)
+        except Exception as e:
+            log.warning("  Selector de cursos %r no aplicable: %s", sel, e)
+            links = []
+        if links:
             break
+    for href, text in links:
+        url = _join_url(base_url, href)
+        key = _course_url_key(url)
+        if key not in seen_urls:
+            seen_urls.add(key)
+            course_list.append({"url": url, "name": text})
+            if max_courses and len(course_list) >= max_courses:
+                break
     if course_list:
         log.info("  -> Cursos obtenidos con selectores Playwright: %d", len(course_list))
-    else:
-        log.info("  -> Selectores Playwright: 0 enlaces.")
+        return (course_list, False)
+    log.info("  -> Selectores Playwright: 0 enlaces; probando LLM...")
+
+    # Paso 3: LLM
+    course_list = _extract_courses_llm(
+        html_snapshot, base_url, debug=debug, llm_client=llm_client, max_courses=max_courses
+    )
+    if course_list:
+        log.info("  -> Cursos obtenidos con LLM (Ollama): %d", len(course_list))
+        return (course_list, True)
+    log.info("  -> LLM no disponible o devolvio 0.")
     return (course_list, False)
 
 
@@ -559,12 +1086,19 @@ def get_course_links_with_playwright(
     debug: bool = False,
     course_discovery_profile: Optional[Dict[str, Any]] = None,
     llm_client: Optional[Any] = None,
+    max_courses: int = 0,
+    session: Optional[BrowserSession] = None,
+    storage_state_path: Optional[str] = None,
 ) -> List[Dict[str, str]]:
     """
     Obtiene la lista de cursos desde la página de cursos usando Playwright y cookies de sesión.
     Si course_discovery_profile tiene fallback_when_empty: true y no se encontraron cursos,
     se usa el agente de descubrimiento por contenido (visitar enlaces y clasificar con LLM).
-    Opcional: llm_client para inyectar cliente LLM (tests); si None, se usa LocalLLMClient().
+    Opcional: llm_client para inyectar cliente LLM (tests); si None, se usa el cliente compartido.
+    max_courses > 0 (o courses_profile["max_courses"]): cada extractor se detiene al llegar a ese
+    número de cursos.
+    session: BrowserSession compartida (p. ej. la del login); si None, se lanza un navegador propio.
+    storage_state_path: storage_state guardado por el login (cookies + localStorage) para el contexto.
     """
     if not PLAYWRIGHT_AVAILABLE:
         return []
@@ -574,23 +1108,29 @@ def get_course_links_with_playwright(
     container_sel = courses_profile.get("container", "[data-region='courses-view']")
     selectors = courses_profile.get("selectors", ["a[href*='course/view.php']"])
     link_href_pattern = courses_profile.get("link_href_pattern") or DEFAULT_LINK_HREF_PATTERN
+    max_courses = max_courses or courses_profile.get("max_courses") or 0
 
     course_list: List[Dict[str, str]] = []
+    context_kwargs: Dict[str, Any] = {}
+    if storage_state_path and Path(storage_state_path).is_file():
+        context_kwargs["storage_state"] = storage_state_path
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=headless)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
+        with _browser_context(
+            session,
+            headless,
+            block_resources=courses_profile.get("block_resources", True),
+            **context_kwargs,
+        ) as context:
             if cookies:
+                # Host del portal (sin puerto) para cookies sin dominio, calculado una vez
+                default_domain = urlsplit(base_url).hostname or ""
                 context.add_cookies(
                     [
                         {
                             "name": c["name"],
                             "value": c["value"],
-                            "domain": c.get("domain", "").lstrip(".")
-                            or base_url.replace("https://", "").split("/")[0],
+                            "domain": (c.get("domain") or "").lstrip(".") or default_domain,
                             "path": "/",
                         }
                         for c in cookies
@@ -599,38 +1139,48 @@ def get_course_links_with_playwright(
             page = context.new_page()
             log.info("  -> Navegando a pagina de cursos (%s)...", courses_page_path)
             page.goto(courses_url, wait_until="domcontentloaded", timeout=timeout_ms)
-            # Dar tiempo al JS (block_myoverview): networkidle y luego esperar tarjetas
+            if _is_login_url(page.url):
+                # Sesión caducada o revocada: no hay cursos que extraer en la página de login
+                log.warning("  -> La pagina de cursos redirigio al login (%s).", page.url)
+                return []
+            # Sin networkidle: la señal útil es que block_myoverview haya pintado las tarjetas.
+            # Una sola espera a que existan (cualquiera de los dos marcados), sin pausa fija.
             try:
-                page.wait_for_load_state("networkidle", timeout=15000)
-            except Exception:
-                pass
-            try:
-                page.wait_for_selector("[data-region='course-content']", timeout=12000)
+                page.wait_for_selector(
+                    "[data-region='course-content'], .course-card", state="attached", timeout=12000
+                )
             except Exception:
-                try:
-                    page.wait_for_selector(".course-card", timeout=6000)
-                except Exception:
-                    if debug:
-                        log.debug("  [DEBUG] No course cards selector, continuing")
-            time.sleep(1)
+                if debug:
+                    log.debug("  [DEBUG] No course cards selector, continuing")
 
             # Opcional: expandir "Ver más" / paginación antes de capturar HTML
             more_nav = courses_profile.get("more_navigation") or {}
             if more_nav.get("expand_before_extract") and more_nav.get("selectors"):
                 _expand_more_navigation(page, more_nav)
 
-            html_snapshot = page.content()
+            # Solo el contenedor de cursos (si tiene enlaces a cursos): menos datos por CDP y
+            # menos HTML que parsear; si no, la página completa (la necesita el discovery).
+            try:
+                html_snapshot = (
+                    page.evaluate(_CONTAINER_HTML_JS, [container_sel, link_href_pattern])
+                    or page.content()
+                )
+            except Exception:
+                html_snapshot = page.content()
             log.info("  -> HTML de pagina de cursos: %d caracteres", len(html_snapshot or ""))
             if debug:
-                from pathlib import Path
-
                 debug_dir = Path("debug_html")
                 debug_dir.mkdir(exist_ok=True)
-                (debug_dir / "courses_page.html").write_text(html_snapshot, encoding="utf-8")
+                # Un solo encode; "replace" evita fallar con surrogates sueltos que vienen del DOM
+                (debug_dir / "courses_page.html").write_bytes(
+                    (html_snapshot or "").encode("utf-8", errors="replace")
+                )
                 log.debug("  [DEBUG] Saved courses_page.html")
 
             # Detección explícita de presencia de tarjetas de curso
-            presence = detect_courses_presence(html_snapshot, courses_profile)
+            # Un solo parseo del HTML para la detección y los extractores de HTML
+            soup = _courses_page_soup(html_snapshot, courses_profile)
+            presence = detect_courses_presence(html_snapshot, courses_profile, soup=soup)
             log.info(
                 "  -> Presencia de cursos: has_courses=%s, card_count=%d, selector=%s",
                 presence["has_courses"],
@@ -648,9 +1198,10 @@ def get_course_links_with_playwright(
                 link_href_pattern,
                 debug,
                 llm_client=llm_client,
+                max_courses=max_courses,
+                soup=soup,
             )
             if found_early:
-                browser.close()
                 return course_list
 
             if presence["has_courses"] and not course_list:
@@ -682,8 +1233,6 @@ def get_course_links_with_playwright(
                     log.info(
                         "  -> Cursos obtenidos con discovery por contenido: %d", len(course_list)
                     )
-
-            browser.close()
     except Exception as e:
         if debug:
             print(f"[DEBUG] get_course_links error: {e}")
@@ -3,17 +3,26 @@ Herramientas de extracción de tareas desde HTML usando perfil de selectores.
 """
 
 import logging
+import re
+import threading
 import time
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 
+from lms_agent_scraper.core.css import compile_css
 from lms_agent_scraper.core.date_parser import extract_date_from_text
 
 log = logging.getLogger(__name__)
 
 
+# Ritmo de descarga por hilo: de media una petición al portal cada REQUEST_INTERVAL segundos
+REQUEST_INTERVAL = 0.5
+
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
 
@@ -40,6 +49,40 @@ def session_from_cookies(
     return session
 
 
+# Contenido de [...] y (...) (pueden llevar espacios o combinadores) y separadores entre compuestos
+_SELECTOR_GROUPS_RE = re.compile(r"\[[^\]]*\]|\([^)]*\)")
+_COMBINATOR_RE = re.compile(r"[\s>+~]+")
+_ANCHOR_COMPOUND_RE = re.compile(r"a(?![\w-])")
+
+
+def _selects_only_anchors(selector: str) -> bool:
+    """True si cada alternativa del selector termina en un compuesto de tipo a (a, a.x, a[href])."""
+    if ":scope" in selector:
+        return False
+    for part in _SELECTOR_GROUPS_RE.sub("", selector).split(","):
+        compounds = _COMBINATOR_RE.split(part.strip())
+        if not _ANCHOR_COMPOUND_RE.match(compounds[-1]):
+            return False
+    return True
+
+
+def _select_links(soup: Any, selectors: List[str]) -> Iterator[Any]:
+    """
+    Equivale a encadenar soup.select(s) para cada selector, en ese orden. Si todos seleccionan
+    enlaces, se recorren los <a> una sola vez probando cada selector compilado, en vez de que
+    soupsieve recorra el árbol completo una vez por selector.
+    """
+    if not all(_selects_only_anchors(s) for s in selectors):
+        return chain.from_iterable(compile_css(s).select(soup) for s in selectors)
+    compiled = [compile_css(s) for s in selectors]
+    matches: List[List[Any]] = [[] for _ in compiled]
+    for a in soup.find_all("a"):
+        for i, sel in enumerate(compiled):
+            if sel.match(a):
+                matches[i].append(a)
+    return chain.from_iterable(matches)
+
+
 def _assignment_type_from_href(href: str, profile_types: List[Dict]) -> str:
     """Determina el tipo de actividad desde la URL según el perfil."""
     href_lower = (href or "").lower()
@@ -85,47 +128,46 @@ def extract_assignments_from_html(
     date_patterns = date_config.get("patterns", [])
 
     seen_hrefs = set()
-    for selector in assignment_selectors:
-        for link in soup.select(selector):
-            try:
-                href = link.get("href", "")
-                if not href or href in seen_hrefs:
-                    continue
-                title = link.get_text(strip=True)
-                if not title or len(title) < 3:
-                    continue
-                seen_hrefs.add(href)
-                if base_url and not href.startswith("http"):
-                    href = base_url.rstrip("/") + ("/" if not href.startswith("/") else "") + href
-                due_date_str = ""
-                parent = link.parent
-                if parent:
-                    parent_text = parent.get_text(strip=True)
-                    due_date_str = extract_date_from_text(parent_text, date_patterns) or ""
-                    if not due_date_str:
-                        for ds in date_selectors:
-                            elem = parent.select_one(ds)
-                            if elem:
-                                due_date_str = elem.get_text(strip=True)
-                                break
-                assignment_type = _assignment_type_from_href(
-                    href,
-                    profile.get("assignments", {}).get("types", []),
-                )
-                assignments.append(
-                    {
-                        "title": title,
-                        "due_date": due_date_str or "",
-                        "course": course_name,
-                        "type": assignment_type,
-                        "url": href,
-                        "section": section_name,
-                        "submission_status": {"submitted": False, "status_text": "No entregada"},
-                        "attached_files": [],
-                    }
-                )
-            except Exception:
+    for link in _select_links(soup, assignment_selectors):
+        try:
+            href = link.get("href", "")
+            if not href or href in seen_hrefs:
+                continue
+            title = link.get_text(strip=True)
+            if not title or len(title) < 3:
                 continue
+            seen_hrefs.add(href)
+            if base_url and not href.startswith("http"):
+                href = base_url.rstrip("/") + ("/" if not href.startswith("/") else "") + href
+            due_date_str = ""
+            parent = link.parent
+            if parent:
+                parent_text = parent.get_text(strip=True)
+                due_date_str = extract_date_from_text(parent_text, date_patterns) or ""
+                if not due_date_str:
+                    for ds in date_selectors:
+                        elem = compile_css(ds).select_one(parent)
+                        if elem:
+                            due_date_str = elem.get_text(strip=True)
+                            break
+            assignment_type = _assignment_type_from_href(
+                href,
+                profile.get("assignments", {}).get("types", []),
+            )
+            assignments.append(
+                {
+                    "title": title,
+                    "due_date": due_date_str or "",
+                    "course": course_name,
+                    "type": assignment_type,
+                    "url": href,
+                    "section": section_name,
+                    "submission_status": {"submitted": False, "status_text": "No entregada"},
+                    "attached_files": [],
+                }
+            )
+        except Exception:
+            continue
     return assignments
 
 
@@ -141,9 +183,9 @@ def extract_assignments_from_html_with_llm(
     Extrae tareas intentando primero con el LLM; si no está disponible o devuelve vacío, usa selectores del perfil.
     """
     try:
-        from lms_agent_scraper.llm.ollama_client import LocalLLMClient
+        from lms_agent_scraper.llm.ollama_client import get_llm_client
 
-        client = LocalLLMClient()
+        client = get_llm_client()
         if client.available:
             items = client.extract_assignments_from_course_html(
                 html, course_name=course_name, base_url=base_url
@@ -162,6 +204,101 @@ def extract_assignments_from_html_with_llm(
     )
 
 
+def extract_assignments_from_pages_with_llm(
+    pages: List[Tuple[str, str, str]],
+    profile: Dict[str, Any],
+    base_url: str = "",
+) -> List[List[Dict[str, Any]]]:
+    """
+    Como extract_assignments_from_html_with_llm para varias páginas (course_name, course_url, html):
+    una sola llamada al LLM para todos los cursos; los cursos sin resultado usan selectores del perfil.
+    Retorna una lista de tareas por página, alineada con pages.
+    """
+    results: List[List[Dict[str, Any]]] = [[] for _ in pages]
+    try:
+        from lms_agent_scraper.llm.ollama_client import get_llm_client
+
+        client = get_llm_client()
+        if client.available and pages:
+            results = client.extract_assignments_multi(
+                [(html, course_name, base_url) for course_name, _url, html in pages]
+            )
+    except Exception as e:
+        log.debug("LLM extraction fallback a selectores: %s", e)
+    return [
+        items
+        or extract_assignments_from_html(
+            html,
+            course_name=course_name,
+            course_url=course_url,
+            profile=profile,
+            section_name="Main",
+            base_url=base_url,
+        )
+        for items, (course_name, course_url, html) in zip(results, pages)
+    ]
+
+
+class _RequestPacer:
+    """
+    Cubo de tokens del portal compartido por los hilos: como mucho `rate` inicios de petición
+    por segundo, con ráfagas de hasta `burst`. Sustituye la pausa fija tras cada descarga, que
+    dejaba hilos parados aunque el servidor tardara más que la pausa en responder.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Reserva un token; duerme (fuera del lock) lo necesario hasta que esté disponible."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _fetch_course_page(
+    session: requests.Session,
+    course: Dict[str, str],
+    index: int,
+    limit: int,
+    base_url: str,
+    timeout: int,
+    pacer: Optional[_RequestPacer] = None,
+) -> Optional[Tuple[str, str, str]]:
+    """Descarga la página de un curso; retorna (course_name, course_url, html) o None si falla."""
+    course_url = course.get("url", "")
+    course_name = course.get("name", "Sin nombre")
+    if not course_url:
+        return None
+    log.info(
+        "  → Curso %d/%d: %s",
+        index + 1,
+        limit,
+        course_name[:50] + ("..." if len(course_name) > 50 else ""),
+    )
+    if not course_url.startswith("http"):
+        course_url = (
+            base_url.rstrip("/") + ("/" if not course_url.startswith("/") else "") + course_url
+        )
+    if pacer is not None:
+        pacer.wait()
+    try:
+        resp = session.get(course_url, timeout=timeout)
+        resp.raise_for_status()
+        return course_name, course_url, resp.text
+    except Exception:
+        return None
+
+
 def get_assignments_for_courses(
     courses: List[Dict[str, str]],
     cookies: List[Dict[str, Any]],
@@ -170,55 +307,53 @@ def get_assignments_for_courses(
     max_courses: int = 0,
     timeout: int = 30,
     use_llm_first: bool = False,
+    concurrency: int = 1,
 ) -> List[Dict[str, Any]]:
     """
     Por cada curso, obtiene la página y extrae assignments.
-    Si use_llm_first es True, intenta extracción con LLM por curso; si falla o está vacío, usa selectores.
-    Retorna la lista agregada de assignments.
+    Si use_llm_first es True, descarga todas las páginas y extrae con una sola llamada al LLM
+    (extract_assignments_from_pages_with_llm); los cursos sin resultado usan selectores.
+    concurrency: cursos descargados en paralelo (hilos con una sesión y pool de conexiones
+    compartidos); 1 = secuencial.
+    Retorna la lista agregada de assignments, en el orden de los cursos.
     """
     if not courses:
         return []
+    workers = max(1, concurrency)
     session = session_from_cookies(cookies, base_url)
-    all_assignments = []
+    if workers > 1:
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
     limit = len(courses) if max_courses <= 0 else min(max_courses, len(courses))
-    for i, course in enumerate(courses[:limit]):
-        course_url = course.get("url", "")
-        course_name = course.get("name", "Sin nombre")
-        if not course_url:
-            continue
-        log.info(
-            "  → Curso %d/%d: %s",
-            i + 1,
-            limit,
-            course_name[:50] + ("..." if len(course_name) > 50 else ""),
-        )
-        if not course_url.startswith("http"):
-            course_url = (
-                base_url.rstrip("/") + ("/" if not course_url.startswith("/") else "") + course_url
+    # Un cubo para todo el portal: cada hilo a lo sumo una petición por REQUEST_INTERVAL
+    pacer = _RequestPacer(rate=workers / REQUEST_INTERVAL, burst=workers)
+
+    def fetch(args: Tuple[int, Dict[str, str]]) -> Optional[Tuple[str, str, str]]:
+        index, course = args
+        return _fetch_course_page(session, course, index, limit, base_url, timeout, pacer)
+
+    if workers == 1:
+        pages = list(map(fetch, enumerate(courses[:limit])))
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, limit))) as executor:
+            pages = list(executor.map(fetch, enumerate(courses[:limit])))
+    fetched = [page for page in pages if page is not None]
+    if use_llm_first:
+        per_page = extract_assignments_from_pages_with_llm(fetched, profile, base_url)
+    else:
+        per_page = [
+            extract_assignments_from_html(
+                html,
+                course_name=course_name,
+                course_url=course_url,
+                profile=profile,
+                section_name="Main",
+                base_url=base_url,
             )
-        try:
-            resp = session.get(course_url, timeout=timeout)
-            resp.raise_for_status()
-            if use_llm_first:
-                items = extract_assignments_from_html_with_llm(
-                    resp.text,
-                    course_name=course_name,
-                    course_url=course_url,
-                    profile=profile,
-                    base_url=base_url,
-                    section_name="Main",
-                )
-            else:
-                items = extract_assignments_from_html(
-                    resp.text,
-                    course_name=course_name,
-                    course_url=course_url,
-                    profile=profile,
-                    section_name="Main",
-                    base_url=base_url,
-                )
-            all_assignments.extend(items)
-        except Exception:
-            continue
-        time.sleep(0.5)
+            for course_name, course_url, html in fetched
+        ]
+    all_assignments: List[Dict[str, Any]] = []
+    for items in per_page:
+        all_assignments.extend(items)
     return all_assignments
@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
-from lms_agent_scraper.core.date_parser import parse_date
+from lms_agent_scraper.core.date_parser import parse_dates
 from lms_agent_scraper.core.skill_loader import SkillLoader
 
 
@@ -22,8 +22,8 @@ def filter_by_date(
     future_cutoff = today + timedelta(days=days_ahead)
     past_cutoff = today - timedelta(days=days_behind)
     filtered = []
-    for a in assignments:
-        due = parse_date(a.get("due_date", ""))
+    due_dates = parse_dates(a.get("due_date", "") for a in assignments)
+    for a, due in zip(assignments, due_dates):
         if due:
             d = due.date() if hasattr(due, "date") else due
         else:
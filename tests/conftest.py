@@ -1,8 +1,12 @@
 """Pytest fixtures and path setup."""
 
+import os
 import sys
 from pathlib import Path
 
+# Sin caché de respuestas LLM en disco durante los tests (resultados independientes entre ejecuciones).
+os.environ.setdefault("OLLAMA_RESPONSE_CACHE_TTL", "0")
+
 # Asegurar que src está en el path
 root = Path(__file__).resolve().parent.parent
 src = root / "src"
@@ -5,6 +5,7 @@ from lms_agent_scraper.tools.browser_tools import (
     _get_course_link_segments_from_profile,
     _is_course_url_by_segment,
     _extract_courses_by_link_segment,
+    _extract_courses_bs4,
 )
 
 
@@ -96,6 +97,22 @@ class TestIsCourseUrlBySegment:
     def test_empty_keywords_rejects(self):
         assert _is_course_url_by_segment("/course/view.php", BASE, []) is False
 
+    def test_matches_per_segment_check(self):
+        """La regex única equivale a comprobar cada segmento del path con cada palabra."""
+        from urllib.parse import urljoin, urlsplit
+
+        def per_segment(href, keywords):
+            path = urlsplit(urljoin(BASE + "/", href)).path.strip("/")
+            segments = [s.lower() for s in path.split("/") if s]
+            return any(k.lower() in seg for seg in segments for k in keywords if k)
+
+        hrefs = ["/Course/x", "/a/mycourses/", "/cur/sos", "/a/b?c=course", "/x/CURSOS2", "/"]
+        for keywords in [["course"], ["cursos", "COURSES"], ["r/s"], ["", "sos"]]:
+            for href in hrefs:
+                assert _is_course_url_by_segment(href, BASE, keywords) == per_segment(
+                    href, keywords
+                ), (href, keywords)
+
 
 class TestGetCourseLinkSegmentsFromProfile:
     """Tests para _get_course_link_segments_from_profile."""
@@ -146,6 +163,25 @@ class TestExtractCoursesByLinkSegment:
         result = _extract_courses_by_link_segment(html, BASE, None)
         assert len(result) == 1
 
+    def test_deduplicates_by_course_id_ignoring_other_params(self):
+        html = """
+        <a href="/course/view.php?id=5">Curso A</a>
+        <a href="/course/view.php?id=5&amp;section=2">Curso A (sección)</a>
+        <a href="/course/view.php?id=6">Curso B</a>
+        <a href="/course/index.php?categoryid=1">Categoría 1</a>
+        <a href="/course/index.php?categoryid=2">Categoría 2</a>
+        """
+        result = _extract_courses_by_link_segment(html, BASE)
+        assert [c["name"] for c in result] == ["Curso A", "Curso B", "Categoría 1", "Categoría 2"]
+
+    def test_max_courses_stops_early(self):
+        html = "".join(f'<a href="/course/view.php?id={i}">Curso {i}</a>' for i in range(10))
+        assert len(_extract_courses_by_link_segment(html, BASE, max_courses=3)) == 3
+        assert (
+            len(_extract_courses_bs4(f"<div class='card-grid'>{html}</div>", BASE, max_courses=2))
+            == 2
+        )
+
     def test_uses_profile_keywords(self):
         html = '<html><body><a href="/materias/1">Matemáticas</a></body></html>'
         profile = {"course_link_segments": ["materias"]}
@@ -157,3 +193,425 @@ class TestExtractCoursesByLinkSegment:
     def test_empty_html_returns_empty(self):
         assert _extract_courses_by_link_segment("", BASE, None) == []
         assert _extract_courses_by_link_segment("<html></html>", BASE, None) == []
+
+
+class TestExtractCoursesBs4:
+    """Tests para _extract_courses_bs4 (tarjetas y contenedores de respaldo)."""
+
+    def test_extracts_name_and_url_from_cards(self):
+        html = """
+        <div data-region="course-content">
+          <a href="/course/view.php?id=1"><img src="x.png"></a>
+          <a class="aalink coursename" href="/course/view.php?id=1">
+            <span class="multiline">Cálculo I</span></a>
+        </div>
+        <div data-region="course-content">
+          <span title="Física"></span><a href="/course/view.php?id=2"></a>
+        </div>
+        <div data-region="course-content"><a href="/course/view.php?id=1">Repetido</a></div>
+        """
+        assert _extract_courses_bs4(html, BASE + "/") == [
+            {"url": f"{BASE}/course/view.php?id=1", "name": "Cálculo I"},
+            {"url": f"{BASE}/course/view.php?id=2", "name": "Física"},
+        ]
+
+    def test_falls_back_to_links_in_containers(self):
+        html = """
+        <div class="card-grid">
+          <span class="multiline">Química</span><a href="/course/view.php?id=7"></a>
+          <a href="/user/profile.php">Perfil</a>
+        </div>
+        """
+        assert _extract_courses_bs4(html, BASE) == [
+            {"url": f"{BASE}/course/view.php?id=7", "name": "Química"},
+        ]
+
+    def test_parse_only_keeps_same_result_as_full_parse(self, monkeypatch):
+        """Filtrar las etiquetas al parsear no cambia los cursos extraídos."""
+        import lms_agent_scraper.tools.browser_tools as bt
+
+        html = """
+        <nav><a href="/course/view.php?id=9">Menú</a></nav>
+        <div data-region="course-content"><a class="coursename" href="/course/view.php?id=1">
+          <span class="multiline">Cálculo I</span></a></div>
+        <div class="card-grid"><span class="multiline">Química</span>
+          <a href="/course/view.php?id=7"></a></div>
+        """
+        strained = _extract_courses_bs4(html, BASE)
+        monkeypatch.setattr(bt, "_card_parse_only", lambda selectors: None)
+        assert strained == _extract_courses_bs4(html, BASE)
+        assert bt._parse_simple_selector("div.card > a") is None
+        assert bt._parse_simple_selector("a[data-x='']") == ("a", frozenset(), (("data-x", ""),))
+
+    def test_select_one_matches_soupsieve(self):
+        """_select_one con selectores simples devuelve el mismo elemento que select_one."""
+        from bs4 import BeautifulSoup
+
+        from lms_agent_scraper.tools.browser_tools import DEFAULT_NAME_SELECTORS, _select_one
+
+        card = BeautifulSoup(
+            '<div><span title="">v</span><a class="coursename aalink" href="/x">A</a>'
+            '<a class="coursename">B</a><span class="x multiline">C</span><i id="i" title="t"></i></div>',
+            "html.parser",
+        ).div
+        selectors = DEFAULT_NAME_SELECTORS + ["#i", "i[id=i]", "a[href='/x']", "b", "div > a"]
+        for selector in selectors:
+            assert _select_one(card, selector) is card.select_one(selector), selector
+        assert card.find(attrs={"title": True}) is card.select_one("[title]")
+
+
+class TestStorageState:
+    """Reutilización de la sesión guardada (storage_state) en login_with_playwright."""
+
+    def test_fresh_state_skips_login(self, tmp_path):
+        import json
+
+        from lms_agent_scraper.tools.browser_tools import _storage_state_file, login_with_playwright
+
+        path = str(tmp_path / "auth_state.json")
+        state_file = _storage_state_file(path, BASE, "user")
+        state_file.write_text(
+            json.dumps({"cookies": [{"name": "MoodleSession", "value": "abc", "domain": "x"}]}),
+            encoding="utf-8",
+        )
+        result = login_with_playwright(BASE, "user", "pass", {}, storage_state_path=path)
+        assert result["success"] is True
+        assert result["cookies"] == [{"name": "MoodleSession", "value": "abc", "domain": "x"}]
+        assert result["storage_state"] == str(state_file)
+        assert result["reused"] is True
+        assert _storage_state_file(path, BASE, "otro") != state_file
+
+    def test_saved_state_is_private(self, tmp_path):
+        import json
+        import stat
+
+        from lms_agent_scraper.tools.browser_tools import _save_storage_state
+
+        state_file = tmp_path / "sub" / "auth_state.json"
+        state_file.parent.mkdir()
+        state_file.write_text("{}", encoding="utf-8")
+        state_file.chmod(0o644)
+        _save_storage_state(state_file, {"cookies": [{"name": "a", "value": "b"}]})
+        assert stat.S_IMODE(state_file.stat().st_mode) == 0o600
+        assert json.loads(state_file.read_text(encoding="utf-8"))["cookies"][0]["name"] == "a"
+
+    def test_expired_or_invalid_state_is_ignored(self, tmp_path):
+        import os
+
+        from lms_agent_scraper.tools.browser_tools import _load_fresh_storage_state
+
+        state_file = tmp_path / "state.json"
+        state_file.write_text('{"cookies": [{"name": "a", "value": "b"}]}', encoding="utf-8")
+        assert _load_fresh_storage_state(state_file, 3600) is not None
+        assert _load_fresh_storage_state(state_file, 0) is None
+        os.utime(state_file, (0, 0))
+        assert _load_fresh_storage_state(state_file, 3600) is None
+        state_file.write_text("no es json", encoding="utf-8")
+        assert _load_fresh_storage_state(state_file, 10**12) is None
+        assert _load_fresh_storage_state(tmp_path / "no-existe.json", 3600) is None
+
+
+def test_abort_heavy_resources_only_blocks_static_assets():
+    """El handler de rutas aborta imágenes/fuentes/CSS/media y deja pasar documentos y XHR."""
+    from types import SimpleNamespace
+
+    from lms_agent_scraper.tools.browser_tools import _abort_heavy_resources
+
+    calls = []
+    for resource_type in ["image", "font", "stylesheet", "media", "document", "xhr", "script"]:
+        route = SimpleNamespace(
+            request=SimpleNamespace(resource_type=resource_type),
+            abort=lambda rt=resource_type: calls.append((rt, "abort")),
+            continue_=lambda rt=resource_type: calls.append((rt, "continue")),
+        )
+        _abort_heavy_resources(route)
+    assert [rt for rt, action in calls if action == "abort"] == [
+        "image",
+        "font",
+        "stylesheet",
+        "media",
+    ]
+
+
+def test_detect_courses_presence_counts_cards_with_parse_only(monkeypatch):
+    """El conteo de tarjetas con parse_only coincide con el del árbol completo."""
+    import lms_agent_scraper.tools.browser_tools as bt
+
+    html = """
+    <nav><div class="card">menú</div></nav>
+    <div data-region="courses-view">
+      <div data-region="course-content"><a href="/course/view.php?id=1">A</a></div>
+      <div data-region="course-content"><a href="/course/view.php?id=2">B</a></div>
+    </div>
+    """
+    strained = bt.detect_courses_presence(html)
+    monkeypatch.setattr(bt, "_card_parse_only", lambda selectors: None)
+    assert strained == bt.detect_courses_presence(html)
+    assert strained["card_count"] == 2
+
+
+def test_shared_courses_soup_gives_same_results_as_separate_parses():
+    """Con el árbol compartido, detección y extractores devuelven lo mismo que parseando cada uno."""
+    import lms_agent_scraper.tools.browser_tools as bt
+
+    html = """
+    <nav><a href="/user/profile.php">Perfil</a><a href="/course/view.php?id=9">Menú</a></nav>
+    <div data-region="course-content"><a class="coursename" href="/course/view.php?id=1">
+      <span class="multiline">Cálculo I</span></a></div>
+    <div class="card-grid"><span class="multiline">Química</span>
+      <a href="/course/view.php?id=7"></a></div>
+    """
+    soup = bt._courses_page_soup(html)
+    assert bt.detect_courses_presence(html, soup=soup) == bt.detect_courses_presence(html)
+    assert bt._extract_courses_by_link_segment(
+        html, BASE, soup=soup
+    ) == bt._extract_courses_by_link_segment(html, BASE)
+    assert bt._extract_courses_bs4(html, BASE, soup=soup) == bt._extract_courses_bs4(html, BASE)
+
+
+def test_join_url_matches_urljoin():
+    """_join_url da lo mismo que urljoin(base + "/", href), con o sin atajo para absolutas."""
+    from urllib.parse import urljoin
+
+    from lms_agent_scraper.tools.browser_tools import _join_url
+
+    hrefs = [
+        "https://aula.edu/course/view.php?id=1",
+        "http://aula.edu/course/view.php?id=1#s",
+        "https://aula.edu/a/../course/view.php?id=2",
+        "https://aula.edu/./x",
+        "https://aula.edu",
+        "/course/view.php?id=3",
+        "course/view.php?id=4",
+        "//cdn.edu/x",
+        "?id=5",
+    ]
+    for base in [BASE, BASE + "/moodle"]:
+        for href in hrefs:
+            assert _join_url(base, href) == urljoin(base + "/", href), (base, href)
+
+
+def test_bs4_card_links_use_first_course_link_per_card():
+    """Cada tarjeta toma su primer enlace de curso, también con tarjetas anidadas."""
+    html = """
+    <div class="card"><a href="/user/profile.php">Perfil</a>
+      <div class="card"><a href="/course/view.php?id=2">Física</a></div>
+      <a href="/course/view.php?id=1">Cálculo</a></div>
+    <div class="card"><span>Sin enlace</span></div>
+    <div class="card"><a href="/course/view.php?id=3">Química</a></div>
+    """
+    courses = _extract_courses_bs4(html, BASE, {"card_selectors": [".card"]})
+    assert [c["url"] for c in courses] == [
+        BASE + "/course/view.php?id=2",
+        BASE + "/course/view.php?id=3",
+    ]
+
+
+def test_link_segment_repeated_href_keeps_first_accepted_link():
+    """Un href repetido se descarta solo si ya se aceptó; un primer enlace sin nombre no lo bloquea."""
+    html = """
+    <a href="/course/view.php?id=1"></a>
+    <a href="/course/view.php?id=1">Cálculo</a>
+    <a href="/course/view.php?id=1">Cálculo (menú)</a>
+    <a href="https://aulapregrado.unisimon.edu.co/course/view.php?id=1&amp;s=2">Otra</a>
+    """
+    courses = _extract_courses_by_link_segment(html, BASE)
+    assert courses == [{"url": BASE + "/course/view.php?id=1", "name": "Cálculo"}]
+
+
+def test_card_name_single_pass_matches_selector_priority():
+    """_card_name da lo mismo que probar cada name_selector con select_one en orden."""
+    import random
+
+    from bs4 import BeautifulSoup
+
+    from lms_agent_scraper.tools.browser_tools import DEFAULT_NAME_SELECTORS, _card_name
+
+    def expected(card, selectors):
+        for ns in selectors:
+            el = card.select_one(ns)
+            if el:
+                name = el.get_text(strip=True) or el.get("title", "") or ""
+                if name:
+                    return name
+        return ""
+
+    pieces = [
+        '<a class="aalink coursename">{}</a>',
+        '<a class="coursename">{}</a>',
+        '<div class="coursename">{}</div>',
+        '<span class="multiline">{}</span>',
+        '<i title="{}"></i>',
+        "<p>{}</p>",
+        '<a class="coursename"><span class="multiline">{}</span></a>',
+    ]
+    rng = random.Random(7)
+    for _ in range(200):
+        inner = "".join(
+            rng.choice(pieces).format(rng.choice(["", "Curso", "Álgebra"]))
+            for _ in range(rng.randint(0, 5))
+        )
+        card = BeautifulSoup(f'<div class="card">{inner}</div>', "lxml").div
+        for selectors in (DEFAULT_NAME_SELECTORS, ["span.multiline", ".coursename"]):
+            assert _card_name(card, selectors) == expected(card, selectors), inner
+        assert _card_name(card, ["div > .coursename", "[title]"]) == expected(
+            card, ["div > .coursename", "[title]"]
+        )
+
+
+class _CountingPage:
+    """Página falsa: count() por selector (la unión suma sus partes) y registro de consultas."""
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.queries = []
+
+    def locator(self, sel):
+        page = self
+
+        class _Locator:
+            def count(self):
+                page.queries.append(sel)
+                return sum(page.counts.get(part.strip(), 0) for part in sel.split(", "))
+
+        return _Locator()
+
+
+def test_detect_more_navigation_uses_one_query_when_nothing_matches(monkeypatch):
+    """Sin controles, una sola consulta (unión); con controles, el primer selector que coincide."""
+    import lms_agent_scraper.tools.browser_tools as bt
+
+    monkeypatch.setattr(bt, "PLAYWRIGHT_AVAILABLE", True)
+    selectors = ["button:has-text('Ver más')", "a.next"]
+    page = _CountingPage({})
+    result = bt.detect_more_navigation(page, {"selectors": selectors})
+    assert result["has_more"] is False
+    assert page.queries == ["button:has-text('Ver más'), a.next"]
+
+    page = _CountingPage({"a.next": 2})
+    result = bt.detect_more_navigation(page, {"selectors": selectors})
+    assert result == {"has_more": True, "control_type": "link", "element_count": 2}
+
+    page = _CountingPage({})
+    bt.detect_more_navigation(page, {"selectors": ["text=Ver más", "a.next"]})
+    assert page.queries == ["text=Ver más", "a.next"]
+
+
+def test_get_course_links_uses_existing_storage_state(monkeypatch, tmp_path):
+    """Con storage_state_path existente el contexto lo recibe y se extraen los cursos."""
+    from contextlib import contextmanager
+
+    import lms_agent_scraper.tools.browser_tools as bt
+
+    html = '<div class="course-card"><a href="/course/view.php?id=4">Física</a></div>'
+    opened = {}
+
+    class _Page:
+        url = BASE + "/my/courses.php"
+
+        def goto(self, url, **kwargs):
+            pass
+
+        def wait_for_selector(self, *args, **kwargs):
+            pass
+
+        def evaluate(self, script, args=None):
+            return html
+
+        def content(self):
+            return html
+
+    class _Context:
+        def add_cookies(self, cookies):
+            opened["cookies"] = cookies
+
+        def new_page(self):
+            return _Page()
+
+    @contextmanager
+    def fake_context(session, headless, block_resources=True, **context_kwargs):
+        opened.update(context_kwargs)
+        yield _Context()
+
+    monkeypatch.setattr(bt, "PLAYWRIGHT_AVAILABLE", True)
+    monkeypatch.setattr(bt, "_browser_context", fake_context)
+    monkeypatch.chdir(tmp_path)  # debug=True escribe debug_html/ (la rama del antiguo fallo)
+    state_file = tmp_path / "auth_state.json"
+    state_file.write_text('{"cookies": []}', encoding="utf-8")
+    courses = bt.get_course_links_with_playwright(
+        BASE,
+        {},
+        {},
+        [{"name": "sid", "value": "x"}],
+        debug=True,
+        storage_state_path=str(state_file),
+    )
+    assert opened["storage_state"] == str(state_file)
+    assert opened["cookies"][0]["domain"] == "aulapregrado.unisimon.edu.co"
+    assert courses == [{"url": BASE + "/course/view.php?id=4", "name": "Física"}]
+
+
+def test_profile_selectors_use_playwright_locators_in_container():
+    """Los selectores del perfil pasan por page.locator (motor de Playwright) dentro del contenedor."""
+    from lms_agent_scraper.tools.browser_tools import _try_extract_courses_step_by_step
+
+    links = {"a:has-text('Física')": [["/course/view.php?id=4", "Física"]]}
+    calls = []
+
+    class _Locator:
+        def __init__(self, chain):
+            self.chain = chain
+
+        def count(self):
+            return 1
+
+        @property
+        def first(self):
+            return self
+
+        def locator(self, sel):
+            return _Locator(self.chain + [sel])
+
+        def evaluate_all(self, script, pattern):
+            calls.append((self.chain, pattern))
+            if self.chain[-1] == "text=Mal >> [":
+                raise ValueError("selector inválido")
+            return links.get(self.chain[-1], [])
+
+    class _Page:
+        def locator(self, sel):
+            return _Locator([sel])
+
+    selectors = ["text=Mal >> [", "a.vacio", "a:has-text('Física')", "a.nunca"]
+    courses, found_early = _try_extract_courses_step_by_step(
+        "", _Page(), BASE, {}, "#cursos", selectors, "course/view", debug=False
+    )
+    assert courses == [{"url": BASE + "/course/view.php?id=4", "name": "Física"}]
+    assert found_early is False
+    assert calls == [(["#cursos", sel], "course/view") for sel in selectors[:3]]
+
+
+def test_browser_session_keeps_sandbox_unless_requested(monkeypatch):
+    """El sandbox de Chromium solo se desactiva con no_sandbox=True."""
+    import lms_agent_scraper.tools.browser_tools as bt
+
+    launches = []
+
+    class _Chromium:
+        def launch(self, **kwargs):
+            launches.append(kwargs)
+            return object()
+
+    class _Playwright:
+        chromium = _Chromium()
+
+        def start(self):
+            return self
+
+    monkeypatch.setattr(bt, "sync_playwright", _Playwright)
+    bt.BrowserSession().browser
+    bt.BrowserSession(no_sandbox=True).browser
+    assert "--no-sandbox" not in launches[0]["args"]
+    assert launches[0]["chromium_sandbox"] is True
+    assert "--no-sandbox" in launches[1]["args"]
+    assert launches[1]["chromium_sandbox"] is False
@@ -0,0 +1,91 @@
+"""Tests para el agente de descubrimiento de cursos por contenido (sin Playwright ni Ollama)."""
+
+from lms_agent_scraper.agents import course_discovery_agent
+from lms_agent_scraper.agents.course_discovery_agent import discover_courses_by_visiting_links
+
+BASE = "https://example.edu"
+
+DASHBOARD_HTML = """
+<html><body>
+<a href="/course/view.php?id=1">Curso 1</a>
+<a href="/course/view.php?id=2">Curso 2</a>
+<a href="/course/view.php?id=3">Curso 3</a>
+<a href="/login/logout.php">Salir</a>
+</body></html>
+"""
+
+
+class FakePage:
+    """Page mínima: goto guarda la URL y content devuelve el HTML configurado para ella."""
+
+    def __init__(self, pages):
+        self._pages = pages
+        self._url = ""
+
+    def goto(self, url, **kwargs):
+        self._url = url
+
+    def wait_for_load_state(self, *args, **kwargs):
+        pass
+
+    def content(self):
+        return self._pages[self._url]
+
+
+class FakeClient:
+    available = True
+
+    def __init__(self):
+        self.batch_calls = []
+        self.single_calls = []
+
+    def classify_pages_as_courses(self, pages, max_chars=3000):
+        self.batch_calls.append([url for url, _ in pages])
+        return [{"is_course": "curso" in html, "course_name": url[-1]} for url, html in pages]
+
+    def classify_page_as_course(self, html, url="", max_chars=8000):
+        self.single_calls.append(url)
+        return {"is_course": "curso" in html, "course_name": url[-1]}
+
+
+def _run(monkeypatch, pages, config):
+    client = FakeClient()
+    monkeypatch.setattr(course_discovery_agent, "LocalLLMClient", lambda: client)
+    result = discover_courses_by_visiting_links(
+        page=FakePage(pages),
+        base_url=BASE,
+        html_current_page=DASHBOARD_HTML,
+        discovery_config=config,
+    )
+    return result, client
+
+
+def test_discovery_classifies_candidates_in_batches(monkeypatch):
+    pages = {
+        f"{BASE}/course/view.php?id=1": "<h1>curso uno</h1>",
+        f"{BASE}/course/view.php?id=2": "<h1>dashboard</h1>",
+        f"{BASE}/course/view.php?id=3": "<h1>curso tres</h1>",
+    }
+    result, client = _run(monkeypatch, pages, {"classify_batch_size": 2})
+    assert [c["url"] for c in result] == [
+        f"{BASE}/course/view.php?id=1",
+        f"{BASE}/course/view.php?id=3",
+    ]
+    assert [len(batch) for batch in client.batch_calls] == [2, 1]
+    assert client.single_calls == []
+
+
+def test_discovery_reuses_result_for_identical_html(monkeypatch):
+    same = "<h1>curso</h1>"
+    pages = {f"{BASE}/course/view.php?id={i}": same for i in (1, 2, 3)}
+    result, client = _run(monkeypatch, pages, {"classify_batch_size": 1})
+    assert len(result) == 3
+    assert client.single_calls == [f"{BASE}/course/view.php?id=1"]
+
+
+def test_extract_candidate_urls_stops_at_max_candidates():
+    html = "".join(f'<a href="/course/view.php?id={i}">C{i}</a>' for i in range(50))
+    urls = course_discovery_agent._extract_candidate_urls(
+        html, BASE, ["course/view.php"], max_candidates=3
+    )
+    assert urls == [f"{BASE}/course/view.php?id={i}" for i in range(3)]
@@ -3,7 +3,7 @@
 from datetime import datetime
 
 
-from lms_agent_scraper.core.date_parser import parse_date, extract_date_from_text
+from lms_agent_scraper.core.date_parser import parse_date, parse_dates, extract_date_from_text
 
 
 def test_parse_date_iso():
@@ -19,10 +19,21 @@ def test_parse_date_invalid():
     assert parse_date("31-12-1969") is None
 
 
+def test_parse_date_without_digits_or_too_short():
+    assert parse_date("Sin fecha") is None
+    assert parse_date("1/1/2") is None
+    assert parse_date("1/1/24") == datetime(2024, 1, 1)
+
+
 def test_parse_date_regex():
     assert parse_date("Vencimiento: 20/12/2024") == datetime(2024, 12, 20)
 
 
+def test_parse_dates_batch_keeps_order():
+    out = parse_dates(["2024-01-15", "Sin fecha", "2024-01-15", None])
+    assert out == [datetime(2024, 1, 15), None, datetime(2024, 1, 15), None]
+
+
 def test_extract_date_from_text():
     patterns = [r"entrega.*?(\d{1,2}/\d{1,2}/\d{4})", r"(\d{1,2} de \w+ de \d{4})"]
     text = "Fecha de entrega: 25/03/2025"
@@ -126,3 +126,87 @@ def test_extract_assignments_from_html_empty_returns_empty_list(moodle_profile):
         base_url="https://example.edu",
     )
     assert result == []
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeSession:
+    """Sesión mínima: devuelve para cada curso una página con una tarea propia."""
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def get(self, url, timeout=30):
+        course_id = url.rsplit("=", 1)[-1]
+        return _FakeResponse(
+            f'<div><a href="/mod/assign/view.php?id={course_id}">Tarea del curso {course_id}</a></div>'
+        )
+
+
+def test_get_assignments_for_courses_concurrent_keeps_course_order(monkeypatch, moodle_profile):
+    """Con concurrency > 1 el resultado conserva el orden de los cursos."""
+    from lms_agent_scraper.tools import extraction_tools
+
+    monkeypatch.setattr(extraction_tools, "session_from_cookies", lambda c, b: _FakeSession())
+    monkeypatch.setattr(extraction_tools.time, "sleep", lambda s: None)
+    base_url = "https://example.edu"
+    courses = [{"url": f"/course/view.php?id={i}", "name": f"Curso {i}"} for i in range(6)]
+    result = extraction_tools.get_assignments_for_courses(
+        courses, [], moodle_profile, base_url, concurrency=3
+    )
+    assert [a["course"] for a in result] == [f"Curso {i}" for i in range(6)]
+    assert result[0]["url"] == f"{base_url}/mod/assign/view.php?id=0"
+
+
+def test_request_pacer_allows_burst_then_spaces_requests(monkeypatch):
+    """El cubo deja pasar `burst` peticiones seguidas y luego espacia según rate."""
+    from lms_agent_scraper.tools import extraction_tools
+
+    sleeps = []
+    monkeypatch.setattr(extraction_tools.time, "monotonic", lambda: 100.0)
+    monkeypatch.setattr(extraction_tools.time, "sleep", sleeps.append)
+    pacer = extraction_tools._RequestPacer(rate=2.0, burst=2)
+    for _ in range(4):
+        pacer.wait()
+    assert sleeps == [0.5, 1.0]
+
+
+def test_select_links_matches_chained_selects(moodle_profile):
+    """Un solo recorrido de <a> da los mismos enlaces, en el mismo orden, que soup.select por selector."""
+    from bs4 import BeautifulSoup
+
+    from lms_agent_scraper.tools.extraction_tools import _select_links, _selects_only_anchors
+
+    selectors = [s for atype in moodle_profile["assignments"]["types"] for s in atype["selectors"]]
+    soup = BeautifulSoup(MOODLE_COURSE_PAGE_WITH_ASSIGNMENT, "lxml")
+    for sels in (selectors, selectors + [".activity-info span"], ["li.activity > div a"]):
+        expected = [id(el) for s in sels for el in soup.select(s)]
+        assert [id(el) for el in _select_links(soup, sels)] == expected
+    assert _selects_only_anchors("a[title='x y'], .activity a.aalink:not(.dimmed)")
+    assert not _selects_only_anchors(".activity-info span")
+    assert not _selects_only_anchors("abbr")
+    assert not _selects_only_anchors(":scope > a")
+
+
+def test_selectors_are_compiled_once_across_pages(moodle_profile):
+    """Los selectores del perfil se compilan una vez y se reutilizan en cada página."""
+    from lms_agent_scraper.core.css import compile_css
+
+    compile_css.cache_clear()
+    for _ in range(3):
+        extract_assignments_from_html(
+            MOODLE_COURSE_PAGE_WITH_ASSIGNMENT,
+            "Curso",
+            "",
+            moodle_profile,
+            base_url="https://a.edu",
+        )
+    info = compile_css.cache_info()
+    assert info.misses == info.currsize
+    assert info.hits >= 2 * info.misses
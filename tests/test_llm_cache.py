@@ -0,0 +1,46 @@
+"""Tests para la caché persistente de respuestas del LLM (llm/cache.py)."""
+
+import time
+
+from lms_agent_scraper.config.ollama_config import OllamaSettings
+from lms_agent_scraper.llm.cache import ResponseCache
+from lms_agent_scraper.llm.ollama_client import LocalLLMClient
+
+
+def test_response_cache_roundtrip_and_expiry(tmp_path):
+    cache = ResponseCache(tmp_path / "llm.sqlite3", ttl_seconds=60)
+    key = ResponseCache.make_key("modelo", [{"role": "user", "content": "hola"}], {"t": 0.1})
+    assert cache.get(key) is None
+    cache.set(key, '{"ok": true}')
+    assert cache.get(key) == '{"ok": true}'
+    # Otra instancia sobre el mismo archivo ve la respuesta (persistente entre procesos).
+    assert ResponseCache(tmp_path / "llm.sqlite3", ttl_seconds=60).get(key) == '{"ok": true}'
+    expired = ResponseCache(tmp_path / "otro.sqlite3", ttl_seconds=-1)
+    expired.set(key, "viejo")
+    assert expired.get(key) is None
+
+
+def test_make_key_depends_on_model_and_messages():
+    messages = [{"role": "user", "content": "hola"}]
+    assert ResponseCache.make_key("a", messages, {}) == ResponseCache.make_key("a", messages, {})
+    assert ResponseCache.make_key("a", messages, {}) != ResponseCache.make_key("b", messages, {})
+
+
+def test_client_invoke_reuses_cached_response(tmp_path, monkeypatch):
+    settings = OllamaSettings(
+        response_cache_path=str(tmp_path / "llm.sqlite3"), response_cache_ttl=60
+    )
+    client = LocalLLMClient(settings=settings)
+    client._llm = object()
+    calls = []
+
+    def fake_chat_http(prompt, options=None, json_schema=None):
+        calls.append(prompt)
+        return f"respuesta {time.time()}"
+
+    monkeypatch.setattr(client, "_chat_http", fake_chat_http)
+    first = client._invoke("mismo prompt")
+    assert client._invoke("mismo prompt") == first
+    assert len(calls) == 1
+    client._invoke("otro prompt")
+    assert len(calls) == 2
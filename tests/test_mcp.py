@@ -16,3 +16,88 @@ def test_list_profiles_tool_returns_string():
     # Si existe el directorio profiles con moodle_default, debe aparecer
     if PROFILES_DIR.exists():
         assert "moodle_default" in result or "No hay" in result
+
+
+def test_run_full_workflow_reuses_result_until_refresh(monkeypatch):
+    """Las herramientas comparten un único workflow mientras no expire el TTL o se llame refresh_data."""
+    from types import SimpleNamespace
+
+    from lms_agent_scraper.mcp import server
+
+    portal = SimpleNamespace(profile="p", base_url="https://e.edu", username="u", password="x")
+    scraper = SimpleNamespace(days_ahead=7, days_behind=7, max_courses=0, workflow_cache_ttl=300)
+    monkeypatch.setattr(server, "get_portal_settings", lambda: portal)
+    monkeypatch.setattr(server, "get_scraper_settings", lambda: scraper)
+    runs = []
+
+    def fake_execute():
+        runs.append(1)
+        return {"authenticated": True, "courses": [{"name": "C", "url": "https://e.edu/c"}]}
+
+    monkeypatch.setattr(server, "_execute_workflow", fake_execute)
+    server.refresh_data()
+    assert "C:" in server.get_courses()
+    server.get_courses()
+    assert len(runs) == 1
+    server.refresh_data()
+    server.get_courses()
+    assert len(runs) == 2
+    server._RUNNER.clear()
+
+
+def test_stale_result_is_served_while_refreshing_in_background(monkeypatch):
+    """Con el TTL vencido, la herramienta responde con el último resultado y lo renueva aparte."""
+    import threading
+    from types import SimpleNamespace
+
+    from lms_agent_scraper.mcp import server
+
+    portal = SimpleNamespace(profile="p", base_url="https://e.edu", username="u", password="x")
+    scraper = SimpleNamespace(days_ahead=7, days_behind=7, max_courses=0, workflow_cache_ttl=1)
+    monkeypatch.setattr(server, "get_portal_settings", lambda: portal)
+    monkeypatch.setattr(server, "get_scraper_settings", lambda: scraper)
+    release = threading.Event()
+    names = iter(["Viejo", "Nuevo"])
+
+    def fake_execute():
+        name = next(names)
+        if name == "Nuevo":
+            release.wait(5)
+        return {"authenticated": True, "courses": [{"name": name, "url": "https://e.edu/c"}]}
+
+    monkeypatch.setattr(server, "_execute_workflow", fake_execute)
+    server._RUNNER.clear()
+    first = server.get_courses()
+    assert "Viejo" in first and "Datos del portal:" in first
+    key, _, result = server._RUNNER._snapshot
+    server._RUNNER._snapshot = (key, 0.0, result)
+    assert "Viejo" in server.get_courses()
+    release.set()
+    for _ in range(100):
+        if "Nuevo" in server.get_courses():
+            break
+        threading.Event().wait(0.01)
+    assert "Nuevo" in server.get_courses()
+    server._RUNNER.clear()
+
+
+def test_check_deadlines_and_submitted_filters(monkeypatch):
+    from lms_agent_scraper.mcp import server
+
+    assignments = [
+        {
+            "title": "A",
+            "status": "OVERDUE",
+            "submission_status": {"submitted": True, "days_ago": 2},
+        },
+        {
+            "title": "B",
+            "status": "UPCOMING",
+            "submission_status": {"submitted": True, "days_ago": 30},
+        },
+        {"title": "C", "status": "UPCOMING", "submission_status": None},
+    ]
+    monkeypatch.setattr(server, "_run_full_workflow", lambda: {"assignments": assignments})
+    monkeypatch.setattr(server, "filter_by_date", lambda items, **kwargs: items)
+    assert server.check_deadlines(7) == "Atrasadas: 1 | Vencen hoy: 0 | Próximas (7 días): 2"
+    assert server.get_submitted_assignments(7) == "- A | N/A |  | "
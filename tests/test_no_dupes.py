@@ -0,0 +1,22 @@
+"""Tests de higiene del paquete: sin módulos duplicados en src/."""
+
+import hashlib
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def test_no_duplicate_python_modules():
+    """Ningún par de módulos .py (no vacíos) en src/ tiene contenido idéntico."""
+    seen = {}
+    duplicates = []
+    for path in sorted(SRC_DIR.rglob("*.py")):
+        data = path.read_bytes()
+        if not data.strip():
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen:
+            duplicates.append((seen[digest], path))
+        else:
+            seen[digest] = path
+    assert duplicates == []
@@ -83,3 +83,455 @@ def test_extract_assignments_from_course_html_when_not_available_returns_empty()
             == []
         )
     assert client.extract_assignments_from_course_html("", "Curso", "https://example.edu") == []
+
+
+def test_classify_pages_as_courses_when_not_available_returns_defaults():
+    """Sin LLM disponible, classify_pages_as_courses devuelve un default por página."""
+    client = LocalLLMClient()
+    client._llm = None
+    pages = [("https://example.edu/course/view.php?id=1", "<html></html>")] * 2
+    assert client.classify_pages_as_courses(pages) == [{"is_course": False, "course_name": ""}] * 2
+    assert client.classify_pages_as_courses([]) == []
+
+
+def test_classify_pages_as_courses_maps_results_by_url(monkeypatch):
+    """La respuesta del lote se asigna a cada página por URL, aunque venga en otro orden."""
+    client = LocalLLMClient()
+    client._llm = object()
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.OLLAMA_AVAILABLE", True)
+    monkeypatch.setattr(
+        client,
+        "_invoke",
+        lambda prompt, **kwargs: (
+            '[{"url": "https://e.edu/b", "is_course": true, "course_name": "Física"},'
+            ' {"url": "https://e.edu/a", "is_course": false, "course_name": ""}]'
+        ),
+    )
+    pages = [("https://e.edu/a", "<html>a</html>"), ("https://e.edu/b", "<html>b</html>")]
+    result = client.classify_pages_as_courses(pages)
+    assert result == [
+        {"is_course": False, "course_name": ""},
+        {"is_course": True, "course_name": "Física"},
+    ]
+
+
+def test_extract_assignments_per_course_prompts_run_concurrently(monkeypatch):
+    """Con AsyncClient, un prompt por curso en paralelo; las respuestas vuelven en orden."""
+    import asyncio
+
+    state = {"in_flight": 0, "max_in_flight": 0}
+
+    class FakeAsyncClient:
+        def __init__(self, host=None, timeout=None):
+            pass
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return None
+
+        async def chat(self, model, messages, options, **kwargs):
+            state["in_flight"] += 1
+            state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+            await asyncio.sleep(0.01)
+            state["in_flight"] -= 1
+            content = "[]"
+            if "Física" in messages[-1]["content"]:
+                content = '[{"title": "Quiz", "url": "/mod/quiz/view.php?id=2", "type": "quiz"}]'
+            return {"message": {"content": content}}
+
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.OLLAMA_AVAILABLE", True)
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.ASYNC_OLLAMA_AVAILABLE", True)
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.AsyncClient", FakeAsyncClient)
+    client = LocalLLMClient()
+    client._llm = object()
+    courses = [
+        ('<a href="/mod/assign/view.php?id=1">Tarea</a>', "Álgebra", "https://e.edu"),
+        ('<a href="/mod/quiz/view.php?id=2">Quiz</a>', "Física", "https://e.edu"),
+    ]
+    result = client.extract_assignments_multi(courses, max_chars=4000)
+    assert [[a["url"] for a in items] for items in result] == [
+        [],
+        ["https://e.edu/mod/quiz/view.php?id=2"],
+    ]
+    assert state["max_in_flight"] == 2
+
+
+def test_invoke_many_closes_async_client_after_each_batch(monkeypatch):
+    """Cada lote cierra su AsyncClient antes de que asyncio.run cierre el event loop."""
+    events = []
+
+    class FakeAsyncClient:
+        def __init__(self, host=None, timeout=None):
+            events.append("open")
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            events.append("close")
+
+        async def chat(self, model, messages, options, **kwargs):
+            return {"message": {"content": "ok"}}
+
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.ASYNC_OLLAMA_AVAILABLE", True)
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.AsyncClient", FakeAsyncClient)
+    client = LocalLLMClient()
+    client._response_cache = None
+    assert client._invoke_many(["a", "b", "c"]) == ["ok"] * 3
+    client._invoke_many(["d", "e"])
+    assert events == ["open", "close", "open", "close"]
+
+
+def test_invoke_posts_to_api_chat_with_shared_client(monkeypatch):
+    """_invoke usa el cliente httpx compartido contra /api/chat."""
+    import httpx
+
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, json={"message": {"content": " hola "}})
+
+    shared = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client._HTTP_CLIENT", shared)
+    client = LocalLLMClient()
+    client._llm = object()
+    assert client._invoke("prompt") == "hola"
+    assert LocalLLMClient()._chat_http("otro") == " hola "
+    assert [r.url.path for r in requests_seen] == ["/api/chat", "/api/chat"]
+
+
+def test_fallback_prompts_keep_fixed_instructions_in_system_message(tmp_path):
+    """Sin SKILL.md, el mensaje system es fijo y el HTML va solo en el mensaje user."""
+    client = LocalLLMClient(skills_dir=tmp_path / "sin-skills")
+    first = client._page_classifier_prompt("<h1>Curso A</h1>", url="https://e.edu/a")
+    second = client._page_classifier_prompt("<h1>Curso B</h1>", url="https://e.edu/b")
+    assert [m["role"] for m in first] == ["system", "user"]
+    assert first[0] == second[0]
+    assert "Curso A" not in first[0]["content"] and "Curso A" in first[1]["content"]
+
+
+def test_balanced_json_scanner_ignores_brackets_inside_strings():
+    from lms_agent_scraper.llm.ollama_client import _BalancedJsonScanner
+
+    scanner = _BalancedJsonScanner("]")
+    assert scanner.feed('```json\n[{"name": "Curso ]') is None
+    assert scanner.feed(' [x] \\" ]"}, [1]') is None
+    text = "] extra tras el cierre"
+    assert text[: scanner.feed(text)] == "]"
+
+
+def test_stream_stops_when_top_level_json_closes(monkeypatch):
+    """En streaming, _invoke corta en cuanto se cierra el array y no lee el resto."""
+    import json as _json
+
+    import httpx
+
+    chunks = ['[{"title": "T1"', "}]", " texto sobrante", "[otro]"]
+    seen = {}
+
+    def handler(request):
+        seen["body"] = _json.loads(request.content)
+        lines = [_json.dumps({"message": {"content": c}, "done": False}) for c in chunks]
+        return httpx.Response(200, content="\n".join(lines).encode())
+
+    shared = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client._HTTP_CLIENT", shared)
+    client = LocalLLMClient()
+    client._llm = object()
+    assert client._invoke("p", max_tokens=64, stop_on_balanced="]") == '[{"title": "T1"}]'
+    assert seen["body"]["stream"] is True
+    assert seen["body"]["options"]["num_predict"] == 64
+
+
+def test_course_extractor_stops_stream_after_max_courses(monkeypatch):
+    """Con max_courses, el stream se corta al cerrarse ese número de objetos del array."""
+    import json as _json
+
+    import httpx
+
+    chunks = [
+        '[{"name": "A", "url": "/course/view.php?id=1"}',
+        ', {"name": "B}", ',
+        '"url": "/course/view.php?id=2"}',
+        ', {"name": "C", "url": "/course/view.php?id=3"}]',
+    ]
+
+    def handler(request):
+        lines = [_json.dumps({"message": {"content": c}, "done": False}) for c in chunks]
+        return httpx.Response(200, content="\n".join(lines).encode())
+
+    shared = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client._HTTP_CLIENT", shared)
+    client = LocalLLMClient()
+    client._llm = object()
+    courses = client._run_course_extractor("<p>sin enlaces</p>", "https://e.edu", max_courses=2)
+    assert courses == [
+        {"url": "https://e.edu/course/view.php?id=1", "name": "A"},
+        {"url": "https://e.edu/course/view.php?id=2", "name": "B}"},
+    ]
+
+
+def test_json_call_sites_send_schema_as_format(monkeypatch):
+    """Las llamadas que esperan JSON envían "format" con el esquema; interpret_date no."""
+    import json as _json
+
+    import httpx
+
+    bodies = []
+
+    def handler(request):
+        body = _json.loads(request.content)
+        bodies.append(body)
+        content = (
+            '{"is_course": true, "course_name": "Curso A"}' if "format" in body else "2026-03-15"
+        )
+        line = _json.dumps({"message": {"content": content}, "done": True})
+        return httpx.Response(200, content=line.encode())
+
+    shared = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client._HTTP_CLIENT", shared)
+    client = LocalLLMClient()
+    client._llm = object()
+    result = client.classify_page_as_course("<h1>Curso A</h1>", url="https://e.edu/c")
+    assert result == {"is_course": True, "course_name": "Curso A"}
+    assert bodies[0]["format"]["properties"]["is_course"] == {"type": "boolean"}
+    client.interpret_date("15 de marzo")
+    assert "format" not in bodies[-1]
+
+
+def test_strip_markdown_and_parse_json_handles_fences():
+    client = LocalLLMClient()
+    assert client._strip_markdown_and_parse_json('```json\n[{"a": 1}]\n```') == [{"a": 1}]
+    assert client._strip_markdown_and_parse_json('  {"a": 1}  ') == {"a": 1}
+    assert client._strip_markdown_and_parse_json("no es json") is None
+    assert client._strip_markdown_and_parse_json("") is None
+
+
+def test_html_snippet_strips_non_content_blocks_and_truncates():
+    from lms_agent_scraper.llm.ollama_client import html_snippet
+
+    html = (
+        "<p>a</p><SCRIPT type='x'>var s = '</style>';</script ><style>p{}</style>"
+        "<svg><path/></svg><noscript>sin js</noscript><p>b</p>"
+    )
+    assert html_snippet(html, 100) == "<p>a</p><p>b</p>"
+    assert html_snippet(html, 5) == "<p>a<"
+    long_html = "<script>x</script>" + "y" * 50 + "<style>z</style>" + "w" * 50
+    assert html_snippet(long_html, 60) == "y" * 50 + "w" * 10
+
+
+def test_link_digest_keeps_matching_links_with_section_and_dates():
+    from lms_agent_scraper.llm.ollama_client import ASSIGNMENT_HREF_PATTERNS, link_digest
+
+    html = """
+    <div class="navbar"><a href="/my/">Inicio</a></div>
+    <h3 class="sectionname">Semana 1</h3>
+    <ul><li class="activity"><a href="/mod/assign/view.php?id=1">Tarea 1</a>
+        <div class="dates">Vence: 15/03/2026</div></li>
+        <li><a href="/mod/resource/view.php?id=2">Lectura</a></li></ul>
+    """
+    digest = link_digest(html, ASSIGNMENT_HREF_PATTERNS, 1000, with_context=True)
+    assert digest == "Tarea 1 | /mod/assign/view.php?id=1 | section:Semana 1 | Vence: 15/03/2026"
+    assert link_digest("<p>sin enlaces</p>", ASSIGNMENT_HREF_PATTERNS, 1000) == ""
+
+
+def test_extract_courses_from_html_uses_links_without_llm(monkeypatch):
+    """Con enlaces course/view.php?id= en el HTML, no se invoca al modelo."""
+    client = LocalLLMClient()
+    client._llm = object()
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.OLLAMA_AVAILABLE", True)
+    monkeypatch.setattr(client, "_invoke", lambda *a, **k: (_ for _ in ()).throw(AssertionError))
+    html = (
+        '<a href="/course/view.php?id=7"><img src="x.png"></a>'
+        '<a href="/course/view.php?id=7">Cálculo I</a>'
+        '<a href="https://e.edu/course/view.php?lang=es&id=9" title="Física">  </a>'
+    )
+    assert client.extract_courses_from_html(html, "https://e.edu/") == [
+        {"url": "https://e.edu/course/view.php?id=7", "name": "Cálculo I"},
+        {"url": "https://e.edu/course/view.php?lang=es&id=9", "name": "Física"},
+    ]
+    assert client.extract_courses_from_html(html, "https://e.edu/", max_courses=1) == [
+        {"url": "https://e.edu/course/view.php?id=7", "name": "Cálculo I"},
+    ]
+    client._llm = None  # Ollama caído: el camino por enlaces no necesita el modelo
+    assert not client.available
+    assert len(client.extract_courses_from_html(html, "https://e.edu/")) == 2
+    assert client.extract_courses_from_html("<p>nada</p>", "https://e.edu/") == []
+    client._llm = object()
+    assert (
+        client.extract_assignments_from_course_html("<p>sin actividades</p>", "C", "https://e.edu")
+        == []
+    )
+
+
+def test_resolved_model_name_adds_quant_tag_only_when_set_and_missing():
+    from lms_agent_scraper.config.ollama_config import OllamaSettings
+
+    assert OllamaSettings(model_name="qwen2.5", model_quant="").resolved_model_name == "qwen2.5"
+    assert (
+        OllamaSettings(model_name="glm-4.7-flash", model_quant="q4_K_M").resolved_model_name
+        == "glm-4.7-flash:q4_K_M"
+    )
+    assert (
+        OllamaSettings(model_name="glm-4.7-flash:q8_0").resolved_model_name == "glm-4.7-flash:q8_0"
+    )
+    assert (
+        OllamaSettings(model_name="hf.co/org/model", model_quant="q5_K_M").resolved_model_name
+        == "hf.co/org/model:q5_K_M"
+    )
+    assert OllamaSettings(model_name="glm", model_quant="").resolved_model_name == "glm"
+
+
+def test_chat_options_num_ctx_override_is_opt_in():
+    from lms_agent_scraper.config.ollama_config import OllamaSettings
+
+    fixed = LocalLLMClient(settings=OllamaSettings(num_ctx=8192))
+    assert fixed._chat_options(num_ctx=1024)["num_ctx"] == 8192
+    adaptive = LocalLLMClient(settings=OllamaSettings(num_ctx=8192, adaptive_num_ctx=True))
+    assert adaptive._chat_options(num_ctx=1024)["num_ctx"] == 1024
+    assert adaptive._chat_options(num_ctx=32768)["num_ctx"] == 8192
+
+
+def test_extract_assignments_multi_uses_one_call_keyed_by_course(monkeypatch):
+    """Varios cursos van en un solo prompt; la respuesta {"CURSO n": [...]} se reparte por curso."""
+    client = LocalLLMClient()
+    client._llm = object()
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.OLLAMA_AVAILABLE", True)
+    calls = []
+
+    def fake_invoke(prompt, **kwargs):
+        calls.append(kwargs)
+        return (
+            '{"CURSO 1": [{"title": "Tarea A", "due_date": "", "url": "/mod/assign/view.php?id=1",'
+            ' "type": "assignment"}], "CURSO 2": [{"title": "Quiz B", "due_date": "",'
+            ' "url": "/mod/quiz/view.php?id=2", "type": "quiz"}]}'
+        )
+
+    monkeypatch.setattr(client, "_invoke", fake_invoke)
+    courses = [
+        ('<a href="/mod/assign/view.php?id=1">Tarea A</a>', "Curso A", "https://e.edu"),
+        ("<p>sin actividades</p>", "Curso vacío", "https://e.edu"),
+        ('<a href="/mod/quiz/view.php?id=2">Quiz B</a>', "Curso B", "https://e.edu"),
+    ]
+    result = client.extract_assignments_multi(courses)
+    assert len(calls) == 1
+    assert calls[0]["json_schema"]["required"] == ["CURSO 1", "CURSO 2"]
+    assert [[a["url"] for a in items] for items in result] == [
+        ["https://e.edu/mod/assign/view.php?id=1"],
+        [],
+        ["https://e.edu/mod/quiz/view.php?id=2"],
+    ]
+    assert result[2][0]["course"] == "Curso B"
+
+    seen = []
+    monkeypatch.setattr(
+        client, "_invoke_many", lambda prompts, **k: seen.extend(prompts) or ["[]"] * len(prompts)
+    )
+    client.extract_assignments_multi(courses, max_chars=4000)
+    assert len(seen) == 2
+
+
+def test_normalize_assignments_filters_urls_and_types():
+    client = LocalLLMClient()
+    raw = [
+        {"title": "Tarea", "url": "/mod/assign/view.php?id=1", "type": "ASSIGNMENT"},
+        {"title": "Quiz", "url": "https://e.edu/quiz?id=2", "type": "examen"},
+        {"title": "Inicio", "url": "/my/", "type": "assignment"},
+        {"title": "Repetida", "url": "https://e.edu/mod/assign/view.php?id=1"},
+    ]
+    result = client._normalize_assignments(raw, "Curso", "https://e.edu")
+    assert [(a["url"], a["type"]) for a in result] == [
+        ("https://e.edu/mod/assign/view.php?id=1", "assignment"),
+        ("https://e.edu/quiz?id=2", "assignment"),
+    ]
+
+
+def test_chat_model_and_skill_loader_are_created_lazily(monkeypatch):
+    """__init__ no construye ChatOllama; el SkillLoader se comparte entre clientes."""
+    built = []
+    monkeypatch.setattr("lms_agent_scraper.llm.ollama_client.OLLAMA_AVAILABLE", True)
+    monkeypatch.setattr(
+        "lms_agent_scraper.llm.ollama_client.ChatOllama", lambda **kw: built.append(kw) or "llm"
+    )
+    client = LocalLLMClient()
+    assert client.available and built == []
+    assert client._chat_model() == "llm" and client._chat_model() == "llm"
+    assert len(built) == 1
+    assert LocalLLMClient()._get_skill_loader() is client._get_skill_loader()
+
+
+def test_prompt_from_skill_matches_langchain_format_messages():
+    """El formateo directo da los mismos mensajes que ChatPromptTemplate para cada skill."""
+    client = LocalLLMClient()
+    loader = client._get_skill_loader()
+    for skill in loader.list_available_skills():
+        if skill["name"] == "report-generator":  # solo recursos, sin mensajes
+            continue
+        template = loader.load_skill(skill["name"])
+        kwargs = {var: f"<{var} {{x}}>" for var in template.input_variables}
+        try:
+            expected = [
+                {"role": "system" if m.type == "system" else "user", "content": m.content}
+                for m in template.format_messages(**kwargs)
+            ]
+        except (KeyError, ValueError):
+            expected = None  # llaves sin escapar: ambos caminos recurren al prompt de fallback
+        assert client._prompt_from_skill(skill["name"], **kwargs) == expected, skill["name"]
+
+
+def test_absolute_url_fast_paths_match_urljoin():
+    from urllib.parse import urljoin
+
+    from lms_agent_scraper.llm.ollama_client import _absolute_url
+
+    hrefs = [
+        "/course/view.php?id=1",
+        "https://otro.edu/mod/quiz/view.php?id=2#x",
+        "//cdn.edu/a",
+        "/a/../mod/assign/view.php",
+        "mod/forum/view.php?id=3",
+        "HTTPS://E.EDU/A",
+    ]
+    for base in ("https://e.edu", "https://e.edu/moodle"):
+        for href in hrefs:
+            assert _absolute_url(base, href) == urljoin(base + "/", href), (base, href)
+
+
+def test_html_snippet_equals_full_substitution_truncated():
+    """html_snippet da lo mismo que quitar todos los bloques y recortar, aunque corte antes."""
+    import random
+
+    from lms_agent_scraper.llm.ollama_client import _NON_CONTENT_BLOCK_RE, html_snippet
+
+    tokens = [
+        "<script>",
+        "</script>",
+        "<style a=1>",
+        "</style >",
+        "<svg>",
+        "</svg>",
+        "<noscript>",
+        "</noscript>",
+        "<SCRIPT>",
+        "</SCRIPT>",
+        "<scr",
+        "ipt>",
+        "x",
+        "<p>",
+    ]
+    rng = random.Random(0)
+    for _ in range(2000):
+        html = "".join(rng.choice(tokens) for _ in range(rng.randint(0, 25)))
+        max_chars = rng.randint(0, 60)
+        assert html_snippet(html, max_chars) == _NON_CONTENT_BLOCK_RE.sub("", html)[:max_chars]
+
+
+def test_get_llm_client_is_shared():
+    """get_llm_client devuelve siempre la misma instancia de LocalLLMClient."""
+    from lms_agent_scraper.llm.ollama_client import get_llm_client
+
+    assert isinstance(get_llm_client(), LocalLLMClient)
+    assert get_llm_client() is get_llm_client()
@@ -3,8 +3,15 @@
 from pathlib import Path
 
 import pytest
+import yaml
 
-from lms_agent_scraper.core.skill_loader import SkillLoader
+from lms_agent_scraper.core.skill_loader import (
+    SkillLoader,
+    _FRONTMATTER_RE,
+    _parse_frontmatter,
+    _simple_frontmatter,
+    _split_frontmatter,
+)
 
 # Directorio de skills del paquete (src/lms_agent_scraper/skills)
 ROOT = Path(__file__).resolve().parent.parent
@@ -97,3 +104,128 @@ def test_clear_cache():
     loader.clear_cache()
     template = loader.load_skill("date-interpreter")
     assert template is not None
+
+
+def test_simple_frontmatter_matches_yaml_for_bundled_skills():
+    """El escáner simple produce lo mismo que yaml.safe_load en los SKILL.md del paquete."""
+    for skill_file in SKILLS_DIR.glob("*/SKILL.md"):
+        frontmatter = _FRONTMATTER_RE.match(skill_file.read_text(encoding="utf-8")).group(1)
+        assert _simple_frontmatter(frontmatter) == yaml.safe_load(frontmatter), skill_file
+
+
+def test_parse_frontmatter_falls_back_to_yaml_for_typed_or_nested_values():
+    """Valores no textuales o anidados se delegan a yaml.safe_load."""
+    text = "name: x\ndescription: y\nretries: 3\nextra:\n  nested: true"
+    assert _parse_frontmatter(text) == yaml.safe_load(text)
+
+
+def _write_skill(skills_dir: Path, name: str, system: str) -> Path:
+    skill_file = skills_dir / name / "SKILL.md"
+    skill_file.parent.mkdir(parents=True, exist_ok=True)
+    skill_file.write_text(
+        f"---\nname: {name}\ndescription: test\n---\n\n"
+        f"## System Message\n\n{system}\n\n## Human Message Template\n\n{{snippet}}\n",
+        encoding="utf-8",
+    )
+    return skill_file
+
+
+def test_cache_reparses_when_skill_file_changes(tmp_path):
+    """La caché se invalida cuando cambia el mtime de SKILL.md."""
+    import os
+
+    skill_file = _write_skill(tmp_path, "demo", "version uno")
+    loader = SkillLoader(tmp_path)
+    first = loader.load_skill("demo").format_messages(snippet="x")[0].content
+    _write_skill(tmp_path, "demo", "version dos")
+    st = skill_file.stat()
+    os.utime(skill_file, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    second = loader.load_skill("demo").format_messages(snippet="x")[0].content
+    assert first == "version uno"
+    assert second == "version dos"
+
+
+def test_markdown_sections_fast_path_matches_regex_path():
+    """El split sin regex y la regex dan las mismas secciones."""
+    from lms_agent_scraper.core.skill_loader import _SECTION_RE
+
+    loader = SkillLoader(SKILLS_DIR)
+    samples = [
+        "intro\n## System Message\n sys \n## Human Message Template\n{snippet}\n",
+        "## A\n### sub\nx\n## B\ny",
+        "##\tTab\nx\n## B\ny",
+        "## A\n## B",
+        "## A\n## B\nx\n## C\ny",
+        "## A\n\n## B\nx",
+    ]
+    for markdown in samples:
+        expected = {
+            m.group(1).strip().lower().replace(" ", "_"): m.group(2).strip()
+            for m in _SECTION_RE.finditer(markdown)
+        }
+        assert loader._parse_markdown_sections(markdown) == expected
+
+
+def test_load_skill_reuses_template_until_file_changes(tmp_path):
+    """load_skill devuelve la misma plantilla mientras SKILL.md no cambie."""
+    import os
+
+    skill_file = _write_skill(tmp_path, "demo", "primero")
+    loader = SkillLoader(tmp_path)
+    first = loader.load_skill("demo")
+    assert loader.load_skill("demo") is first
+    assert loader.load_skill("demo", use_cache=False) is not first
+    _write_skill(tmp_path, "demo", "segundo")
+    os.utime(skill_file, ns=(0, skill_file.stat().st_mtime_ns + 1_000_000))
+    second = loader.load_skill("demo")
+    assert second is not first
+    assert "segundo" in second.messages[0].prompt.template
+
+
+def test_find_skill_by_name(tmp_path):
+    """find_skill devuelve la carpeta del primer skill cuyo name cumple el predicado."""
+    _write_skill(tmp_path, "demo", "sys")
+    long_dir = tmp_path / "largo"
+    long_dir.mkdir()
+    (long_dir / "SKILL.md").write_text(
+        "---\ndescription: " + "x" * 400 + "\nname: Largo\n---\n## System Message\ns\n",
+        encoding="utf-8",
+    )
+    loader = SkillLoader(tmp_path)
+    assert loader.find_skill(lambda name: name == "demo") == "demo"
+    assert loader.find_skill(lambda name: name.lower() == "largo") == "largo"
+    assert loader.find_skill(lambda name: False) is None
+    assert SkillLoader(tmp_path / "no-existe").find_skill(lambda name: True) is None
+
+
+def test_split_frontmatter_matches_regex_or_defers():
+    """El corte con str.find coincide con _FRONTMATTER_RE o devuelve None para que decida la regex."""
+    samples = [
+        "---\nname: a\n---\n## S\nx\n",
+        "---\nname: a\n---\n\n  \n## S\nx",
+        "---\nname: a\n--- \n## S\n",
+        "---\nname: a\n---\n",
+        "---\n---\n",
+        "--- \nname: a\n---\nbody",
+        "sin frontmatter",
+    ]
+    for content in samples:
+        match = _FRONTMATTER_RE.match(content)
+        parts = _split_frontmatter(content)
+        if parts is not None:
+            assert match is not None and parts == match.groups()
+    for skill_file in SKILLS_DIR.glob("*/SKILL.md"):
+        content = skill_file.read_text(encoding="utf-8")
+        assert _split_frontmatter(content) == _FRONTMATTER_RE.match(content).groups()
+
+
+def test_load_skill_resource_miss_is_cached_until_clear_cache(tmp_path):
+    """Un recurso inexistente queda en caché negativa hasta clear_cache()."""
+    _write_skill(tmp_path, "demo", "sys")
+    loader = SkillLoader(tmp_path)
+    assert loader.load_skill_resource("demo", "extra.md") is None
+    (tmp_path / "demo" / "extra.md").write_text("contenido", encoding="utf-8")
+    assert loader.load_skill_resource("demo", "extra.md") is None
+    assert loader.load_skill_resource("demo", "extra.md", use_cache=False) == "contenido"
+    loader.clear_cache()
+    assert loader.load_skill_resource("demo", "extra.md") == "contenido"
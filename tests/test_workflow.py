@@ -4,7 +4,7 @@ from pathlib import Path
 
 
 from lms_agent_scraper.graph.state import ScraperState
-from lms_agent_scraper.graph.workflow import build_workflow, run_workflow
+from lms_agent_scraper.graph.workflow import _get_graph, build_workflow, run_workflow
 from lms_agent_scraper.graph import nodes
 
 PROFILES_DIR = Path(__file__).resolve().parent.parent / "profiles"
@@ -15,6 +15,12 @@ def test_build_workflow():
     assert graph is not None
 
 
+def test_get_graph_reuses_compiled_graph():
+    graph = _get_graph()
+    assert _get_graph() is graph
+    assert _get_graph(rebuild=True) is not graph
+
+
 def test_run_workflow_stub_no_credentials():
     # Sin credenciales reales: debe cargar perfil y fallar auth o devolver estado coherente
     result = run_workflow(
@@ -61,7 +67,11 @@ def test_authentication_node_with_injected_login_fn():
     }
 
     def mock_login(**kwargs):
-        return {"success": True, "cookies": [{"name": "sid", "value": "abc", "domain": ""}], "error": None}
+        return {
+            "success": True,
+            "cookies": [{"name": "sid", "value": "abc", "domain": ""}],
+            "error": None,
+        }
 
     config = {"configurable": {"login_fn": mock_login}}
     out = nodes.authentication_node(state, config=config)
@@ -105,3 +115,108 @@ def test_report_generator_node_with_empty_assignments(tmp_path):
     if out["report_path"]:
         assert Path(out["report_path"]).exists()
         assert Path(out["report_path"]).parent == tmp_path
+
+
+def test_portal_name_from_base_url():
+    assert nodes.portal_name("https://aula.example.edu/login/") == "aula.example.edu"
+    assert nodes.portal_name("http://moodle.local") == "moodle.local"
+    assert nodes.portal_name("moodle.local/my") == "moodle.local"
+    assert nodes.portal_name("") == "LMS"
+
+
+def test_authentication_node_prefers_precomputed_auth_profile():
+    """Si el estado trae auth_profile (run_workflow), el nodo lo usa en lugar de profile["auth"]."""
+    seen = {}
+
+    def mock_login(**kwargs):
+        seen.update(kwargs)
+        return {"success": False, "cookies": [], "error": None}
+
+    state: ScraperState = {
+        "profile": {"auth": {"login_path": "/old/"}},
+        "auth_profile": {"login_path": "/login/index.php"},
+        "base_url": "https://example.edu",
+        "username": "user",
+        "password": "pass",
+        "errors": [],
+    }
+    nodes.authentication_node(state, config={"configurable": {"login_fn": mock_login}})
+    assert seen["login_path"] == "/login/index.php"
+    assert nodes.profile_sections({"auth": {"a": 1}})["auth_profile"] == {"a": 1}
+
+
+def test_nodes_pass_shared_browser_session():
+    """Con configurable.browser_session, login y descubrimiento reciben la misma sesión."""
+    from lms_agent_scraper.tools.browser_tools import BrowserSession
+
+    seen = []
+
+    def mock_login(**kwargs):
+        seen.append(kwargs.get("session"))
+        return {"success": True, "cookies": [], "error": None}
+
+    def mock_courses(**kwargs):
+        seen.append(kwargs.get("session"))
+        return []
+
+    state: ScraperState = {
+        "base_url": "https://example.edu",
+        "username": "user",
+        "password": "pass",
+        "authenticated": True,
+        "errors": [],
+    }
+    with BrowserSession() as session:
+        config = {
+            "configurable": {
+                "login_fn": mock_login,
+                "get_courses_fn": mock_courses,
+                "browser_session": session,
+            }
+        }
+        nodes.authentication_node(state, config=config)
+        nodes.course_discovery_node(state, config=config)
+        assert session._browser is None  # el navegador solo se lanza al abrir un contexto
+    assert seen == [session, session]
+
+
+def test_course_discovery_relogs_when_reused_session_is_stale(tmp_path):
+    """Sesión guardada sin cursos: se borra el archivo, se repite el login forzado y la búsqueda."""
+    state_file = tmp_path / "auth_state-abc.json"
+    state_file.write_text("{}", encoding="utf-8")
+    logins = []
+    calls = []
+
+    def mock_login(**kwargs):
+        logins.append(kwargs.get("force_login"))
+        return {
+            "success": True,
+            "cookies": [{"name": "sid", "value": "nuevo"}],
+            "storage_state": str(state_file),
+        }
+
+    def mock_courses(**kwargs):
+        calls.append(kwargs["cookies"])
+        if len(calls) == 1:
+            return []
+        return [{"name": "Curso", "url": "https://example.edu/course/view.php?id=1"}]
+
+    state: ScraperState = {
+        "base_url": "https://example.edu",
+        "username": "user",
+        "password": "pass",
+        "authenticated": True,
+        "session_reused": True,
+        "session_cookies": [{"name": "sid", "value": "viejo"}],
+        "storage_state_file": str(state_file),
+        "auth_state_path": str(tmp_path / "auth_state.json"),
+        "errors": [],
+    }
+    config = {"configurable": {"login_fn": mock_login, "get_courses_fn": mock_courses}}
+    updates = nodes.course_discovery_node(state, config=config)
+    assert logins == [True]
+    assert not state_file.exists()
+    assert calls == [[{"name": "sid", "value": "viejo"}], [{"name": "sid", "value": "nuevo"}]]
+    assert len(updates["courses"]) == 1
+    assert updates["session_cookies"] == [{"name": "sid", "value": "nuevo"}]
+    assert updates["session_reused"] is False
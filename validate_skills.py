@@ -13,6 +13,7 @@ EXPECTED_VARIABLES = {
     "date-interpreter": ["date_text", "context"],
     "course-extractor": ["snippet", "base_url"],
     "course-page-classifier": ["snippet", "url"],
+    "course-page-batch-classifier": ["pages"],
     "selector-suggester": ["error_message", "html_snippet"],
     "html-structure-analyzer": ["snippet"],
 }